@@ -0,0 +1,328 @@
+from array import array
+from collections import Counter
+from typing import Dict, List, Optional
+
+from nodes import *
+from nodes import _empty
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Раскладка полей узлов в арене: (имя атрибута, вид поля)
+# 'str'   - интернированная строка, хранится в столбце values
+# 'op'    - код BinOp, хранится в столбце ops
+# 'node'  - индекс потомка в children (-1 для None)
+# 'nodes' - число потомков и их индексы в children, всегда последнее поле
+NODE_LAYOUTS = {
+    LiteralNode: (('literal', 'str'),),
+    IdentNode: (('name', 'str'),),
+    TypeSpecNode: (('name', 'str'),),
+    ArrayIdentNode: (('name', 'node'), ('literal', 'node')),
+    BinOpNode: (('op', 'op'), ('arg1', 'node'), ('arg2', 'node')),
+    IdentListNode: (('idents', 'nodes'),),
+    VarDeclNode: (('ident_list', 'node'), ('vars_type', 'node')),
+    ArrayDeclNode: (('name', 'node'), ('from_', 'node'), ('to_', 'node'), ('vars_type', 'node')),
+    VarsDeclNode: (('var_decs', 'nodes'),),
+    CallNode: (('func', 'node'), ('params', 'nodes')),
+    AssignNode: (('var', 'node'), ('val', 'node')),
+    IfNode: (('cond', 'node'), ('then_stmt', 'node'), ('else_stmt', 'node')),
+    WhileNode: (('cond', 'node'), ('stmt_list', 'node')),
+    RepeatNode: (('stmt_list', 'node'), ('cond', 'node')),
+    ForNode: (('init', 'node'), ('to', 'node'), ('body', 'node')),
+    StmtListNode: (('exprs', 'nodes'),),
+    BodyNode: (('body', 'node'),),
+    ParamsNode: (('vars_list', 'nodes'),),
+    ProgramNode: (('prog_name', 'node'), ('vars_decl', 'node'), ('stmt_list', 'node')),
+    ProcedureDeclNode: (('proc_name', 'node'), ('params', 'node'), ('vars_decl', 'node'), ('stmt_list', 'node')),
+    FunctionDeclNode: (('proc_name', 'node'), ('params', 'node'), ('returning_type', 'node'),
+                       ('vars_decl', 'node'), ('stmt_list', 'node')),
+}
+NODE_KINDS = tuple(NODE_LAYOUTS)
+KIND_CODES = {cls: code for code, cls in enumerate(NODE_KINDS)}
+BIN_OPS = tuple(BinOp)
+BIN_OP_CODES = {op: code for code, op in enumerate(BIN_OPS)}
+
+
+# Столбцовое представление AST-дерева: вместо объекта на узел - параллельные массивы
+# kinds (класс узла), values (id строки), ops (код операции), child_start (начало полей-потомков
+# в children). Узлы нумеруются в порядке построения, потомки всегда раньше родителя
+class AstArena:
+    def __init__(self):
+        self.kinds = array('B')
+        self.values = array('i')
+        self.ops = array('b')
+        self.child_start = array('I')
+        self.children = array('i')
+        self.strings: List[str] = []
+        self._string_ids: Dict[str, int] = {}
+        self._literal_values: Dict[int, object] = {}
+        self.root = -1
+
+    def __len__(self) -> int:
+        return len(self.kinds)
+
+    def intern(self, s: str) -> int:
+        string_id = self._string_ids.get(s)
+        if string_id is None:
+            string_id = self._string_ids[s] = len(self.strings)
+            self.strings.append(s)
+        return string_id
+
+    def add(self, cls, value: int = -1, op: int = -1, children=()) -> int:
+        index = len(self.kinds)
+        self.kinds.append(KIND_CODES[cls])
+        self.values.append(value)
+        self.ops.append(op)
+        self.child_start.append(len(self.children))
+        self.children.extend(children)
+        self.root = index
+        return index
+
+    # Преобразует дерево объектов nodes.py в арену (обход с явным стеком, в обратном порядке)
+    @classmethod
+    def from_ast(cls, root: AstNode) -> 'AstArena':
+        arena = cls()
+        indices: Dict[int, int] = {}
+        stack = [(root, False)]
+        while stack:
+            node, expanded = stack.pop()
+            if expanded:
+                indices[id(node)] = arena._add_node(node, indices)
+                continue
+            stack.append((node, True))
+            for child in reversed(_node_children(node)):
+                if id(child) not in indices:
+                    stack.append((child, False))
+        arena.root = indices[id(root)]
+        return arena
+
+    def _add_node(self, node: AstNode, indices: Dict[int, int]) -> int:
+        value, op, children = -1, -1, []
+        for name, field_kind in NODE_LAYOUTS[type(node)]:
+            field = getattr(node, name)
+            if field_kind == 'str':
+                value = self.intern(str(field))
+            elif field_kind == 'op':
+                op = BIN_OP_CODES[field]
+            elif field_kind == 'node':
+                children.append(-1 if field is None else indices[id(field)])
+            else:
+                items = field if isinstance(field, tuple) else ()
+                children.append(len(items))
+                children.extend(indices[id(item)] for item in items)
+        return self.add(type(node), value, op, children)
+
+    def kind(self, index: int):
+        return NODE_KINDS[self.kinds[index]]
+
+    # Фасад узла index с атрибутами как у классов nodes.py; значения читаются из столбцов при обращении
+    def node(self, index: int) -> Optional[AstNode]:
+        if index < 0:
+            return None
+        return _FACADES[self.kinds[index]](self, index)
+
+    @property
+    def root_node(self) -> AstNode:
+        return self.node(self.root)
+
+    def literal_value(self, string_id: int):
+        value = self._literal_values.get(string_id, _MISSING)
+        if value is _MISSING:
+            literal = self.strings[string_id]
+            try:
+                value = int(literal)
+            except ValueError:
+                value = literal_eval(literal)
+            self._literal_values[string_id] = value
+        return value
+
+    def count(self, cls) -> int:
+        code = KIND_CODES[cls]
+        if np is not None:
+            return int(np.count_nonzero(np.frombuffer(self.kinds, dtype=np.uint8) == code))
+        return self.kinds.count(code)
+
+    # Число литералов каждого типа (int, bool, str, ...): узлы-литералы группируются
+    # по интернированной строке, тип вычисляется один раз на строку
+    def literal_type_counts(self) -> Dict[str, int]:
+        code = KIND_CODES[LiteralNode]
+        if np is not None:
+            kinds = np.frombuffer(self.kinds, dtype=np.uint8)
+            values = np.frombuffer(self.values, dtype=np.int32)
+            string_ids, counts = np.unique(values[kinds == code], return_counts=True)
+        else:
+            counter = Counter(value for kind, value in zip(self.kinds, self.values) if kind == code)
+            string_ids, counts = list(counter), list(counter.values())
+        result: Dict[str, int] = {}
+        for string_id, count in zip(string_ids, counts):
+            type_name = type(self.literal_value(int(string_id))).__name__
+            result[type_name] = result.get(type_name, 0) + int(count)
+        return result
+
+
+_MISSING = object()
+
+
+def _node_children(node: AstNode) -> List[AstNode]:
+    children = []
+    for name, field_kind in NODE_LAYOUTS[type(node)]:
+        field = getattr(node, name)
+        if field_kind == 'node' and field is not None:
+            children.append(field)
+        elif field_kind == 'nodes' and isinstance(field, tuple):
+            children.extend(field)
+    return children
+
+
+# Фабрика узлов для RecursiveDescentParser: те же конструкторы, что в nodes.py,
+# но узлы сразу пишутся в арену, а вместо объектов возвращаются их индексы
+class ArenaNodeFactory:
+    def __init__(self, arena: Optional[AstArena] = None):
+        self.arena = arena if arena is not None else AstArena()
+
+    def _leaf(self, cls, text) -> int:
+        arena = self.arena
+        return arena.add(cls, value=arena.intern(str(text)))
+
+    def LiteralNode(self, literal: str) -> int:
+        return self._leaf(LiteralNode, literal)
+
+    def IdentNode(self, name: str) -> int:
+        return self._leaf(IdentNode, name)
+
+    def TypeSpecNode(self, name: str) -> int:
+        return self._leaf(TypeSpecNode, name)
+
+    def BinOpNode(self, op: BinOp, arg1: int, arg2: int) -> int:
+        return self.arena.add(BinOpNode, op=BIN_OP_CODES[op], children=(arg1, arg2))
+
+    def ArrayIdentNode(self, name: int, literal: int) -> int:
+        return self.arena.add(ArrayIdentNode, children=(name, literal))
+
+    def IdentListNode(self, *idents: int) -> int:
+        return self.arena.add(IdentListNode, children=(len(idents),) + idents)
+
+    def VarDeclNode(self, ident_list: int, vars_type: int) -> int:
+        return self.arena.add(VarDeclNode, children=(ident_list, vars_type))
+
+    def ArrayDeclNode(self, name: int, from_: int, to_: int, vars_type: int) -> int:
+        return self.arena.add(ArrayDeclNode, children=(name, from_, to_, vars_type))
+
+    def VarsDeclNode(self, *var_decs: int) -> int:
+        return self.arena.add(VarsDeclNode, children=(len(var_decs),) + var_decs)
+
+    def CallNode(self, func: int, *params: int) -> int:
+        return self.arena.add(CallNode, children=(func, len(params)) + params)
+
+    def AssignNode(self, var: int, val: int) -> int:
+        return self.arena.add(AssignNode, children=(var, val))
+
+    def IfNode(self, cond: int, then_stmt: int, else_stmt: Optional[int] = None) -> int:
+        return self.arena.add(IfNode, children=(cond, then_stmt, -1 if else_stmt is None else else_stmt))
+
+    def WhileNode(self, cond: int, stmt_list: int) -> int:
+        return self.arena.add(WhileNode, children=(cond, stmt_list))
+
+    def RepeatNode(self, stmt_list: int, cond: int) -> int:
+        return self.arena.add(RepeatNode, children=(stmt_list, cond))
+
+    def ForNode(self, init: int, to: int, body: Optional[int]) -> int:
+        if body is None:
+            body = self.StmtListNode()
+        return self.arena.add(ForNode, children=(init, to, body))
+
+    def StmtListNode(self, *exprs: int) -> int:
+        return self.arena.add(StmtListNode, children=(len(exprs),) + exprs)
+
+    def BodyNode(self, body: int) -> int:
+        return self.arena.add(BodyNode, children=(body,))
+
+    def ParamsNode(self, *vars_list: int) -> int:
+        return self.arena.add(ParamsNode, children=(len(vars_list),) + vars_list)
+
+    def ProgramNode(self, prog_name: int, vars_decl: int, stmt_list: int) -> int:
+        return self.arena.add(ProgramNode, children=(prog_name, vars_decl, stmt_list))
+
+    def ProcedureDeclNode(self, proc_name: int, params: int, vars_decl: int, stmt_list: int) -> int:
+        return self.arena.add(ProcedureDeclNode, children=(proc_name, params, vars_decl, stmt_list))
+
+    def FunctionDeclNode(self, proc_name: int, params: int, returning_type: int, vars_decl: int,
+                         stmt_list: int) -> int:
+        return self.arena.add(FunctionDeclNode, children=(proc_name, params, returning_type, vars_decl, stmt_list))
+
+
+# Фасады: подклассы узлов nodes.py с тем же именем класса (для диспетчеризации NodeVisitor
+# и isinstance), атрибуты которых - свойства, читающие столбцы арены
+class _ArenaNodeMixin:
+    __slots__ = ()
+
+    @property
+    def row(self):
+        return None
+
+    @property
+    def line(self):
+        return None
+
+    @property
+    def childs(self) -> Tuple[AstNode, ...]:
+        return self._make_childs()
+
+
+def _str_property():
+    def getter(self):
+        return self._arena.strings[self._arena.values[self._index]]
+    return property(getter)
+
+
+def _op_property():
+    def getter(self):
+        return BIN_OPS[self._arena.ops[self._index]]
+    return property(getter)
+
+
+def _node_property(offset: int):
+    def getter(self):
+        arena = self._arena
+        return arena.node(arena.children[arena.child_start[self._index] + offset])
+    return property(getter)
+
+
+def _nodes_property(offset: int, empty):
+    def getter(self):
+        arena = self._arena
+        start = arena.child_start[self._index] + offset
+        count = arena.children[start]
+        if not count and empty is not None:
+            return empty
+        return tuple(arena.node(i) for i in arena.children[start + 1:start + 1 + count])
+    return property(getter)
+
+
+def _facade_init(self, arena: AstArena, index: int):
+    self._arena = arena
+    self._index = index
+
+
+def _make_facade(cls):
+    namespace = {'__slots__': ('_arena', '_index'), '__init__': _facade_init, '__module__': __name__}
+    offset = 0
+    for name, field_kind in NODE_LAYOUTS[cls]:
+        if field_kind == 'str':
+            namespace[name] = _str_property()
+        elif field_kind == 'op':
+            namespace[name] = _op_property()
+        elif field_kind == 'node':
+            namespace[name] = _node_property(offset)
+            offset += 1
+        else:
+            # пустой список параметров ParamsNode в nodes.py заменяется на _empty
+            namespace[name] = _nodes_property(offset, _empty if cls is ParamsNode else None)
+    if cls is LiteralNode:
+        namespace['value'] = property(lambda self: self._arena.literal_value(self._arena.values[self._index]))
+    return type(cls.__name__, (_ArenaNodeMixin, cls), namespace)
+
+
+_FACADES = tuple(_make_facade(cls) for cls in NODE_KINDS)
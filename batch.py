@@ -0,0 +1,220 @@
+import os
+from contextlib import ExitStack, nullcontext, suppress
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+
+from classfile import assemble
+from compile_cache import CompileCache
+from compiler import *
+from file_helper import *
+from folding import ConstantFolder
+from lexer import Lexer, ParseError
+from peephole import PeepholeOptimizer
+from profiling import CompileProfile, phase
+
+SOURCE_SUFFIXES = ('.pas', '.txt')
+# Что пишется для каждого файла: .class (по умолчанию) или текст Jasmin (.j) для отладки
+EMIT_FORMATS = ('class', 'jasmin')
+EMIT_SUFFIXES = {'class': '.class', 'jasmin': '.j'}
+
+# Состояние процесса-исполнителя: парсер и кэш создаются один раз в _init_worker
+_worker_backend = DEFAULT_BACKEND
+_worker_cache: Optional[CompileCache] = None
+_worker_emit = 'class'
+_worker_peephole: Optional[Tuple[str, ...]] = None
+_worker_fold = False
+_worker_promote = False
+_worker_profile = False
+
+
+# Результат компиляции одного файла; error - текст ошибки или None,
+# peephole_hits и fold_hits - срабатывания правил оптимизаций (None, если они выключены),
+# profile - профиль компиляции файла (None без профилирования)
+class FileResult:
+    def __init__(self, source_path: str, output_path: str, error: Optional[str] = None, cached: bool = False,
+                 peephole_hits: Optional[Dict[str, int]] = None, fold_hits: Optional[Dict[str, int]] = None,
+                 profile: Optional[CompileProfile] = None):
+        self.source_path = source_path
+        self.output_path = output_path
+        self.error = error
+        self.cached = cached
+        self.peephole_hits = peephole_hits
+        self.fold_hits = fold_hits
+        self.profile = profile
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+# Раскрывает каталоги в список исходных файлов (рекурсивно, по расширению)
+def collect_sources(paths: Iterable[str], suffixes=SOURCE_SUFFIXES) -> List[str]:
+    sources = []
+    for path in paths:
+        if os.path.isdir(path):
+            for dir_path, dir_names, file_names in os.walk(path):
+                dir_names.sort()
+                sources.extend(os.path.join(dir_path, name) for name in sorted(file_names)
+                               if name.endswith(suffixes))
+        else:
+            sources.append(path)
+    return sources
+
+
+# Имя класса программы - идентификатор после Program, как в директиве .class;
+# None, если заголовок программы не разбирается
+def class_name_of(source: Source) -> Optional[str]:
+    tokens = Lexer(source).iter_tokens()
+    try:
+        keyword, name = next(tokens), next(tokens)
+    except (ParseError, StopIteration):
+        return None
+    return name.text if keyword.text == 'Program' and name.kind == 'IDENT' else None
+
+
+# Выходной файл: .j называется по исходному файлу, а .class - по имени класса, иначе JVM
+# его не загрузит. Если заголовок не читается, .class тоже называется по исходному файлу
+# (компиляция такого файла все равно завершится ошибкой)
+def output_path_for(source_path: str, output_dir: Optional[str] = None, emit: str = 'class') -> str:
+    name = os.path.splitext(os.path.basename(source_path))[0]
+    if emit == 'class':
+        with suppress(OSError):
+            with FileHelper.map_file(source_path) as source:
+                name = class_name_of(source) or name
+    return os.path.join(output_dir or os.path.dirname(source_path), name + EMIT_SUFFIXES[emit])
+
+
+# Имя .j-файла для атрибута SourceFile, как его записывает jasmin.jar
+def source_file_for(source_path: str) -> str:
+    return os.path.splitext(os.path.basename(source_path))[0] + EMIT_SUFFIXES['jasmin']
+
+
+# Входные файлы, результат которых записался бы в уже занятый выходной файл (например,
+# одноименные файлы из разных каталогов при -o): номер файла -> текст ошибки.
+# Такие файлы не компилируются, первый файл с этим выходом компилируется как обычно
+def output_collisions(sources: List[str], outputs: List[str]) -> Dict[int, str]:
+    owners: Dict[str, int] = {}
+    errors = {}
+    for index, output_path in enumerate(outputs):
+        key = os.path.normcase(os.path.abspath(output_path))
+        owner = owners.setdefault(key, index)
+        if owner != index:
+            errors[index] = 'Output {0} collides with the output of {1}'.format(output_path, sources[owner])
+    return errors
+
+
+def _init_worker(backend: str, cache_dir: Optional[str], emit: str = 'class',
+                 peephole: Optional[Tuple[str, ...]] = None, fold: bool = False, promote: bool = False,
+                 profile: bool = False) -> None:
+    global _worker_backend, _worker_cache, _worker_emit, _worker_peephole, _worker_fold, _worker_promote, \
+        _worker_profile
+    _worker_backend = backend
+    _worker_cache = CompileCache(cache_dir) if cache_dir else None
+    _worker_emit = emit
+    _worker_peephole = peephole
+    _worker_fold = fold
+    _worker_promote = promote
+    _worker_profile = profile
+    get_parser(backend)
+
+
+# Профиль нового файла или None, если профилирование выключено
+def _new_profile() -> Optional[CompileProfile]:
+    return CompileProfile() if _worker_profile else None
+
+
+def _compile_file(source_path: str, output_path: str) -> FileResult:
+    optimizer = PeepholeOptimizer(_worker_peephole) if _worker_peephole is not None else None
+    folder = ConstantFolder() if _worker_fold else None
+    profile = _new_profile()
+    try:
+        with ExitStack() as stack:
+            if profile is not None:
+                stack.enter_context(profile.run())
+            # исходный файл отображается в память и не копируется в строку
+            with phase(profile, 'read'):
+                source = stack.enter_context(FileHelper.map_file(source_path))
+            if _worker_emit == 'jasmin' and _worker_cache is None:
+                with open(output_path, 'w') as f:
+                    result = compile_source(source, backend=_worker_backend, sink=f, optimizer=optimizer,
+                                            folder=folder, promote_globals=_worker_promote, profile=profile)
+            else:
+                result, output = _compile_output(source, source_path, optimizer, folder, profile)
+                with phase(profile, 'write'):
+                    if _worker_emit == 'class':
+                        with open(output_path, 'wb') as f:
+                            f.write(output)
+                    else:
+                        FileHelper.write_to_file(output_path, output)
+    except Exception as e:
+        # не оставляем частично записанный или устаревший результат
+        with suppress(OSError):
+            os.remove(output_path)
+        return FileResult(source_path, output_path, error='{0}: {1}'.format(type(e).__name__, e), profile=profile)
+    return _file_result(source_path, output_path, result, optimizer, folder, profile)
+
+
+# Содержимое выходного файла для исходного текста: байты .class или текст Jasmin
+def _compile_output(source: Source, source_path: str, optimizer: Optional[PeepholeOptimizer],
+                    folder: Optional[ConstantFolder],
+                    profile: Optional[CompileProfile] = None) -> Tuple[CompileResult, Union[bytes, str]]:
+    result = compile_source(source, backend=_worker_backend, cache=_worker_cache, optimizer=optimizer,
+                            folder=folder, promote_globals=_worker_promote, profile=profile)
+    if _worker_emit == 'class':
+        with phase(profile, 'assemble'):
+            return result, assemble(result.code, source_file_for(source_path))[1]
+    return result, '\n'.join(result.code)
+
+
+def _file_result(source_path: str, output_path: str, result: CompileResult,
+                 optimizer: Optional[PeepholeOptimizer], folder: Optional[ConstantFolder],
+                 profile: Optional[CompileProfile] = None) -> FileResult:
+    return FileResult(source_path, output_path, cached=result.cached,
+                      peephole_hits=dict(optimizer.hits) if optimizer is not None else None,
+                      fold_hits=dict(folder.hits) if folder is not None else None, profile=profile)
+
+
+# Компиляция уже прочитанного текста без записи результата (стадия конвейера pipeline.py):
+# результат и содержимое выходного файла или None при ошибке
+def compile_text(source_path: str, source: str, output_path: str) -> Tuple[FileResult, Union[bytes, str, None]]:
+    optimizer = PeepholeOptimizer(_worker_peephole) if _worker_peephole is not None else None
+    folder = ConstantFolder() if _worker_fold else None
+    profile = _new_profile()
+    try:
+        with profile.run() if profile is not None else nullcontext():
+            result, output = _compile_output(source, source_path, optimizer, folder, profile)
+    except Exception as e:
+        return FileResult(source_path, output_path, error='{0}: {1}'.format(type(e).__name__, e),
+                          profile=profile), None
+    return _file_result(source_path, output_path, result, optimizer, folder, profile), output
+
+
+# Компилирует файлы пулом процессов; ошибка в одном файле не прерывает остальные.
+# При jobs == 1 компиляция идет в текущем процессе.
+# peephole - имена правил оптимизатора или None, чтобы не оптимизировать;
+# fold - сворачивать ли константы в AST перед анализом, promote - переносить ли
+# глобальные переменные main в локальные, profile - собирать ли профиль каждого файла
+def compile_files(paths: Iterable[str], output_dir: Optional[str] = None, jobs: Optional[int] = None,
+                  backend: str = DEFAULT_BACKEND, cache_dir: Optional[str] = None,
+                  emit: str = 'class', peephole: Optional[Tuple[str, ...]] = None,
+                  fold: bool = False, promote: bool = False, profile: bool = False) -> List[FileResult]:
+    sources = collect_sources(paths)
+    outputs = [output_path_for(path, output_dir, emit) for path in sources]
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+    collisions = output_collisions(sources, outputs)
+    todo = [index for index in range(len(sources)) if index not in collisions]
+    todo_sources, todo_outputs = [sources[i] for i in todo], [outputs[i] for i in todo]
+    jobs = jobs or os.cpu_count() or 1
+    if jobs == 1 or len(todo) <= 1:
+        _init_worker(backend, cache_dir, emit, peephole, fold, promote, profile)
+        compiled = [_compile_file(src, out) for src, out in zip(todo_sources, todo_outputs)]
+    else:
+        chunk_size = max(1, len(todo) // (jobs * 4))
+        with ProcessPoolExecutor(max_workers=jobs, initializer=_init_worker,
+                                 initargs=(backend, cache_dir, emit, peephole, fold, promote, profile)) as executor:
+            compiled = list(executor.map(_compile_file, todo_sources, todo_outputs, chunksize=chunk_size))
+    results = dict(zip(todo, compiled))
+    for index, error in collisions.items():
+        results[index] = FileResult(sources[index], outputs[index], error=error)
+    return [results[index] for index in range(len(sources))]
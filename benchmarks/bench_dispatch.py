@@ -0,0 +1,75 @@
+import argparse
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from nodes import BinOp, BinOpNode, IdentNode, LiteralNode, StmtListNode
+from semantic import NodeVisitor
+
+# Стоимость диспетчеризации NodeVisitor.visit: прежняя реализация (строка 'visit_' + имя
+# класса и getattr на каждый узел) против кэша методов по классу узла.
+# Дерево - список из N выражений (a + 1) * b, по 5 узлов в каждом; посетитель считает узлы
+# Запуск: python benchmarks/bench_dispatch.py [--expressions N] [--repeat N]
+
+
+# NodeVisitor до кэширования, для сравнения
+class GetattrVisitor(object):
+    def visit(self, node):
+        method_name = 'visit_' + type(node).__name__
+        visitor = getattr(self, method_name, self.generic_visit)
+        return visitor(node)
+
+    def generic_visit(self, node):
+        raise Exception('No visit_{} method'.format(type(node).__name__))
+
+
+def counting_visitor(base: type) -> type:
+    class Counter(base):
+        def visit_StmtListNode(self, node):
+            count = 1
+            for expr in node.exprs:
+                count += self.visit(expr)
+            return count
+
+        def visit_BinOpNode(self, node):
+            return 1 + self.visit(node.arg1) + self.visit(node.arg2)
+
+        def visit_LiteralNode(self, node):
+            return 1
+
+        def visit_IdentNode(self, node):
+            return 1
+
+    return Counter
+
+
+def measure(visitor, tree, repeat: int):
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        count = visitor.visit(tree)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return count, best
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description='Compare NodeVisitor dispatch implementations')
+    arg_parser.add_argument('--expressions', type=int, default=200000, help='expressions of 5 nodes in the tree')
+    arg_parser.add_argument('--repeat', type=int, default=5, help='runs of each visitor, the best one is reported')
+    args = arg_parser.parse_args()
+
+    tree = StmtListNode(*[BinOpNode(BinOp.MUL, BinOpNode(BinOp.ADD, IdentNode('a'), LiteralNode('1')), IdentNode('b'))
+                          for _ in range(args.expressions)])
+    times = {}
+    for name, base in (('getattr', GetattrVisitor), ('cached', NodeVisitor)):
+        count, times[name] = measure(counting_visitor(base)(), tree, args.repeat)
+        print('{0}: {1} nodes, {2:.3f} s'.format(name, count, times[name]))
+    print('getattr/cached {0:.2f}x'.format(times['getattr'] / times['cached']))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+import argparse
+import io
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from closures import ClosureCompiler
+from frontend import get_parser
+from interpreter import ENGINES, _Context, _Resolver
+from vm import VirtualMachine, compile_program
+
+# Сравнение способов исполнения main.py --run: время подготовки программы (разрешение
+# имен, построение замыканий или перевод в байт-код) и время ее выполнения.
+# Запуск: python benchmarks/bench_engines.py [--iterations N]
+RESOURCES = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'resources')
+
+LOOP = '''Program b;
+var i, s, t: integer;
+    d: array [1 .. 10] of integer;
+function Sq(a: integer): integer;
+var u: integer;
+begin
+a:=a*a mod 1000;
+end;
+BEGIN
+i:=0; s:=0;
+while (i<{0}) do
+begin
+  t:=Sq(i);
+  if (t>500) then s:=s+t; else s:=s-1;
+  d[3]:=s mod 7;
+  i:=i+1;
+end;
+Write(s);
+Write(d[3]);
+END.'''
+
+
+def prepare(engine: str, ctx: _Context, ast):
+    if engine == 'tree':
+        return _Resolver(ctx).visit(ast).ex
+    if engine == 'closure':
+        return ClosureCompiler(ctx).visit(ast)
+    program = compile_program(ast)
+    return lambda frame: VirtualMachine(ctx).run(program)
+
+
+# Среднее время подготовки и выполнения в миллисекундах за repeat запусков
+def measure(engine: str, ast, repeat: int):
+    prepare_time = run_time = 0.0
+    for _ in range(repeat):
+        ctx = _Context(io.StringIO(), io.StringIO(), None)
+        started = time.perf_counter()
+        main = prepare(engine, ctx, ast)
+        prepared = time.perf_counter()
+        main([])
+        run_time += time.perf_counter() - prepared
+        prepare_time += prepared - started
+    return prepare_time / repeat * 1000, run_time / repeat * 1000
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description='Compare --run engines')
+    arg_parser.add_argument('--iterations', type=int, default=200000, help='iterations of the loop program')
+    arg_parser.add_argument('--repeat', type=int, default=300, help='runs of each small program')
+    args = arg_parser.parse_args()
+
+    programs = []
+    for name in ('input_program.txt', 'input_program_2.txt', 'input_program_3.txt'):
+        with open(os.path.join(RESOURCES, name)) as f:
+            programs.append((name, f.read(), args.repeat))
+    programs.append(('loop-{0}'.format(args.iterations), LOOP.format(args.iterations), 3))
+
+    parser = get_parser('rd')
+    for name, source, repeat in programs:
+        ast = parser.parse(source)
+        cells = ['{0} prepare {1:.3f} ms, run {2:.3f} ms'.format(engine, *measure(engine, ast, repeat))
+                 for engine in ENGINES]
+        print('{0}: {1}'.format(name, ' | '.join(cells)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+import argparse
+import glob
+import io
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from compiler import compile_source
+from folding import ConstantFolder
+from interpreter import _Context
+from jasmin import count_instructions
+from peephole import PeepholeOptimizer
+from vm import VirtualMachine, load_program
+
+# Свертка констант: размер сгенерированного кода и время его исполнения на ВМ (vm.py
+# исполняет тот же Jasmin-код, что попадает в .class) со сверткой и без нее
+# Запуск: python benchmarks/bench_folding.py [--iterations N]
+LOOP = '''Program f;
+var a, b, i: integer;
+BEGIN
+a:=2*3+4;
+b:=0;
+i:=0;
+while (i<{0}) do
+begin
+    a:=a*1+0;
+    b:=b+(60*60*24) mod 1000+a*(2+2);
+    i:=i+1;
+end;
+Write(a);
+Write(b);
+END.'''
+
+
+def compile_code(source: str, fold: bool):
+    return compile_source(source, backend='rd', optimizer=PeepholeOptimizer(),
+                          folder=ConstantFolder() if fold else None, promote_globals=True).code
+
+
+def run_time(code, repeat: int) -> float:
+    program = load_program(code)
+    best = None
+    for _ in range(repeat):
+        ctx = _Context(io.StringIO(), io.StringIO(), None)
+        started = time.perf_counter()
+        VirtualMachine(ctx).run(program)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best * 1000
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description='Code size and run time with and without constant folding')
+    arg_parser.add_argument('--iterations', type=int, default=100000, help='iterations of the loop program')
+    arg_parser.add_argument('--repeat', type=int, default=5, help='runs of each program, the best one is reported')
+    args = arg_parser.parse_args()
+
+    programs = []
+    for path in sorted(glob.glob(os.path.join(ROOT, 'resources', 'input_program*.txt'))):
+        with open(path) as f:
+            programs.append((os.path.basename(path), f.read()))
+    programs.append(('loop-{0}'.format(args.iterations), LOOP.format(args.iterations)))
+
+    for name, source in programs:
+        cells = []
+        for fold in (False, True):
+            code = compile_code(source, fold)
+            cells.append('{0}: {1} instructions, run {2:.3f} ms'.format(
+                'folded' if fold else 'plain', count_instructions(code), run_time(code, args.repeat)))
+        print('{0}: {1}'.format(name, ' | '.join(cells)))
+
+
+if __name__ == '__main__':
+    main()
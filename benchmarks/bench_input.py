@@ -0,0 +1,81 @@
+import argparse
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Пиковый RSS и время разбора большого файла парсером 'rd': чтение в str
+# (FileHelper.read_from_file) против отображения в память (FileHelper.map_file).
+# Каждый замер идет в отдельном процессе, так как пик RSS считается на процесс.
+# --root задает дерево исходников для сравнения с другим коммитом (режим read есть везде)
+# Запуск: python benchmarks/bench_input.py [--functions N] [--modes read map] [--root DIR]
+FUNCTION = '''function F{0}(a,b: integer):integer;
+    var y: integer;
+begin
+{1}a:=b+a;
+end;
+'''
+
+
+# Программа из functions функций по 12 операторов и их вызовов; 12000 функций - около 4 МБ
+def write_program(path: str, functions: int) -> None:
+    with open(path, 'w') as f:
+        f.write('Program big;\nvar x, y, i: integer;\n')
+        for n in range(functions):
+            body = []
+            for k in range(10):
+                body.append('a:=a+b*{0}-(b+{0});\n'.format(k))
+                if k % 5 == 0:
+                    body.append('if (a>{0}) then\n    x:=a;\nelse\n    x:=b;\n'.format(k))
+            f.write(FUNCTION.format(n, ''.join(body)))
+        f.write('BEGIN\nx:=1;\n')
+        for n in range(functions):
+            f.write('y:=F{0}(x,{0});\nWrite(y);\n'.format(n))
+        f.write('END.')
+
+
+def child(root: str, mode: str, path: str) -> None:
+    sys.path.insert(0, root)
+    from file_helper import FileHelper
+    from frontend import get_parser
+    parser = get_parser('rd')
+    started = time.perf_counter()
+    if mode == 'read':
+        parser.parse(FileHelper.read_from_file(path))
+    else:
+        with FileHelper.map_file(path) as buffer:
+            parser.parse(buffer)
+    elapsed = time.perf_counter() - started
+    # ru_maxrss в Linux - в килобайтах
+    print('{0:.1f} {1}'.format(elapsed, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss // 1024))
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description='Peak RSS of parsing a large file read into a str or mapped')
+    arg_parser.add_argument('--functions', type=int, default=12000, help='functions in the generated program')
+    arg_parser.add_argument('--modes', nargs='+', choices=('read', 'map'), default=['read', 'map'])
+    arg_parser.add_argument('--root', default=ROOT, help='source tree to measure')
+    arg_parser.add_argument('--child', nargs=2, metavar=('MODE', 'PATH'), help=argparse.SUPPRESS)
+    args = arg_parser.parse_args()
+    root = os.path.abspath(args.root)
+    if args.child:
+        child(root, *args.child)
+        return
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        path = os.path.join(work_dir, 'big.pas')
+        write_program(path, args.functions)
+        print('{0}: {1:.1f} MB'.format(root, os.path.getsize(path) / 1e6))
+        for mode in args.modes:
+            output = subprocess.run([sys.executable, os.path.abspath(__file__), '--root', root,
+                                     '--child', mode, path], check=True, stdout=subprocess.PIPE,
+                                    universal_newlines=True).stdout.split()
+            print('{0}: parse {1} s, peak RSS {2} MB'.format(mode, *output))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+import argparse
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from bench_engines import LOOP, measure
+from classfile import assemble
+from compiler import compile_source
+from folding import ConstantFolder
+from frontend import get_parser
+from peephole import PeepholeOptimizer
+
+# Исполнение в процессе (движки tree и closure, с разбором) против пути через JVM:
+# компиляция, сборка .class и запуск java, включая старт JVM. Без java в PATH
+# измеряется только подготовка .class, запуск JVM пропускается
+# Запуск: python benchmarks/bench_jvm.py [--iterations N] [--java PATH]
+
+
+# Среднее время разбора и исполнения в процессе, в миллисекундах
+def in_process(engine: str, source: str, repeat: int) -> float:
+    parser = get_parser('rd')
+    started = time.perf_counter()
+    for _ in range(repeat):
+        parser.parse(source)
+    parse_time = (time.perf_counter() - started) / repeat * 1000
+    return parse_time + sum(measure(engine, parser.parse(source), repeat))
+
+
+# Среднее время компиляции и сборки .class и время запуска java (None без java), в миллисекундах
+def jvm_path(source: str, repeat: int, java, work_dir: str):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        code = compile_source(source, backend='rd', optimizer=PeepholeOptimizer(), folder=ConstantFolder(),
+                              promote_globals=True).code
+        class_name, class_bytes = assemble(code)
+        with open(os.path.join(work_dir, class_name + '.class'), 'wb') as f:
+            f.write(class_bytes)
+    build_time = (time.perf_counter() - started) / repeat * 1000
+    if java is None:
+        return build_time, None
+    runs = max(1, min(repeat, 10))
+    started = time.perf_counter()
+    for _ in range(runs):
+        subprocess.run([java, '-cp', work_dir, class_name], check=True, stdout=subprocess.DEVNULL)
+    return build_time, (time.perf_counter() - started) / runs * 1000
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description='In-process engines against the JVM path')
+    arg_parser.add_argument('--iterations', type=int, default=200000, help='iterations of the loop program')
+    arg_parser.add_argument('--repeat', type=int, default=100, help='runs of each small program')
+    arg_parser.add_argument('--java', default=shutil.which('java'), help='java executable (default: from PATH)')
+    args = arg_parser.parse_args()
+    if args.java is None:
+        print('java not found: the JVM run (and its startup) is not measured', file=sys.stderr)
+
+    programs = []
+    for name in ('input_program.txt', 'input_program_2.txt', 'input_program_3.txt'):
+        with open(os.path.join(ROOT, 'resources', name)) as f:
+            programs.append((name, f.read(), args.repeat))
+    programs.append(('loop-{0}'.format(args.iterations), LOOP.format(args.iterations), 3))
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        for name, source, repeat in programs:
+            cells = ['{0} {1:.3f} ms'.format(engine, in_process(engine, source, repeat))
+                     for engine in ('tree', 'closure')]
+            build_time, run_time = jvm_path(source, repeat, args.java, work_dir)
+            cells.append('compile+assemble {0:.3f} ms'.format(build_time))
+            if run_time is not None:
+                cells.append('java {0:.3f} ms, total {1:.3f} ms'.format(run_time, build_time + run_time))
+            print('{0}: {1}'.format(name, ' | '.join(cells)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+import argparse
+import gc
+import os
+import sys
+import time
+import tracemalloc
+
+# Память и время построения AST-узлов nodes.py на программе из 100k операторов.
+# --root задает дерево исходников, чьи nodes.py измеряются, например, рабочую копию
+# коммита до __slots__ (git worktree add /tmp/before <коммит>) - так получаются числа "до" и "после"
+# Запуск: python benchmarks/bench_nodes.py [--statements N] [--root DIR]
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+# Операторы вида x:=(y+k)*2-x div 3 и if (x>y) then y:=x+1 else WriteLn(y)
+def build_program(nodes, statements: int):
+    BinOp, BinOpNode, IdentNode, LiteralNode = nodes.BinOp, nodes.BinOpNode, nodes.IdentNode, nodes.LiteralNode
+    stmts = []
+    for i in range(statements):
+        if i % 3:
+            left = BinOpNode(BinOp.MUL, BinOpNode(BinOp.ADD, IdentNode('y'), LiteralNode(str(i % 50))),
+                             LiteralNode('2'))
+            stmt = nodes.AssignNode(IdentNode('x'), BinOpNode(BinOp.SUB, left,
+                                                              BinOpNode(BinOp.DIV, IdentNode('x'), LiteralNode('3'))))
+        else:
+            stmt = nodes.IfNode(BinOpNode(BinOp.GT, IdentNode('x'), IdentNode('y')),
+                                nodes.AssignNode(IdentNode('y'), BinOpNode(BinOp.ADD, IdentNode('x'), LiteralNode('1'))),
+                                nodes.CallNode(IdentNode('WriteLn'), IdentNode('y')))
+        stmts.append(stmt)
+    decl = nodes.VarDeclNode(nodes.IdentListNode(IdentNode('x'), IdentNode('y')), nodes.TypeSpecNode('integer'))
+    return nodes.ProgramNode(IdentNode('big'), nodes.VarsDeclNode(decl),
+                             nodes.BodyNode(nodes.StmtListNode(*stmts)))
+
+
+def walk(root) -> int:
+    count = 0
+    stack = [root]
+    while stack:
+        node = stack.pop()
+        count += 1
+        stack.extend(node.childs)
+    return count
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description='AST node memory and construction time')
+    arg_parser.add_argument('--statements', type=int, default=100000, help='statements in the program')
+    arg_parser.add_argument('--repeat', type=int, default=3, help='runs of each measurement, the best one is reported')
+    arg_parser.add_argument('--root', default=ROOT, help='source tree whose nodes.py is measured')
+    args = arg_parser.parse_args()
+    sys.path.insert(0, os.path.abspath(args.root))
+    import nodes
+
+    build_s = first_s = again_s = None
+    for _ in range(args.repeat):
+        gc.collect()
+        started = time.perf_counter()
+        program = build_program(nodes, args.statements)
+        elapsed = time.perf_counter() - started
+        build_s = elapsed if build_s is None else min(build_s, elapsed)
+        # первый обход сразу после построения и повторный обход того же дерева
+        started = time.perf_counter()
+        count = walk(program)
+        elapsed = time.perf_counter() - started
+        first_s = elapsed if first_s is None else min(first_s, elapsed)
+        started = time.perf_counter()
+        walk(program)
+        elapsed = time.perf_counter() - started
+        again_s = elapsed if again_s is None else min(again_s, elapsed)
+        del program
+
+    gc.collect()
+    tracemalloc.start()
+    program = build_program(nodes, args.statements)
+    built = tracemalloc.get_traced_memory()[0]
+    walk(program)
+    walked = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    print('{0}: {1} nodes, build {2:.2f} s, first walk {3:.2f} s, repeated walk {4:.2f} s'.format(
+        os.path.abspath(args.root), count, build_s, first_s, again_s))
+    print('retained after build {0:.1f} MB ({1:.0f} B/node), after walk {2:.1f} MB ({3:.0f} B/node)'.format(
+        built / 1e6, built / count, walked / 1e6, walked / count))
+
+
+if __name__ == '__main__':
+    main()
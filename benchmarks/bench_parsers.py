@@ -0,0 +1,63 @@
+import argparse
+import glob
+import os
+import sys
+import time
+import warnings
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'tests'))
+
+from frontend import PARSER_BACKENDS, get_parser
+from generator import ProgramGenerator
+
+# Сравнение парсеров 'pyparsing' и 'rd' на resources/input_program*.txt и на
+# сгенерированных программах: среднее время разбора одной программы
+# Запуск: python benchmarks/bench_parsers.py [--generated N] [--repeat N]
+
+
+def measure(backend: str, sources, repeat: int) -> float:
+    parser = get_parser(backend)
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for source in sources:
+            parser.parse(source)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best / len(sources) * 1000
+
+
+def _parses(source: str) -> bool:
+    try:
+        get_parser('rd').parse(source)
+    except Exception:
+        return False
+    return True
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description='Compare parser backends')
+    arg_parser.add_argument('--generated', type=int, default=50, help='number of generated programs')
+    arg_parser.add_argument('--repeat', type=int, default=5, help='runs over each set, the best one is reported')
+    args = arg_parser.parse_args()
+    warnings.simplefilter('ignore')
+
+    samples = []
+    for path in sorted(glob.glob(os.path.join(ROOT, 'resources', 'input_program*.txt'))):
+        with open(path) as f:
+            samples.append(f.read())
+    generator = ProgramGenerator(seed=1)
+    generated = [generator.program(statements=20) for _ in range(args.generated)]
+    generated = [source for source in generated if _parses(source)]
+
+    for name, sources in (('samples', samples), ('generated', generated)):
+        times = {backend: measure(backend, sources, args.repeat) for backend in PARSER_BACKENDS}
+        cells = ['{0} {1:.3f} ms'.format(backend, ms) for backend, ms in times.items()]
+        print('{0} ({1} programs): {2} | pyparsing/rd {3:.1f}x'.format(
+            name, len(sources), ' | '.join(cells), times['pyparsing'] / times['rd']))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,605 @@
+import struct
+from typing import Dict, Iterable, List, Optional, Tuple
+
+
+class ClassFileError(Exception):
+    pass
+
+
+CLASS_MAGIC = 0xCAFEBABE
+# Версия, которую записывает jasmin.jar по умолчанию
+VERSION_MAJOR = 45
+VERSION_MINOR = 3
+
+ACC_FLAGS = {
+    'public': 0x0001, 'private': 0x0002, 'protected': 0x0004, 'static': 0x0008,
+    'final': 0x0010, 'synchronized': 0x0020, 'volatile': 0x0040, 'transient': 0x0080,
+    'native': 0x0100, 'interface': 0x0200, 'abstract': 0x0400,
+}
+ACC_SUPER = 0x0020
+
+CONSTANT_UTF8 = 1
+CONSTANT_INTEGER = 3
+CONSTANT_CLASS = 7
+CONSTANT_FIELDREF = 9
+CONSTANT_METHODREF = 10
+CONSTANT_NAME_AND_TYPE = 12
+
+# Инструкции без операндов
+SIMPLE_OPCODES = {
+    'nop': 0x00, 'aconst_null': 0x01,
+    'iconst_m1': 0x02, 'iconst_0': 0x03, 'iconst_1': 0x04, 'iconst_2': 0x05,
+    'iconst_3': 0x06, 'iconst_4': 0x07, 'iconst_5': 0x08,
+    'iload_0': 0x1a, 'iload_1': 0x1b, 'iload_2': 0x1c, 'iload_3': 0x1d,
+    'aload_0': 0x2a, 'aload_1': 0x2b, 'aload_2': 0x2c, 'aload_3': 0x2d,
+    'iaload': 0x2e, 'aaload': 0x32, 'baload': 0x33, 'caload': 0x34,
+    'istore_0': 0x3b, 'istore_1': 0x3c, 'istore_2': 0x3d, 'istore_3': 0x3e,
+    'astore_0': 0x4b, 'astore_1': 0x4c, 'astore_2': 0x4d, 'astore_3': 0x4e,
+    'iastore': 0x4f, 'aastore': 0x53, 'bastore': 0x54, 'castore': 0x55,
+    'pop': 0x57, 'pop2': 0x58, 'dup': 0x59, 'dup_x1': 0x5a, 'dup_x2': 0x5b, 'dup2': 0x5c, 'swap': 0x5f,
+    'iadd': 0x60, 'isub': 0x64, 'imul': 0x68, 'idiv': 0x6c, 'irem': 0x70, 'ineg': 0x74,
+    'ishl': 0x78, 'ishr': 0x7a, 'iushr': 0x7c, 'iand': 0x7e, 'ior': 0x80, 'ixor': 0x82,
+    'i2b': 0x91, 'i2c': 0x92, 'i2s': 0x93,
+    'ireturn': 0xac, 'areturn': 0xb0, 'return': 0xb1, 'arraylength': 0xbe, 'athrow': 0xbf,
+}
+# Инструкции с номером локальной переменной (u1)
+LOCAL_OPCODES = {'iload': 0x15, 'aload': 0x19, 'istore': 0x36, 'astore': 0x3a}
+# Переходы на метку (смещение s2)
+BRANCH_OPCODES = {
+    'ifeq': 0x99, 'ifne': 0x9a, 'iflt': 0x9b, 'ifge': 0x9c, 'ifgt': 0x9d, 'ifle': 0x9e,
+    'if_icmpeq': 0x9f, 'if_icmpne': 0xa0, 'if_icmplt': 0xa1, 'if_icmpge': 0xa2,
+    'if_icmpgt': 0xa3, 'if_icmple': 0xa4, 'if_acmpeq': 0xa5, 'if_acmpne': 0xa6,
+    'goto': 0xa7, 'ifnull': 0xc6, 'ifnonnull': 0xc7,
+}
+FIELD_OPCODES = {'getstatic': 0xb2, 'putstatic': 0xb3, 'getfield': 0xb4, 'putfield': 0xb5}
+METHOD_OPCODES = {'invokevirtual': 0xb6, 'invokespecial': 0xb7, 'invokestatic': 0xb8}
+NEWARRAY_TYPES = {
+    'boolean': 4, 'char': 5, 'float': 6, 'double': 7, 'byte': 8, 'short': 9, 'int': 10, 'long': 11,
+}
+OP_LDC = 0x12
+OP_LDC_W = 0x13
+OP_BIPUSH = 0x10
+OP_SIPUSH = 0x11
+OP_IINC = 0x84
+OP_NEWARRAY = 0xbc
+OP_WIDE = 0xc4
+
+
+# Операнд, который не помещается в поле инструкции, - ошибка ассемблирования, а не struct.error
+def _check_range(value: int, low: int, high: int, what: str) -> int:
+    if not low <= value <= high:
+        raise ClassFileError('{0} {1} does not fit in [{2}, {3}]'.format(what, value, low, high))
+    return value
+
+
+# Номер локальной переменной больше 255 и iinc с константой вне s1 требуют префикса wide
+def _is_wide(insn: tuple) -> bool:
+    if insn[0] == 'local':
+        return insn[2] > 255
+    if insn[0] == 'iinc':
+        return insn[2] > 255 or not -128 <= insn[3] <= 127
+    return False
+
+
+# String.hashCode из Java: по кодовым единицам UTF-16, с переполнением int
+def java_string_hash(s: str) -> int:
+    data = s.encode('utf-16-be')
+    h = 0
+    for i in range(0, len(data), 2):
+        h = (31 * h + (data[i] << 8 | data[i + 1])) & 0xFFFFFFFF
+    return h
+
+
+# Повторяет порядок обхода java.util.Hashtable (емкость 11, коэффициент 0.75,
+# новые элементы в начало цепочки, обход корзин с конца). В таком порядке
+# jasmin.jar записывает пул констант, и только так .class совпадает с ним побайтно
+class _JavaHashtable:
+    def __init__(self):
+        self.table: List[list] = [[] for _ in range(11)]
+        self.threshold = 8
+        self.count = 0
+
+    def put(self, key: str, value) -> None:
+        if self.count >= self.threshold:
+            self._rehash()
+        h = java_string_hash(key)
+        self.table[(h & 0x7FFFFFFF) % len(self.table)].insert(0, (h, value))
+        self.count += 1
+
+    def _rehash(self) -> None:
+        old = self.table
+        capacity = len(old) * 2 + 1
+        self.table = [[] for _ in range(capacity)]
+        for i in range(len(old) - 1, -1, -1):
+            for entry in old[i]:
+                self.table[(entry[0] & 0x7FFFFFFF) % capacity].insert(0, entry)
+        self.threshold = int(capacity * 0.75)
+
+    def values(self) -> Iterable:
+        for i in range(len(self.table) - 1, -1, -1):
+            for entry in self.table[i]:
+                yield entry[1]
+
+
+# Пул констант. Элемент задается ключом (как uniq в jasmin), видом и ссылками;
+# ссылки на другие элементы добавляются сразу после самого элемента, как в jas.ClassEnv.addCPItem
+class ConstantPool:
+    def __init__(self):
+        self._entries: Dict[str, tuple] = {}
+        self._order = _JavaHashtable()
+        self._index: Optional[Dict[str, int]] = None
+
+    def _add(self, key: str, entry: tuple) -> str:
+        if key not in self._entries:
+            if self._index is not None:
+                raise ClassFileError('Constant pool is already frozen')
+            self._entries[key] = entry
+            self._order.put(key, key)
+            for ref in entry[1:]:
+                if isinstance(ref, tuple):
+                    ref[0](self, *ref[1:])
+        return key
+
+    def utf8(self, value: str) -> str:
+        return self._add(value, (CONSTANT_UTF8, value))
+
+    def integer(self, value: int) -> str:
+        return self._add('Integer: @#$' + str(value), (CONSTANT_INTEGER, value))
+
+    def class_ref(self, name: str) -> str:
+        return self._add('CLASS: #$%^#$' + name, (CONSTANT_CLASS, (ConstantPool.utf8, name)))
+
+    def name_and_type(self, name: str, desc: str) -> str:
+        return self._add('NT : @#$%' + name + 'SD#$' + desc,
+                         (CONSTANT_NAME_AND_TYPE, (ConstantPool.utf8, name), (ConstantPool.utf8, desc)))
+
+    def field_ref(self, cls: str, name: str, desc: str) -> str:
+        return self._add(cls + '&%$#&' + name + '*()#$' + desc,
+                         (CONSTANT_FIELDREF, (ConstantPool.class_ref, cls),
+                          (ConstantPool.name_and_type, name, desc)))
+
+    def method_ref(self, cls: str, name: str, desc: str) -> str:
+        return self._add(cls + '&%$91&' + name + '*(012$' + desc,
+                         (CONSTANT_METHODREF, (ConstantPool.class_ref, cls),
+                          (ConstantPool.name_and_type, name, desc)))
+
+    def index(self, key: str) -> int:
+        if self._index is None:
+            self._index = {k: i for i, k in enumerate(self._order.values(), 1)}
+        return self._index[key]
+
+    def to_bytes(self) -> bytes:
+        keys = list(self._order.values())
+        out = [struct.pack('>H', len(keys) + 1)]
+        for key in keys:
+            entry = self._entries[key]
+            tag = entry[0]
+            if tag == CONSTANT_UTF8:
+                data = entry[1].encode('utf-8')
+                out.append(struct.pack('>BH', tag, len(data)) + data)
+            elif tag == CONSTANT_INTEGER:
+                out.append(struct.pack('>Bi', tag, entry[1]))
+            else:
+                refs = [self.index(self._ref_key(ref)) for ref in entry[1:]]
+                out.append(struct.pack('>B' + 'H' * len(refs), tag, *refs))
+        return b''.join(out)
+
+    @staticmethod
+    def _ref_key(ref: tuple) -> str:
+        add, *args = ref
+        if add is ConstantPool.utf8:
+            return args[0]
+        if add is ConstantPool.class_ref:
+            return 'CLASS: #$%^#$' + args[0]
+        return 'NT : @#$%' + args[0] + 'SD#$' + args[1]
+
+
+# Метод класса: инструкции хранятся в разобранном виде до заморозки пула констант,
+# т.к. размер ldc (ldc или ldc_w) зависит от индекса константы
+class _Method:
+    def __init__(self, access: int, name: str, desc: str):
+        self.access = access
+        self.name = name
+        self.desc = desc
+        self.max_stack: Optional[int] = None
+        self.max_locals: Optional[int] = None
+        self.insns: List[tuple] = []
+        self.labels: Dict[str, int] = {}
+
+
+def _split_member(spec: str) -> Tuple[str, str]:
+    cls_name, _, member = spec.rpartition('/')
+    if not cls_name:
+        raise ClassFileError('Expected class/member, got {0!r}'.format(spec))
+    return cls_name, member
+
+
+# Число слотов стека/локальных переменных под значение типа (long и double - два)
+def _type_slots(desc: str) -> int:
+    if desc == 'V':
+        return 0
+    return 2 if desc in ('J', 'D') else 1
+
+
+def _arg_slots(desc: str) -> int:
+    args = desc[1:desc.index(')')]
+    slots, i = 0, 0
+    while i < len(args):
+        start = i
+        while args[i] == '[':
+            i += 1
+        if args[i] == 'L':
+            i = args.index(';', i)
+        slots += 1 if i > start else _type_slots(args[i])
+        i += 1
+    return slots
+
+
+# Действие инструкций на стек операндов: (снимает, кладет)
+STACK_EFFECTS = {
+    'nop': (0, 0), 'aconst_null': (0, 1), 'pop': (1, 0), 'pop2': (2, 0), 'swap': (2, 2),
+    'dup': (1, 2), 'dup_x1': (2, 3), 'dup_x2': (3, 4), 'dup2': (2, 4),
+    'iaload': (2, 1), 'aaload': (2, 1), 'baload': (2, 1), 'caload': (2, 1),
+    'iastore': (3, 0), 'aastore': (3, 0), 'bastore': (3, 0), 'castore': (3, 0),
+    'ineg': (1, 1), 'i2b': (1, 1), 'i2c': (1, 1), 'i2s': (1, 1), 'arraylength': (1, 1),
+    'ireturn': (1, 0), 'areturn': (1, 0), 'return': (0, 0), 'athrow': (1, 0),
+    'goto': (0, 0), 'ifnull': (1, 0), 'ifnonnull': (1, 0),
+    'iload': (0, 1), 'aload': (0, 1), 'istore': (1, 0), 'astore': (1, 0),
+    'bipush': (0, 1), 'sipush': (0, 1), 'iinc': (0, 0), 'newarray': (1, 1),
+}
+STACK_EFFECTS.update((op, (0, 1)) for op in SIMPLE_OPCODES
+                     if op.startswith(('iconst_', 'iload_', 'aload_')))
+STACK_EFFECTS.update((op, (1, 0)) for op in SIMPLE_OPCODES if op.startswith(('istore_', 'astore_')))
+STACK_EFFECTS.update((op, (2, 1)) for op in ('iadd', 'isub', 'imul', 'idiv', 'irem',
+                                              'ishl', 'ishr', 'iushr', 'iand', 'ior', 'ixor'))
+STACK_EFFECTS.update((op, (1, 0)) for op in ('ifeq', 'ifne', 'iflt', 'ifge', 'ifgt', 'ifle'))
+STACK_EFFECTS.update((op, (2, 0)) for op in BRANCH_OPCODES if op.startswith(('if_icmp', 'if_acmp')))
+_OPCODE_EFFECTS = {}
+for _table in (SIMPLE_OPCODES, LOCAL_OPCODES, BRANCH_OPCODES):
+    _OPCODE_EFFECTS.update((code, STACK_EFFECTS[op]) for op, code in _table.items())
+_OPCODE_EFFECTS[OP_BIPUSH] = _OPCODE_EFFECTS[OP_SIPUSH] = (0, 1)
+_OPCODE_EFFECTS[OP_IINC] = (0, 0)
+_OPCODE_EFFECTS[OP_NEWARRAY] = (1, 1)
+# iload_0 ... astore_3: номер переменной задан в самом коде операции
+_IMPLICIT_LOCALS = {code: int(op[-1]) for op, code in SIMPLE_OPCODES.items() if op[:-2] in LOCAL_OPCODES}
+# После этих инструкций управление не переходит к следующей
+_FLOW_ENDS = frozenset(SIMPLE_OPCODES[op] for op in ('ireturn', 'areturn', 'return', 'athrow')) \
+    | {BRANCH_OPCODES['goto']}
+
+
+def _stack_effect(insn: tuple) -> Tuple[int, int]:
+    kind = insn[0]
+    if kind == 'ldc':
+        return 0, 1
+    if kind == 'field':
+        size = _type_slots(insn[2][2])
+        return {0xb2: (0, size), 0xb3: (size, 0), 0xb4: (1, size), 0xb5: (1 + size, 0)}[insn[1]]
+    if kind == 'method':
+        desc = insn[2][2]
+        receiver = 0 if insn[1] == METHOD_OPCODES['invokestatic'] else 1
+        return _arg_slots(desc) + receiver, _type_slots(desc[desc.index(')') + 1:])
+    return _OPCODE_EFFECTS[insn[1]]
+
+
+# Максимальная глубина стека операндов: обход всех путей исполнения от начала
+# метода; на метке высоты стека от разных путей должны совпадать (как требует верификатор JVM)
+def compute_max_stack(insns: List[tuple], labels: Dict[str, int]) -> int:
+    heights: List[Optional[int]] = [None] * (len(insns) + 1)
+    pending = [(0, 0)]
+    max_height = 0
+    while pending:
+        i, height = pending.pop()
+        while i < len(insns):
+            if heights[i] is not None:
+                if heights[i] != height:
+                    raise ClassFileError('Inconsistent stack height at instruction {0}: {1} and {2}'
+                                         .format(i, heights[i], height))
+                break
+            heights[i] = height
+            insn = insns[i]
+            pops, pushes = _stack_effect(insn)
+            if height < pops:
+                raise ClassFileError('Stack underflow at instruction {0}'.format(i))
+            height += pushes - pops
+            max_height = max(max_height, height)
+            if insn[0] == 'branch':
+                if insn[2] not in labels:
+                    raise ClassFileError('Undefined label {0!r}'.format(insn[2]))
+                pending.append((labels[insn[2]], height))
+            if insn[1] in _FLOW_ENDS and insn[0] in ('simple', 'branch'):
+                break
+            i += 1
+    return max_height
+
+
+# Число локальных переменных: не меньше слотов под аргументы, min_locals
+# и наибольшего использованного индекса + 1
+def compute_max_locals(insns: List[tuple], desc: str, is_static: bool = True, min_locals: int = 0) -> int:
+    max_locals = max(min_locals, _arg_slots(desc) + (0 if is_static else 1))
+    for insn in insns:
+        kind = insn[0]
+        if kind == 'local' or kind == 'iinc':
+            max_locals = max(max_locals, insn[2] + 1)
+        elif kind == 'simple' and insn[1] in _IMPLICIT_LOCALS:
+            max_locals = max(max_locals, _IMPLICIT_LOCALS[insn[1]] + 1)
+    return max_locals
+
+
+# Точные .limit stack/locals для тела метода в виде строк Jasmin
+def method_limits(header: str, body: Iterable[str], min_locals: int = 0) -> Tuple[int, int]:
+    words = header.split()
+    spec = words[-1]
+    desc = spec[spec.index('('):]
+    insns: List[tuple] = []
+    labels: Dict[str, int] = {}
+    for chunk in body:
+        for line in chunk.split('\n'):
+            parts = line.split()
+            if not parts or parts[0][0] == '.':
+                continue
+            if parts[0][-1] == ':' and len(parts) == 1:
+                labels[parts[0][:-1]] = len(insns)
+            else:
+                insns.append(parse_instruction(parts[0], parts[1:]))
+    return (compute_max_stack(insns, labels),
+            compute_max_locals(insns, desc, 'static' in words, min_locals))
+
+
+# Разбор одной инструкции в кортеж (вид, код операции, операнды...)
+def parse_instruction(op: str, args: List[str]) -> tuple:
+    if op in SIMPLE_OPCODES:
+        insn = ('simple', SIMPLE_OPCODES[op])
+    elif op in BRANCH_OPCODES:
+        if not args:
+            raise ClassFileError('Missing label for {0}'.format(op))
+        insn = ('branch', BRANCH_OPCODES[op], args[0])
+    elif op in LOCAL_OPCODES:
+        insn = ('local', LOCAL_OPCODES[op], int(args[0]))
+    elif op in FIELD_OPCODES:
+        cls_name, field_name = _split_member(args[0])
+        insn = ('field', FIELD_OPCODES[op], (cls_name, field_name, args[1]))
+    elif op in METHOD_OPCODES:
+        spec = args[0]
+        paren = spec.find('(')
+        cls_name, method_name = _split_member(spec[:paren])
+        insn = ('method', METHOD_OPCODES[op], (cls_name, method_name, spec[paren:]))
+    elif op in ('ldc', 'ldc_w'):
+        try:
+            value = int(args[0])
+        except ValueError:
+            raise ClassFileError('Only integer constants are supported by ldc, got {0!r}'.format(args[0]))
+        insn = ('ldc', op == 'ldc_w', value)
+    elif op == 'bipush':
+        insn = ('push', OP_BIPUSH, int(args[0]))
+    elif op == 'sipush':
+        insn = ('push', OP_SIPUSH, int(args[0]))
+    elif op == 'iinc':
+        insn = ('iinc', OP_IINC, int(args[0]), int(args[1]))
+    elif op == 'newarray':
+        if args[0] not in NEWARRAY_TYPES:
+            raise ClassFileError('Unknown array type {0!r}'.format(args[0]))
+        insn = ('newarray', OP_NEWARRAY, NEWARRAY_TYPES[args[0]])
+    else:
+        raise ClassFileError('Unknown instruction {0!r}'.format(op))
+    return insn
+
+
+# Ассемблер подмножества Jasmin, которое порождает CodeGenerator: пишет .class
+# без JVM и jasmin.jar. source_file - имя для атрибута SourceFile (jasmin
+# записывает туда имя .j-файла); при None атрибут не пишется
+class ClassFileWriter:
+    def __init__(self, source_file: Optional[str] = None):
+        self.source_file = source_file
+        self.pool = ConstantPool()
+        self.class_name: Optional[str] = None
+        self.access = 0
+        self.super_name: Optional[str] = None
+        self.fields: List[Tuple[int, str, str]] = []
+        self.methods: List[_Method] = []
+        self._method: Optional[_Method] = None
+
+    def assemble(self, code: Iterable[str]) -> bytes:
+        for chunk in code:
+            for line in chunk.split('\n'):
+                line = line.strip()
+                if line:
+                    self._line(line)
+        if self._method is not None:
+            raise ClassFileError('Missing .end method for {0}'.format(self._method.name))
+        if self.class_name is None:
+            raise ClassFileError('Missing .class directive')
+        return self.to_bytes()
+
+    def _line(self, line: str) -> None:
+        parts = line.split()
+        head = parts[0]
+        if head[0] == '.':
+            self._directive(head, parts[1:])
+        elif head[-1] == ':' and len(parts) == 1:
+            method = self._current_method(line)
+            if head[:-1] in method.labels:
+                raise ClassFileError('Duplicate label {0!r} in {1}'.format(head[:-1], method.name))
+            method.labels[head[:-1]] = len(method.insns)
+        else:
+            self._instruction(self._current_method(line), head, parts[1:])
+
+    def _current_method(self, line: str) -> _Method:
+        if self._method is None:
+            raise ClassFileError('Instruction outside of a method: {0!r}'.format(line))
+        return self._method
+
+    @staticmethod
+    def _access(words: List[str]) -> int:
+        access = 0
+        for word in words:
+            if word not in ACC_FLAGS:
+                raise ClassFileError('Unknown access flag {0!r}'.format(word))
+            access |= ACC_FLAGS[word]
+        return access
+
+    def _directive(self, name: str, args: List[str]) -> None:
+        pool = self.pool
+        if name == '.class':
+            self.access = self._access(args[:-1]) | ACC_SUPER
+            self.class_name = args[-1]
+            pool.class_ref(self.class_name)
+        elif name == '.super':
+            self.super_name = args[0]
+            pool.class_ref(self.super_name)
+        elif name == '.field':
+            field_name, desc = args[-2], args[-1]
+            self.fields.append((self._access(args[:-2]), field_name, desc))
+            pool.utf8(field_name)
+            pool.utf8(desc)
+        elif name == '.method':
+            spec = args[-1]
+            paren = spec.find('(')
+            if paren <= 0:
+                raise ClassFileError('Bad method signature {0!r}'.format(spec))
+            self._method = _Method(self._access(args[:-1]), spec[:paren], spec[paren:])
+        elif name == '.limit':
+            method = self._current_method('.limit')
+            if args[0] == 'stack':
+                method.max_stack = int(args[1])
+            elif args[0] == 'locals':
+                method.max_locals = int(args[1])
+            else:
+                raise ClassFileError('Unknown .limit {0!r}'.format(args[0]))
+        elif name == '.end' and args == ['method']:
+            self._end_method(self._current_method('.end method'))
+        else:
+            raise ClassFileError('Unsupported directive {0}'.format(name))
+
+    # Константы метода попадают в пул при его завершении, как при addMethod в jasmin
+    def _end_method(self, method: _Method) -> None:
+        pool = self.pool
+        pool.utf8(method.name)
+        pool.utf8(method.desc)
+        pool.utf8('Code')
+        for insn in method.insns:
+            kind = insn[0]
+            if kind == 'ldc':
+                pool.integer(insn[2])
+            elif kind == 'field':
+                pool.field_ref(*insn[2])
+            elif kind == 'method':
+                pool.method_ref(*insn[2])
+        self.methods.append(method)
+        self._method = None
+
+    def _instruction(self, method: _Method, op: str, args: List[str]) -> None:
+        method.insns.append(parse_instruction(op, args))
+
+    def _insn_size(self, insn: tuple) -> int:
+        kind = insn[0]
+        if kind == 'simple':
+            return 1
+        if kind == 'local':
+            return 4 if _is_wide(insn) else 2
+        if kind == 'iinc':
+            return 6 if _is_wide(insn) else 3
+        if kind == 'newarray':
+            return 2
+        if kind == 'ldc':
+            return 3 if insn[1] or self.pool.index(self.pool.integer(insn[2])) > 255 else 2
+        if kind == 'push':
+            return 2 if insn[1] == OP_BIPUSH else 3
+        return 3
+
+    def _code(self, method: _Method) -> bytes:
+        pool = self.pool
+        offsets = []
+        pc = 0
+        for insn in method.insns:
+            offsets.append(pc)
+            pc += self._insn_size(insn)
+        offsets.append(pc)
+
+        out = bytearray()
+        for i, insn in enumerate(method.insns):
+            kind = insn[0]
+            if kind == 'simple':
+                out.append(insn[1])
+            elif kind == 'branch':
+                if insn[2] not in method.labels:
+                    raise ClassFileError('Undefined label {0!r} in {1}'.format(insn[2], method.name))
+                offset = offsets[method.labels[insn[2]]] - offsets[i]
+                out += struct.pack('>Bh', insn[1], _check_range(offset, -32768, 32767, 'Branch offset'))
+            elif kind == 'local':
+                index = _check_range(insn[2], 0, 65535, 'Local variable index')
+                if _is_wide(insn):
+                    out += struct.pack('>BBH', OP_WIDE, insn[1], index)
+                else:
+                    out += struct.pack('>BB', insn[1], index)
+            elif kind == 'newarray':
+                out += struct.pack('>BB', insn[1], insn[2])
+            elif kind == 'field':
+                out += struct.pack('>BH', insn[1], pool.index(pool.field_ref(*insn[2])))
+            elif kind == 'method':
+                out += struct.pack('>BH', insn[1], pool.index(pool.method_ref(*insn[2])))
+            elif kind == 'ldc':
+                index = pool.index(pool.integer(insn[2]))
+                if offsets[i + 1] - offsets[i] == 2:
+                    out += struct.pack('>BB', OP_LDC, index)
+                else:
+                    out += struct.pack('>BH', OP_LDC_W, index)
+            elif kind == 'push':
+                if insn[1] == OP_BIPUSH:
+                    out += struct.pack('>Bb', insn[1], _check_range(insn[2], -128, 127, 'bipush operand'))
+                else:
+                    out += struct.pack('>Bh', insn[1], _check_range(insn[2], -32768, 32767, 'sipush operand'))
+            elif kind == 'iinc':
+                index = _check_range(insn[2], 0, 65535, 'Local variable index')
+                value = _check_range(insn[3], -32768, 32767, 'iinc constant')
+                if _is_wide(insn):
+                    out += struct.pack('>BBHh', OP_WIDE, insn[1], index, value)
+                else:
+                    out += struct.pack('>BBb', insn[1], index, value)
+        return bytes(out)
+
+    def _method_bytes(self, method: _Method) -> bytes:
+        pool = self.pool
+        code = self._code(method)
+        # без .limit пределы вычисляются анализом кода
+        max_stack = method.max_stack
+        if max_stack is None:
+            max_stack = compute_max_stack(method.insns, method.labels)
+        max_locals = method.max_locals
+        if max_locals is None:
+            max_locals = compute_max_locals(method.insns, method.desc, bool(method.access & ACC_FLAGS['static']))
+        _check_range(max_stack, 0, 65535, 'max_stack of {0}'.format(method.name))
+        _check_range(max_locals, 0, 65535, 'max_locals of {0}'.format(method.name))
+        # JVM не принимает методы длиннее 65535 байт кода
+        _check_range(len(code), 1, 65535, 'Code length of {0}'.format(method.name))
+        body = struct.pack('>HHI', max_stack, max_locals, len(code)) + code + struct.pack('>HH', 0, 0)
+        return (struct.pack('>HHHH', method.access, pool.index(method.name), pool.index(method.desc), 1)
+                + struct.pack('>HI', pool.index('Code'), len(body)) + body)
+
+    def to_bytes(self) -> bytes:
+        pool = self.pool
+        if self.super_name is None:
+            self.super_name = 'java/lang/Object'
+            pool.class_ref(self.super_name)
+        if self.source_file is not None:
+            pool.utf8('SourceFile')
+            pool.utf8(self.source_file)
+
+        out = [struct.pack('>IHH', CLASS_MAGIC, VERSION_MINOR, VERSION_MAJOR), pool.to_bytes(),
+               struct.pack('>HHHH', self.access, pool.index(pool.class_ref(self.class_name)),
+                           pool.index(pool.class_ref(self.super_name)), 0),
+               struct.pack('>H', len(self.fields))]
+        for access, name, desc in self.fields:
+            out.append(struct.pack('>HHHH', access, pool.index(name), pool.index(desc), 0))
+        out.append(struct.pack('>H', len(self.methods)))
+        out.extend(self._method_bytes(method) for method in self.methods)
+        if self.source_file is not None:
+            out.append(struct.pack('>HHIH', 1, pool.index('SourceFile'), 2, pool.index(self.source_file)))
+        else:
+            out.append(struct.pack('>H', 0))
+        return b''.join(out)
+
+
+def assemble(code: Iterable[str], source_file: Optional[str] = None) -> Tuple[str, bytes]:
+    writer = ClassFileWriter(source_file)
+    data = writer.assemble(code)
+    return writer.class_name, data
@@ -0,0 +1,92 @@
+import argparse
+import base64
+import json
+import os
+import socket
+import sys
+
+from protocol import *
+
+# Тонкий клиент сервера компиляции (server.py, запуск - main.py --serve): импортирует
+# только протокол, поэтому не платит за загрузку pyparsing и построение грамматики
+_EMIT_SUFFIXES = {'class': '.class', 'jasmin': '.j'}
+
+
+def connect(socket_path: str = DEFAULT_SOCKET) -> socket.socket:
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(socket_path)
+    except OSError:
+        sock.close()
+        raise
+    return sock
+
+
+def request(sock: socket.socket, message: dict) -> dict:
+    send_message(sock, message)
+    response = recv_message(sock)
+    if response is None:
+        raise ProtocolError('Server closed the connection')
+    return response
+
+
+# Компиляция одного файла на сервере; результат пишется рядом с исходным файлом
+# или в output_dir под тем же именем, что у main.py. Возвращает текст ошибки или None
+def compile_file(sock: socket.socket, source_path: str, output_dir: str = None, emit: str = 'class'):
+    with open(source_path) as f:
+        source = f.read()
+    stem = os.path.splitext(os.path.basename(source_path))[0]
+    response = request(sock, {'op': 'compile', 'source': source, 'emit': emit,
+                              'source_file': stem + _EMIT_SUFFIXES['jasmin']})
+    if not response.get('ok'):
+        return '; '.join(response.get('diagnostics') or ['compilation failed'])
+    # .class называется по имени класса внутри него, иначе JVM его не загрузит
+    name = response['class_name'] if emit == 'class' else stem
+    output_path = os.path.join(output_dir or os.path.dirname(source_path), name + _EMIT_SUFFIXES[emit])
+    if emit == 'class':
+        with open(output_path, 'wb') as f:
+            f.write(base64.b64decode(response['class']))
+    else:
+        with open(output_path, 'w') as f:
+            f.write(response['jasmin'])
+    return None
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description='Client for the Pascal compile server')
+    arg_parser.add_argument('inputs', nargs='*', help='source files to compile')
+    arg_parser.add_argument('--socket', default=DEFAULT_SOCKET, help='server socket path')
+    arg_parser.add_argument('-o', '--output-dir', help='directory for output files (default: next to the source)')
+    arg_parser.add_argument('--emit', choices=tuple(_EMIT_SUFFIXES), default='class')
+    arg_parser.add_argument('--stats', action='store_true', help='print request count and latency percentiles')
+    arg_parser.add_argument('--shutdown', action='store_true', help='stop the server')
+    args = arg_parser.parse_args()
+    if not (args.inputs or args.stats or args.shutdown):
+        arg_parser.error('nothing to do: give source files, --stats or --shutdown')
+
+    try:
+        sock = connect(args.socket)
+    except OSError as e:
+        print('Cannot connect to {0}: {1}'.format(args.socket, e), file=sys.stderr)
+        sys.exit(2)
+    failed = 0
+    with sock:
+        if args.output_dir:
+            os.makedirs(args.output_dir, exist_ok=True)
+        for path in args.inputs:
+            try:
+                error = compile_file(sock, path, args.output_dir, args.emit)
+            except OSError as e:
+                error = str(e)
+            if error is not None:
+                print('{0}: {1}'.format(path, error), file=sys.stderr)
+                failed += 1
+        if args.stats:
+            print(json.dumps(request(sock, {'op': 'stats'}), indent=2))
+        if args.shutdown:
+            request(sock, {'op': 'shutdown'})
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,214 @@
+from interpreter import _Resolver, _Routine, _div, _mod, _format
+from nodes import *
+from symbols import VarSymbol
+
+_HALF = 0x80000000
+_MASK = 0xFFFFFFFF
+
+# Тело замыкания для каждой операции. Арифметика integer - 32 бита со знаком,
+# как в _BIN_OPS интерпретатора; and/or вычисляют оба операнда
+_BIN_OPS = {
+    BinOp.ADD: '(({0} + {1} + 0x80000000) & 0xFFFFFFFF) - 0x80000000',
+    BinOp.SUB: '(({0} - {1} + 0x80000000) & 0xFFFFFFFF) - 0x80000000',
+    BinOp.MUL: '(({0} * {1} + 0x80000000) & 0xFFFFFFFF) - 0x80000000',
+    BinOp.DIVISION: '_div({0}, {1})',
+    BinOp.DIV: '_div({0}, {1})',
+    BinOp.MOD: '_mod({0}, {1})',
+    BinOp.EQ: '{0} == {1}',
+    BinOp.NE: '{0} != {1}',
+    BinOp.LT: '{0} < {1}',
+    BinOp.LE: '{0} <= {1}',
+    BinOp.GT: '{0} > {1}',
+    BinOp.GE: '{0} >= {1}',
+    BinOp.LOGICAL_AND: '{0} & {1}',
+    BinOp.LOGICAL_OR: '{0} | {1}',
+}
+# Операнд: константа, глобальная ячейка (список и номер), параметр (номер в кадре)
+# или вложенное выражение. Константы и ячейки читаются прямо в теле замыкания операции,
+# без вызова замыкания операнда
+CONST, CELL, LOCAL, EXPR = 'const', 'cell', 'local', 'expr'
+_OPERANDS = {CONST: 'c{0}', CELL: 'g{0}[i{0}]', LOCAL: 'f[i{0}]', EXPR: 'e{0}(f)'}
+_factories = {}
+
+
+# Фабрика замыканий для (операция, вид операнда 1, вид операнда 2): создается один раз
+# на процесс, дальше make(...) только связывает значения операндов
+def _factory(op: BinOp, kind1: str, kind2: str):
+    key = (op, kind1, kind2)
+    make = _factories.get(key)
+    if make is None:
+        body = _BIN_OPS[op].format(_OPERANDS[kind1].format(1), _OPERANDS[kind2].format(2))
+        namespace = {'_div': _div, '_mod': _mod}
+        exec('def make(c1, g1, i1, e1, c2, g2, i2, e2):\n    return lambda f: ' + body, namespace)
+        make = _factories[key] = namespace['make']
+    return make
+
+
+# Перевод AST в замыкания Python: выражение становится функцией frame -> значение,
+# оператор - функцией frame -> None. Ячейки переменных связываются при компиляции
+# (номер из VarSymbol.index, список глобальных переменных или элементов массива),
+# поэтому при исполнении нет ни поиска имен, ни диспетчеризации по типу узла.
+# Области видимости и объявления - как у интерпретатора (_Resolver)
+class ClosureCompiler(_Resolver):
+    def __init__(self, ctx):
+        super().__init__(ctx)
+        # замыкание-операнд -> (вид, константа, список, номер) для констант и ячеек
+        self.operands = {}
+
+    def _operand(self, fn, kind: str, value=None, cells=None, index=None):
+        self.operands[fn] = (kind, value, cells, index)
+        return fn
+
+    # Чтение переменной; для функции это и выражение-результат _Routine.result
+    def _variable(self, name: str):
+        cells, index = self._cell(name)
+        if cells is None:
+            return self._operand(lambda f: f[index], LOCAL, index=index)
+        return self._operand(lambda f: cells[index], CELL, cells=cells, index=index)
+
+    # (список, номер) для глобальной переменной или элемента массива, (None, номер) для параметра
+    def _cell(self, name: str):
+        symbol = self._lookup(name)
+        if type(symbol) is not VarSymbol:
+            raise Exception("'%s' is not a variable" % name)
+        if symbol.is_field:
+            return self.ctx.globals, symbol.index
+        return None, symbol.index
+
+    def _target_cell(self, var: AstNode):
+        if isinstance(var, ArrayIdentNode):
+            element = super().visit_ArrayIdentNode(var)
+            return element.cells, element.index
+        return self._cell(var.name)
+
+    def _setter(self, var: AstNode):
+        cells, index = self._target_cell(var)
+        if cells is None:
+            def put(f, value):
+                f[index] = value
+        else:
+            def put(f, value):
+                cells[index] = value
+        return put
+
+    def visit_LiteralNode(self, node: LiteralNode):
+        value = node.value
+        return self._operand(lambda f: value, CONST, value=value)
+
+    def visit_ArrayIdentNode(self, node: ArrayIdentNode):
+        element = super().visit_ArrayIdentNode(node)
+        cells, index = element.cells, element.index
+        return self._operand(lambda f: cells[index], CELL, cells=cells, index=index)
+
+    def visit_BinOpNode(self, node: BinOpNode):
+        arg1 = yield node.arg1
+        arg2 = yield node.arg2
+        kind1, c1, g1, i1 = self.operands.get(arg1, (EXPR, None, None, None))
+        kind2, c2, g2, i2 = self.operands.get(arg2, (EXPR, None, None, None))
+        return _factory(node.op, kind1, kind2)(c1, g1, i1, arg1, c2, g2, i2, arg2)
+
+    def visit_CallNode(self, node: CallNode):
+        name = node.func.name
+        op = yield from super().visit_CallNode(node)
+        if name in ('Write', 'WriteLn'):
+            write, args = op.write, op.args
+
+            def call(f):
+                for arg in args:
+                    write(_format(arg(f)) + '\n')
+            return call
+        if name in ('Read', 'ReadLn'):
+            return op.ex
+        routine, args, tick = op.routine, op.args, op.tick
+        return self._call(routine, args, tick)
+
+    def _call(self, routine: _Routine, args, tick):
+        def call(f):
+            callee = [arg(f) for arg in args]
+            tick()
+            routine.body(callee)
+            result = routine.result
+            return result(callee) if result is not None else None
+        return call
+
+    def visit_AssignNode(self, node: AssignNode):
+        cells, index = self._target_cell(node.var)
+        val = yield node.val
+        if cells is None:
+            def assign(f):
+                f[index] = val(f)
+        else:
+            def assign(f):
+                cells[index] = val(f)
+        return assign
+
+    def visit_StmtListNode(self, node: StmtListNode):
+        stmts = []
+        for stmt in node.exprs:
+            stmts.append((yield stmt))
+        if len(stmts) == 1:
+            return stmts[0]
+        stmts = tuple(stmts)
+
+        def block(f):
+            for stmt in stmts:
+                stmt(f)
+        return block
+
+    def visit_IfNode(self, node: IfNode):
+        cond = yield node.cond
+        then_stmt = yield node.then_stmt
+        if node.else_stmt is None:
+            def if_(f):
+                if cond(f):
+                    then_stmt(f)
+            return if_
+        else_stmt = yield node.else_stmt
+
+        def if_else(f):
+            if cond(f):
+                then_stmt(f)
+            else:
+                else_stmt(f)
+        return if_else
+
+    def visit_WhileNode(self, node: WhileNode):
+        cond = yield node.cond
+        body = yield node.stmt_list
+        tick = self.ctx.tick
+
+        def while_(f):
+            while cond(f):
+                body(f)
+                tick()
+        return while_
+
+    def visit_RepeatNode(self, node: RepeatNode):
+        body = yield node.stmt_list
+        cond = yield node.cond
+        tick = self.ctx.tick
+
+        def repeat(f):
+            while True:
+                body(f)
+                if cond(f):
+                    return
+                tick()
+        return repeat
+
+    def visit_ForNode(self, node: ForNode):
+        init = yield node.init
+        to = yield node.to
+        body = yield node.body
+        var = yield node.init.var
+        put = self._setter(node.init.var)
+        tick = self.ctx.tick
+
+        def for_(f):
+            init(f)
+            last = to(f)
+            while var(f) <= last:
+                body(f)
+                put(f, ((var(f) + 1 + _HALF) & _MASK) - _HALF)
+                tick()
+        return for_
@@ -0,0 +1,137 @@
+import hashlib
+import os
+import pickle
+import tempfile
+from contextlib import suppress
+from typing import List, Optional, Tuple, Union
+
+from nodes import ProgramNode
+
+# Модули, от которых зависит результат компиляции: их содержимое входит в отпечаток версии компилятора
+_COMPILER_MODULES = ('lexer.py', 'rd_parser.py', 'grammar.py', 'myParser.py', 'nodes.py',
+                     'jasmin.py', 'peephole.py', 'folding.py', 'symbols.py', 'semantic.py', 'compiler.py')
+_ENTRY_SUFFIX = '.ast'
+
+_fingerprint = None
+
+
+def compiler_fingerprint() -> str:
+    global _fingerprint
+    if _fingerprint is None:
+        digest = hashlib.sha256()
+        base_dir = os.path.dirname(os.path.abspath(__file__))
+        for module in _COMPILER_MODULES:
+            digest.update(module.encode())
+            with open(os.path.join(base_dir, module), 'rb') as f:
+                digest.update(f.read())
+        _fingerprint = digest.hexdigest()
+    return _fingerprint
+
+
+# Кэш на диске: ключ - хэш исходного текста, парсера, набора оптимизаций и версии компилятора,
+# значение - сериализованное AST-дерево и строки Jasmin-кода.
+# При превышении max_bytes удаляются записи, к которым дольше всего не обращались (LRU по mtime),
+# пока размер не опустится до EVICT_RATIO от max_bytes - иначе каждая следующая запись снова
+# запускала бы вытеснение. Размер кэша считается одним обходом каталога при создании и дальше
+# обновляется при каждой записи; другие процессы с тем же каталогом этот счетчик не видят,
+# поэтому при вытеснении каталог обходится заново
+class CompileCache:
+    DEFAULT_DIR = '.pascal_cache'
+    DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+    EVICT_RATIO = 0.9
+
+    def __init__(self, directory: str = DEFAULT_DIR, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(directory, exist_ok=True)
+        self.total_bytes = sum(size for _, size, _ in self._entries())
+
+    @staticmethod
+    def key(source: Union[str, bytes], backend: str, options: str = '') -> str:
+        digest = hashlib.sha256()
+        digest.update(compiler_fingerprint().encode())
+        digest.update(backend.encode())
+        digest.update(b'\0')
+        digest.update(options.encode())
+        digest.update(b'\0')
+        digest.update(source.encode() if isinstance(source, str) else source)
+        return digest.hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key + _ENTRY_SUFFIX)
+
+    def get(self, key: str) -> Optional[Tuple[ProgramNode, List[str]]]:
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                ast, code = pickle.load(f)
+        except Exception:
+            # поврежденная или обрезанная запись - такой же промах, как ее отсутствие
+            self.misses += 1
+            return None
+        with suppress(OSError):
+            os.utime(path)
+        self.hits += 1
+        return ast, code
+
+    def put(self, key: str, ast: ProgramNode, code: List[str]) -> None:
+        path = self._path(key)
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                pickle.dump((ast, code), f, protocol=pickle.HIGHEST_PROTOCOL)
+                size = f.tell()
+            replaced = 0
+            with suppress(OSError):
+                replaced = os.stat(path).st_size
+            os.replace(tmp_path, path)
+        except RecursionError:
+            # pickle рекурсивен: слишком глубокое дерево просто не кэшируется
+            with suppress(OSError):
+                os.remove(tmp_path)
+            return
+        except BaseException:
+            with suppress(OSError):
+                os.remove(tmp_path)
+            raise
+        self.total_bytes += size - replaced
+        if self.total_bytes > self.max_bytes:
+            self.evict()
+
+    # Записи кэша: (mtime, размер, путь)
+    def _entries(self) -> List[Tuple[float, int, str]]:
+        entries = []
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                if not entry.name.endswith(_ENTRY_SUFFIX):
+                    continue
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        return entries
+
+    def evict(self) -> None:
+        entries = self._entries()
+        total = sum(size for _, size, _ in entries)
+        if total > self.max_bytes:
+            limit = self.max_bytes * self.EVICT_RATIO
+            entries.sort()
+            for _, size, path in entries:
+                if total <= limit:
+                    break
+                with suppress(OSError):
+                    os.remove(path)
+                total -= size
+        self.total_bytes = total
+
+    def clear(self) -> None:
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                if entry.name.endswith(_ENTRY_SUFFIX):
+                    with suppress(OSError):
+                        os.remove(entry.path)
+        self.total_bytes = 0
@@ -0,0 +1,86 @@
+from typing import List, Optional, TextIO
+
+from compile_cache import CompileCache
+from folding import ConstantFolder
+from frontend import *
+from jasmin import CodeGenerator
+from lexer import Source
+from nodes import ProgramNode
+from peephole import PeepholeOptimizer
+from profiling import CompileProfile, phase
+from semantic import SemanticAnalyzer
+from tracing import SymbolTracer
+
+
+# Результат компиляции одной программы: AST-дерево и строки Jasmin-кода
+# (code is None, если код был записан напрямую в sink)
+class CompileResult:
+    def __init__(self, ast: ProgramNode, code: Optional[List[str]], cached: bool = False):
+        self.ast = ast
+        self.code = code
+        self.cached = cached
+
+
+def _parse(source: Source, backend: str, folder: Optional[ConstantFolder],
+           profile: Optional[CompileProfile] = None) -> ProgramNode:
+    with phase(profile, 'parse'):
+        ast = get_parser(backend).parse(source)
+    if folder is None:
+        return ast
+    with phase(profile, 'fold'):
+        return folder.fold(ast)
+
+
+# Разбор и семантический анализ с генерацией кода; при наличии кэша неизмененная
+# программа берется из него без вызова парсера и SemanticAnalyzer.
+# С sink код пишется в поток по мере генерации, кэш при этом не используется.
+# С tracer события таблицы символов передаются трассировщику; чтобы они были,
+# анализ выполняется всегда и кэш не читается.
+# С optimizer код каждого метода проходит peephole-оптимизацию; набор правил
+# входит в ключ кэша, счетчики срабатываний растут только при реальной генерации.
+# С folder дерево перед анализом проходит свертку констант, в результате - свернутое дерево.
+# promote_globals переносит глобальные переменные main в локальные (см. SemanticAnalyzer).
+# source - строка или буфер байтов UTF-8, например, из FileHelper.map_file.
+# С profile в него записываются время фаз, узлы дерева и число инструкций
+def compile_source(source: Source, backend: str = DEFAULT_BACKEND,
+                   cache: Optional[CompileCache] = None, sink: Optional[TextIO] = None,
+                   tracer: Optional[SymbolTracer] = None,
+                   optimizer: Optional[PeepholeOptimizer] = None,
+                   folder: Optional[ConstantFolder] = None, promote_globals: bool = False,
+                   profile: Optional[CompileProfile] = None) -> CompileResult:
+    if sink is not None:
+        ast = _parse(source, backend, folder, profile)
+        generator = CodeGenerator(sink, optimizer)
+        with phase(profile, 'analyze'):
+            SemanticAnalyzer(generator, tracer, promote_globals).visit(ast)
+        if profile is not None:
+            profile.count_nodes(ast)
+            profile.count_generator(generator)
+        return CompileResult(ast, None)
+
+    key = None
+    if cache is not None:
+        options = (optimizer.signature if optimizer is not None else '') + (';fold' if folder is not None else '') \
+            + (';promote' if promote_globals else '')
+        with phase(profile, 'cache'):
+            key = cache.key(source, backend, options)
+            entry = cache.get(key) if tracer is None else None
+        if entry is not None:
+            if profile is not None:
+                profile.count_nodes(entry[0])
+                profile.count_code(entry[1])
+            return CompileResult(*entry, cached=True)
+
+    ast = _parse(source, backend, folder, profile)
+    generator = CodeGenerator(optimizer=optimizer)
+    with phase(profile, 'analyze'):
+        SemanticAnalyzer(generator, tracer, promote_globals).visit(ast)
+    code = generator.code
+    if profile is not None:
+        profile.count_nodes(ast)
+        profile.count_generator(generator)
+
+    if cache is not None:
+        with phase(profile, 'cache'):
+            cache.put(key, ast, code)
+    return CompileResult(ast, code)
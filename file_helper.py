@@ -1,12 +1,28 @@
+import mmap
+import os
+from contextlib import contextmanager
+
+
 class FileHelper:
 
     @staticmethod
     def write_to_file(filename, content):
-        f = open(filename, "w")
-        f.write(content)
-        f.close()
+        with open(filename, "w") as f:
+            f.write(content)
 
     @staticmethod
     def read_from_file(filename) -> str:
-        f = open(filename, "r")
-        return f.read()
+        with open(filename, "r") as f:
+            return f.read()
+
+    # Файл, отображенный в память только для чтения (для пустого файла - b''): текст
+    # не копируется в строку, лексер rd_parser работает прямо с буфером
+    @staticmethod
+    @contextmanager
+    def map_file(filename):
+        with open(filename, "rb") as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                yield b''
+                return
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+                yield buffer
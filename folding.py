@@ -0,0 +1,293 @@
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+from nodes import *
+from semantic import NodeVisitor
+
+# Арифметические операции над integer: их результат - снова integer
+_INT_OPS = frozenset((BinOp.ADD, BinOp.SUB, BinOp.MUL, BinOp.DIVISION, BinOp.DIV, BinOp.MOD))
+# Встроенные процедуры, которые не меняют переменные программы
+_PURE_BUILTINS = frozenset(('Write', 'WriteLn'))
+_READ_BUILTINS = frozenset(('Read', 'ReadLn'))
+# Нейтральные элементы: x op e = x и e op x = x
+_RIGHT_IDENTITY = {BinOp.ADD: 0, BinOp.SUB: 0, BinOp.MUL: 1, BinOp.DIVISION: 1, BinOp.DIV: 1}
+_LEFT_IDENTITY = {BinOp.ADD: 0, BinOp.MUL: 1}
+
+
+# Целое со знаком 32 бита: так считает JVM, так же считается и при свертке
+def _wrap_int(value: int) -> int:
+    value &= 0xFFFFFFFF
+    return value - 0x100000000 if value & 0x80000000 else value
+
+
+# Значение a op b для integer-литералов или None, если сворачивать нельзя
+# (деление на ноль остается до исполнения). div и / делят с отбрасыванием
+# дробной части, знак mod совпадает со знаком делимого, как у idiv/irem
+def fold_int(op: BinOp, a: int, b: int) -> Optional[int]:
+    if op is BinOp.ADD:
+        return _wrap_int(a + b)
+    if op is BinOp.SUB:
+        return _wrap_int(a - b)
+    if op is BinOp.MUL:
+        return _wrap_int(a * b)
+    if op in (BinOp.DIVISION, BinOp.DIV, BinOp.MOD):
+        if b == 0:
+            return None
+        quotient = abs(a) // abs(b)
+        if (a < 0) != (b < 0):
+            quotient = -quotient
+        return _wrap_int(quotient if op is not BinOp.MOD else a - quotient * b)
+    return None
+
+
+def _int_literal(node: AstNode) -> Optional[int]:
+    if isinstance(node, LiteralNode) and type(node.value) is int:
+        return node.value
+    return None
+
+
+def _same(old: Tuple[AstNode, ...], new: Tuple[AstNode, ...]) -> bool:
+    return all(a is b for a, b in zip(old, new))
+
+
+# Оптимизация AST между разбором и SemanticAnalyzer:
+# - fold: BinOpNode над integer-литералами заменяется литералом;
+# - identity: x + 0, 0 + x, x - 0, x * 1, 1 * x, x div 1, x / 1 -> x, если x заведомо integer;
+# - propagate: после v := <литерал> чтения v заменяются литералом, пока v не изменится.
+# Узлы не изменяются (childs кэшируется), измененные поддеревья строятся заново.
+# Каждый visit_* возвращает пару (узел, является ли он выражением типа integer).
+# Как и SemanticAnalyzer, из объявлений функции учитываются только параметры
+class ConstantFolder(NodeVisitor):
+    def __init__(self):
+        self.hits: Dict[str, int] = OrderedDict((('fold', 0), ('identity', 0), ('propagate', 0)))
+        # имя -> тип для глобальных переменных и параметров текущей подпрограммы
+        self.scopes = []
+        # известные значения integer-переменных в текущей точке программы
+        self.constants: Dict[str, int] = {}
+
+    def fold(self, tree: ProgramNode) -> ProgramNode:
+        return self.visit(tree)[0]
+
+    # Свертка одной подпрограммы верхнего уровня - так же, как при свертке всей программы
+    # с объявлениями глобальных переменных program_decls
+    def fold_routine(self, decl: AstNode, program_decls) -> AstNode:
+        scope = {}
+        for program_decl in program_decls:
+            self._declare(scope, program_decl)
+        self.scopes = [scope]
+        self.constants = {}
+        return self.visit(decl)[0]
+
+    def generic_visit(self, node):
+        return node, False
+
+    def _declare(self, scope: dict, decl: AstNode):
+        if isinstance(decl, VarDeclNode):
+            for ident in decl.ident_list.idents:
+                scope[ident.name] = decl.vars_type.name
+        elif isinstance(decl, ArrayDeclNode):
+            for ident in decl.name.idents:
+                scope[ident.name] = 'array'
+
+    def _var_type(self, name: str) -> Optional[str]:
+        for scope in reversed(self.scopes):
+            if name in scope:
+                return scope[name]
+        return None
+
+    # Вызов подпрограммы может изменить глобальные переменные, но не параметры вызывающей
+    def _forget_globals(self):
+        local = self.scopes[-1] if len(self.scopes) > 1 else {}
+        self.constants = {name: value for name, value in self.constants.items() if name in local}
+
+    # Перед циклом забываются переменные, которые в нем присваиваются или читаются через Read
+    def _forget_assigned(self, node: AstNode):
+        for child in iter_preorder(node):
+            if isinstance(child, AssignNode) and isinstance(child.var, IdentNode):
+                self.constants.pop(child.var.name, None)
+            elif isinstance(child, CallNode):
+                if child.func.name in _READ_BUILTINS:
+                    for param in child.params:
+                        if isinstance(param, IdentNode):
+                            self.constants.pop(param.name, None)
+                elif child.func.name not in _PURE_BUILTINS:
+                    self._forget_globals()
+
+    def visit_LiteralNode(self, node: LiteralNode):
+        return node, type(node.value) is int
+
+    def visit_IdentNode(self, node: IdentNode):
+        value = self.constants.get(node.name)
+        if value is not None:
+            self.hits['propagate'] += 1
+            return LiteralNode(str(value), row=node.row, line=node.line), True
+        return node, self._var_type(node.name) == 'integer'
+
+    def visit_BinOpNode(self, node: BinOpNode):
+        arg1, int1 = yield node.arg1
+        arg2, int2 = yield node.arg2
+        op = node.op
+        a, b = _int_literal(arg1), _int_literal(arg2)
+        if op in _INT_OPS and a is not None and b is not None:
+            value = fold_int(op, a, b)
+            if value is not None:
+                self.hits['fold'] += 1
+                return LiteralNode(str(value), row=node.row, line=node.line), True
+        if int1 and int2:
+            if b is not None and b == _RIGHT_IDENTITY.get(op):
+                self.hits['identity'] += 1
+                return arg1, True
+            if a is not None and a == _LEFT_IDENTITY.get(op):
+                self.hits['identity'] += 1
+                return arg2, True
+        if arg1 is not node.arg1 or arg2 is not node.arg2:
+            node = BinOpNode(op, arg1, arg2, row=node.row, line=node.line)
+        return node, op in _INT_OPS and int1 and int2
+
+    def visit_CallNode(self, node: CallNode):
+        name = node.func.name
+        if name in _READ_BUILTINS:
+            for param in node.params:
+                if isinstance(param, IdentNode):
+                    self.constants.pop(param.name, None)
+            return node, False
+        params = []
+        for param in node.params:
+            param, _ = yield param
+            params.append(param)
+        if name not in _PURE_BUILTINS:
+            self._forget_globals()
+        if not _same(node.params, params):
+            node = CallNode(node.func, *params, row=node.row, line=node.line)
+        return node, False
+
+    def visit_AssignNode(self, node: AssignNode):
+        val, _ = yield node.val
+        var = node.var
+        if isinstance(var, IdentNode):
+            value = _int_literal(val)
+            if value is not None and self._var_type(var.name) == 'integer':
+                self.constants[var.name] = value
+            else:
+                self.constants.pop(var.name, None)
+        if val is not node.val:
+            node = AssignNode(var, val, row=node.row, line=node.line)
+        return node, False
+
+    def visit_StmtListNode(self, node: StmtListNode):
+        exprs = []
+        for stmt in node.exprs:
+            stmt, _ = yield stmt
+            exprs.append(stmt)
+        if not _same(node.exprs, exprs):
+            node = StmtListNode(*exprs, row=node.row, line=node.line)
+        return node, False
+
+    def visit_BodyNode(self, node: BodyNode):
+        body, _ = yield node.body
+        if body is not node.body:
+            node = BodyNode(body, row=node.row, line=node.line)
+        return node, False
+
+    # После if известны только значения, одинаковые на обеих ветках
+    def visit_IfNode(self, node: IfNode):
+        cond, _ = yield node.cond
+        cond = self._cond(node.cond, cond)
+        before = dict(self.constants)
+        then_stmt, _ = yield node.then_stmt
+        after_then, self.constants = self.constants, before
+        else_stmt = node.else_stmt
+        if else_stmt is not None:
+            else_stmt, _ = yield else_stmt
+        self.constants = {name: value for name, value in self.constants.items()
+                          if name in after_then and after_then[name] == value}
+        if cond is not node.cond or then_stmt is not node.then_stmt or else_stmt is not node.else_stmt:
+            node = IfNode(cond, then_stmt, else_stmt, row=node.row, line=node.line)
+        return node, False
+
+    # Тело цикла и условие видят только значения, которые цикл не меняет;
+    # присваивания внутри тела не действуют после цикла (он может не выполниться)
+    def visit_WhileNode(self, node: WhileNode):
+        self._forget_assigned(node)
+        before = dict(self.constants)
+        cond, _ = yield node.cond
+        cond = self._cond(node.cond, cond)
+        stmt_list, _ = yield node.stmt_list
+        self.constants = before
+        if cond is not node.cond or stmt_list is not node.stmt_list:
+            node = WhileNode(cond, stmt_list, row=node.row, line=node.line)
+        return node, False
+
+    def visit_RepeatNode(self, node: RepeatNode):
+        self._forget_assigned(node)
+        before = dict(self.constants)
+        stmt_list, _ = yield node.stmt_list
+        cond, _ = yield node.cond
+        cond = self._cond(node.cond, cond)
+        self.constants = before
+        if cond is not node.cond or stmt_list is not node.stmt_list:
+            node = RepeatNode(stmt_list, cond, row=node.row, line=node.line)
+        return node, False
+
+    # Начальное значение вычисляется один раз до цикла, туда константы подставляются
+    # как в обычное присваивание
+    def visit_ForNode(self, node: ForNode):
+        init, _ = yield node.init
+        to, _ = yield node.to
+        self._forget_assigned(node)
+        before = dict(self.constants)
+        body, _ = yield node.body
+        self.constants = before
+        if init is not node.init or to is not node.to or body is not node.body:
+            node = ForNode(init, to, body, row=node.row, line=node.line)
+        return node, False
+
+    def visit_VarsDeclNode(self, node: VarsDeclNode):
+        var_decs = []
+        for decl in node.var_decs:
+            decl, _ = yield decl
+            var_decs.append(decl)
+        if not _same(node.var_decs, var_decs):
+            node = VarsDeclNode(*var_decs, row=node.row, line=node.line)
+        return node, False
+
+    # Условие if/while должно остаться сравнением (по нему генерируется if_icmp),
+    # поэтому выражение, свернутое в литерал, не подставляется
+    def _cond(self, old: AstNode, new: AstNode) -> AstNode:
+        return new if isinstance(new, BinOpNode) else old
+
+    def _routine_body(self, node):
+        scope = {}
+        for param in node.params.decls:
+            self._declare(scope, param)
+        saved = self.constants
+        self.scopes.append(scope)
+        self.constants = {}
+        stmt_list, _ = yield node.stmt_list
+        self.scopes.pop()
+        self.constants = saved
+        return stmt_list
+
+    def visit_FunctionDeclNode(self, node: FunctionDeclNode):
+        stmt_list = yield from self._routine_body(node)
+        if stmt_list is not node.stmt_list:
+            node = FunctionDeclNode(node.proc_name, node.params, node.returning_type, node.vars_decl, stmt_list)
+        return node, False
+
+    def visit_ProcedureDeclNode(self, node: ProcedureDeclNode):
+        stmt_list = yield from self._routine_body(node)
+        if stmt_list is not node.stmt_list:
+            node = ProcedureDeclNode(node.proc_name, node.params, node.vars_decl, stmt_list)
+        return node, False
+
+    def visit_ProgramNode(self, node: ProgramNode):
+        scope = {}
+        for decl in node.vars_decl.var_decs:
+            self._declare(scope, decl)
+        self.scopes = [scope]
+        self.constants = {}
+        vars_decl, _ = yield node.vars_decl
+        stmt_list, _ = yield node.stmt_list
+        if vars_decl is not node.vars_decl or stmt_list is not node.stmt_list:
+            node = ProgramNode(node.prog_name, vars_decl, stmt_list, row=node.row, line=node.line)
+        return node, False
@@ -0,0 +1,14 @@
+# Выбор реализации синтаксического анализатора:
+# 'pyparsing' - грамматика PascalGrammar, 'rd' - лексер и рекурсивный спуск RecursiveDescentParser
+PARSER_BACKENDS = ('pyparsing', 'rd')
+DEFAULT_BACKEND = 'pyparsing'
+
+
+def get_parser(backend: str = DEFAULT_BACKEND):
+    if backend == 'pyparsing':
+        from grammar import PascalGrammar
+        return PascalGrammar.instance()
+    if backend == 'rd':
+        from rd_parser import RecursiveDescentParser
+        return RecursiveDescentParser.instance()
+    raise ValueError("Unknown parser backend '%s'" % backend)
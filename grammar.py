@@ -1,22 +1,101 @@
+from collections import OrderedDict
 from contextlib import suppress
+from threading import Lock
 
 import pyparsing as pp
 from pyparsing import pyparsing_common as ppc
 from myParser import *
 
+# Ограниченный по размеру LRU-кэш для packrat-мемоизации pyparsing
+# (повторяет интерфейс внутренних кэшей pyparsing: get/set/clear/not_in_cache)
+class LruPackratCache:
+    def __init__(self, size: int):
+        self.size = size
+        self.not_in_cache = object()
+        self._cache = OrderedDict()
+
+    def get(self, key):
+        value = self._cache.get(key, self.not_in_cache)
+        if value is not self.not_in_cache:
+            self._cache.move_to_end(key)
+        return value
+
+    def set(self, key, value):
+        self._cache[key] = value
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.size:
+            self._cache.popitem(last=False)
+
+    def clear(self):
+        self._cache.clear()
+
+    def __len__(self):
+        return len(self._cache)
+
+
 # Класс описывающий грамматику языка Pascal
+# Грамматика строится один раз на процесс: используйте PascalGrammar.instance()
 class PascalGrammar:
+    DEFAULT_CACHE_SIZE = 4096
+
+    _instance = None
+    _instance_lock = Lock()
+    _packrat_cache = None
+    _cache_stats = [0, 0]
+
     def __init__(self):
         self.parser = self._make_parser()
 
+    @classmethod
+    def instance(cls) -> 'PascalGrammar':
+        if cls._instance is None:
+            with cls._instance_lock:
+                if cls._instance is None:
+                    cls._instance = cls()
+        return cls._instance
+
+    # Включает packrat-мемоизацию с LRU-кэшем на cache_size элементов
+    # (cache_size=None - неограниченный кэш pyparsing). Настройка глобальна для процесса.
+    # pyparsing выполняет только первый вызов enable_packrat, поэтому перед сменой
+    # размера мемоизация выключается
+    @classmethod
+    def enable_packrat(cls, cache_size: Optional[int] = DEFAULT_CACHE_SIZE) -> None:
+        pp.ParserElement.disable_memoization()
+        pp.ParserElement.enable_packrat(cache_size)
+        if cache_size is not None:
+            if cls._packrat_cache is None or cls._packrat_cache.size != cache_size:
+                cls._packrat_cache = LruPackratCache(cache_size)
+            pp.ParserElement.packrat_cache = cls._packrat_cache
+        pp.ParserElement.reset_cache()
+
+    # Статистика packrat-кэша, накопленная по всем вызовам parse
+    # (pyparsing сбрасывает свои счетчики в начале каждого разбора)
+    @classmethod
+    def cache_stats(cls) -> dict:
+        hits, misses = cls._cache_stats
+        total = hits + misses
+        cache = pp.ParserElement.packrat_cache
+        return {
+            'hits': hits,
+            'misses': misses,
+            'hit_rate': hits / total if total else 0.0,
+            'size': len(cache) if hasattr(cache, '__len__') else None,
+            'limit': getattr(cache, 'size', None),
+        }
+
+    @classmethod
+    def reset_cache(cls) -> None:
+        pp.ParserElement.reset_cache()
+        cls._cache_stats = [0, 0]
+
     def _make_parser(self):
         num = pp.Regex('[+-]?\\d+\\.?\\d*([eE][+-]?\\d+)?')
-        str_ = pp.QuotedString("'", escChar='\\', unquoteResults=False, convertWhitespaceEscapes=False)
+        str_ = pp.QuotedString("'", esc_char='\\', unquote_results=False, convert_whitespace_escapes=False)
         TRUE = pp.Literal('True')
         FALSE = pp.Literal('False')
         bool_val = FALSE | TRUE
         literal = num | str_ | bool_val
-        ident = ppc.identifier.setName('ident')
+        ident = ppc.identifier.set_name('ident')
 
         INT = pp.CaselessKeyword("integer")
         CHAR = pp.CaselessKeyword("char")
@@ -42,7 +121,6 @@ class PascalGrammar:
         ARRAY = pp.CaselessKeyword("array").suppress()
         OF = pp.CaselessKeyword("of").suppress()
 
-        add = pp.Forward()
         expr = pp.Forward()
         stmt = pp.Forward()
         stmt_list = pp.Forward()
@@ -62,17 +140,15 @@ class PascalGrammar:
 
         )
 
-        mult = pp.Group(group + pp.ZeroOrMore((MUL | DIVISION | MOD | DIV) + group)).setName('bin_op')
-        add << pp.Group(mult + pp.ZeroOrMore((ADD | SUB) + mult)).setName('bin_op')
-        compare1 = pp.Group(add + pp.Optional((GE | LE | GT | LT) + add)).setName('bin_op')
-        compare2 = pp.Group(compare1 + pp.Optional((EQUALS | NEQUALS) + compare1)).setName('bin_op')
-        logical_and = pp.Group(compare2 + pp.ZeroOrMore(AND + compare2)).setName('bin_op')
-        logical_or = pp.Group(logical_and + pp.ZeroOrMore(OR + logical_and)).setName('bin_op')
+        # Выражение разбирается плоской цепочкой операндов и знаков операций,
+        # дерево BinOpNode строится в действии bin_op по таблице приоритетов BIN_OP_PRECEDENCE
+        bin_op_sign = MUL | DIVISION | MOD | DIV | ADD | SUB | GE | LE | GT | LT | EQUALS | NEQUALS | AND | OR
+        bin_op_chain = (group + pp.ZeroOrMore(bin_op_sign + group)).set_name('bin_op')
 
-        expr << (logical_or)
+        expr << (bin_op_chain)
 
 
-        #simple_assign = ((ident | array_ident) + ASSIGN.suppress() + expr).setName('assign')
+        #simple_assign = ((ident | array_ident) + ASSIGN.suppress() + expr).set_name('assign')
         # type_arr = ARRAY + LBRACK + num + pp.Literal("..").suppress() + num + RBRACK + OF + type_spec
         ident_list = ident + pp.ZeroOrMore(COMMA + ident)
         var_decl = ident_list + COLON + type_spec
@@ -81,9 +157,10 @@ class PascalGrammar:
         vars_decl = VAR + pp.ZeroOrMore((var_decl + SEMI) | procedure_decl | function_decl | array_decl)
 
         assign = pp.Optional(array_ident | ident) + ASSIGN.suppress() + expr
-        simple_stmt = assign | call
+        # 'until (cond)' завершает repeat, а не является вызовом процедуры until
+        simple_stmt = assign | ~pp.Keyword("until") + call
 
-        for_body = stmt | pp.Group(SEMI).setName('stmt_list')
+        for_body = stmt | pp.Group(SEMI).set_name('stmt_list')
         for_cond = assign + pp.Keyword("to").suppress() + literal
 
         if_ = pp.Keyword("if").suppress() + pp.ZeroOrMore(LPAR) + expr + pp.ZeroOrMore(RPAR) + pp.Keyword("then").suppress() \
@@ -126,4 +203,11 @@ class PascalGrammar:
 
 
     def parse(self, prog: str) -> StmtListNode:
-        return self.parser.parseString(str(prog))[0]
+        try:
+            # pyparsing разбирает только строки: буфер байтов (mmap) декодируется один раз
+            text = prog if isinstance(prog, str) else str(prog, 'utf-8')
+            return self.parser.parse_string(text)[0]
+        finally:
+            stats = pp.ParserElement.packrat_cache_stats
+            PascalGrammar._cache_stats = [PascalGrammar._cache_stats[0] + stats[0],
+                                          PascalGrammar._cache_stats[1] + stats[1]]
@@ -0,0 +1,299 @@
+import hashlib
+import os
+import re
+import sys
+import time
+from collections import OrderedDict
+from typing import Dict, FrozenSet, List, Optional, TextIO, Tuple
+
+from classfile import assemble
+from compiler import CompileResult, compile_source
+from file_helper import *
+from folding import ConstantFolder
+from frontend import *
+from jasmin import CodeGenerator
+from nodes import *
+from peephole import PeepholeOptimizer
+from semantic import ScopedSymbolTable, SemanticAnalyzer, routine_names
+from symbols import *
+
+# Слова, по которым текст программы делится на подпрограммы; комментарии и строки
+# пропускаются целиком. begin/end сравниваются без учета регистра, как в грамматике
+_SCAN_RE = re.compile(r"/\*.*?\*/|//[^\n]*|'(?:[^'\\\n]|\\.)*'|\b(?:function|procedure|(?i:begin|end))\b",
+                      re.DOTALL)
+_COMMENT_RE = re.compile(r'/\*.*?\*/|//[^\n]*', re.DOTALL)
+
+
+# Текст программы, разделенный на подпрограммы верхнего уровня и остов - программу без них
+# (заголовок, глобальные переменные и тело main). positions[k] - число объявлений
+# переменных остова перед k-й подпрограммой
+class SourceLayout:
+    def __init__(self, skeleton: str, routines: List[str], positions: List[int]):
+        self.skeleton = skeleton
+        self.routines = routines
+        self.positions = positions
+
+
+# Границы подпрограмм находятся по словам function/procedure и парам begin/end без разбора:
+# подпрограмма заканчивается на ';' после end, закрывающего ее тело (вложенные подпрограммы
+# из ее раздела var учитываются). None, если текст не похож на программу - тогда он
+# компилируется целиком и ошибку сообщает парсер
+def split_routines(source: str) -> Optional[SourceLayout]:
+    gaps, routines = [], []
+    depth = pending = 0
+    start = gap_start = 0
+    for match in _SCAN_RE.finditer(source):
+        word = match.group()
+        if word[0] in "/'":
+            continue
+        if word in ('function', 'procedure'):
+            if not pending:
+                start = match.start()
+            pending += 1
+        elif word.lower() == 'begin':
+            if not pending:
+                break
+            depth += 1
+        elif depth:
+            depth -= 1
+            if not depth:
+                pending -= 1
+                if not pending:
+                    end = source.find(';', match.end())
+                    if end < 0:
+                        return None
+                    gaps.append(source[gap_start:start])
+                    routines.append(source[start:end + 1])
+                    gap_start = end + 1
+        else:
+            return None
+    else:
+        return None
+    gaps.append(source[gap_start:])
+    # объявления переменных заканчиваются ';', первая ';' - после заголовка Program
+    positions = []
+    count = -1
+    for gap in gaps[:-1]:
+        count += _COMMENT_RE.sub('', gap).count(';')
+        positions.append(count)
+    return SourceLayout('\n'.join(gaps), routines, positions)
+
+
+# Имена, на которые ссылается тело подпрограммы (переменные, массивы, вызываемые подпрограммы)
+def referenced_names(node: AstNode) -> FrozenSet[str]:
+    names = set()
+    for child in iter_preorder(node.stmt_list):
+        if isinstance(child, IdentNode):
+            names.add(child.name)
+        elif isinstance(child, ArrayIdentNode):
+            names.add(child.name.name)
+            names.update(ident.name for ident in iter_preorder(child.literal) if isinstance(ident, IdentNode))
+    return frozenset(names)
+
+
+# Все, от чего зависит код, обращающийся к символу: вид, тип, для массива - границы,
+# для подпрограммы - типы параметров и результата, для локальной переменной - ее номер
+def describe_symbol(symbol) -> Optional[tuple]:
+    if symbol is None:
+        return None
+    if isinstance(symbol, (ProcedureSymbol, FunctionSymbol)):
+        return type(symbol).__name__, tuple(str(p.type) for p in symbol.params), symbol.type
+    if isinstance(symbol, VarSymbol):
+        description = (type(symbol).__name__, str(symbol.type), symbol.is_field,
+                       None if symbol.is_field else symbol.index)
+        if isinstance(symbol, ArraySymbol):
+            description += (symbol.from_, symbol.to_)
+        return description
+    return type(symbol).__name__, symbol.name
+
+
+# Подпрограмма, разобранная из своего текста; folded - дерево после свертки констант
+# для типов глобальных переменных fold_key, shared - глобальные имена в теле дерева used
+class _RoutineEntry:
+    def __init__(self, decl: AstNode, digest: str):
+        self.decl = decl
+        self.digest = digest
+        self.names = referenced_names(decl)
+        self.fold_key = None
+        self.folded = None
+        self.used = None
+        self.shared: FrozenSet[str] = frozenset()
+
+    def use(self, decl: AstNode) -> AstNode:
+        if decl is not self.used:
+            self.used, self.shared = decl, routine_names(decl)
+        return decl
+
+
+# SemanticAnalyzer, который берет готовый блок метода подпрограммы по ее отпечатку
+# вместо анализа и генерации тела; methods - блоки, использованные в этой компиляции.
+# Имена, которые используют подпрограммы, тоже берутся из записей кэша, а не обходом тел
+class _IncrementalAnalyzer(SemanticAnalyzer):
+    def __init__(self, generator: CodeGenerator, promote_globals: bool,
+                 routines: Dict[AstNode, _RoutineEntry], cached_methods: Dict[str, List[str]]):
+        super().__init__(generator, promote_globals=promote_globals)
+        self.routines = routines
+        self.cached_methods = cached_methods
+        self.methods: Dict[str, List[str]] = {}
+        self.compiled = 0
+
+    # Отпечаток: текст подпрограммы, ее сигнатура, символы, видимые из тела, и имя класса
+    def fingerprint(self, node: AstNode, routine_symbol) -> str:
+        entry = self.routines[node]
+        digest = hashlib.sha256(entry.digest.encode())
+        dependencies = tuple((name, describe_symbol(self.current_scope.lookup(name)))
+                             for name in sorted(entry.names))
+        digest.update(repr((str(self.global_scope.scope_name), describe_symbol(routine_symbol),
+                            tuple(p.name for p in routine_symbol.params), dependencies)).encode())
+        return digest.hexdigest()
+
+    def _shared_globals(self, node: ProgramNode) -> FrozenSet[str]:
+        return frozenset().union(*(entry.shared for entry in self.routines.values()))
+
+    def _routine_method(self, node, routine_symbol, routine_scope: ScopedSymbolTable):
+        key = self.fingerprint(node, routine_symbol)
+        block = self.cached_methods.get(key)
+        if block is None:
+            start = len(self.generator.code)
+            yield from super()._routine_method(node, routine_symbol, routine_scope)
+            block = self.generator.code[start:]
+            self.compiled += 1
+        else:
+            self.generator.add_method(block)
+        self.methods[key] = block
+
+
+# Инкрементальная компиляция для редактора: между вызовами compile хранятся разобранные
+# подпрограммы верхнего уровня (по их тексту), разобранный остов программы и готовые
+# блоки Jasmin-методов (по отпечатку подпрограммы). Заново разбираются только измененные
+# подпрограммы и остов, анализируются и генерируются только подпрограммы с новым
+# отпечатком, main - всегда. Хранится только то, что использовала последняя компиляция.
+# Если текст не удалось разделить или разобрать по частям, программа компилируется
+# целиком через compile_source (и ошибку сообщает он). Параметры - как у compile_source
+class IncrementalCompiler:
+    def __init__(self, backend: str = DEFAULT_BACKEND, optimizer: Optional[PeepholeOptimizer] = None,
+                 folder: Optional[ConstantFolder] = None, promote_globals: bool = False):
+        self.backend = backend
+        self.optimizer = optimizer
+        self.folder = folder
+        self.promote_globals = promote_globals
+        self._skeleton = None
+        self._skeleton_ast: Optional[ProgramNode] = None
+        self._routines: Dict[str, _RoutineEntry] = {}
+        self._methods: Dict[str, List[str]] = {}
+        # routines - подпрограмм в последней программе, parsed - из них разобрано заново,
+        # compiled - сгенерировано заново; whole - программа компилировалась целиком
+        self.stats = OrderedDict((('routines', 0), ('parsed', 0), ('compiled', 0), ('whole', False)))
+
+    def compile(self, source: str) -> CompileResult:
+        layout = split_routines(source)
+        built = self._build(layout) if layout is not None else None
+        if built is None:
+            self.stats.update(routines=0, parsed=0, compiled=0, whole=True)
+            return compile_source(source, backend=self.backend, optimizer=self.optimizer, folder=self.folder,
+                                  promote_globals=self.promote_globals)
+        ast, routines = built
+        generator = CodeGenerator(optimizer=self.optimizer)
+        analyzer = _IncrementalAnalyzer(generator, self.promote_globals, routines, self._methods)
+        analyzer.visit(ast)
+        self._methods = analyzer.methods
+        self.stats.update(compiled=analyzer.compiled, whole=False)
+        return CompileResult(ast, generator.code)
+
+    # Дерево программы из остова и подпрограмм (разобранных заново или из кэша)
+    # и записи кэша подпрограмм по их узлам в этом дереве
+    def _build(self, layout: SourceLayout) -> Optional[Tuple[ProgramNode, Dict[AstNode, _RoutineEntry]]]:
+        parser = get_parser(self.backend)
+        if layout.skeleton != self._skeleton:
+            try:
+                skeleton_ast = parser.parse(layout.skeleton)
+            except Exception:
+                return None
+            if self.folder is not None:
+                skeleton_ast = self.folder.fold(skeleton_ast)
+            self._skeleton, self._skeleton_ast = layout.skeleton, skeleton_ast
+        skeleton_ast = self._skeleton_ast
+        program_decls = skeleton_ast.vars_decl.var_decs
+        global_types = {}
+        for decl in program_decls:
+            if isinstance(decl, VarDeclNode):
+                global_types.update((ident.name, decl.vars_type.name) for ident in decl.ident_list.idents)
+            elif isinstance(decl, ArrayDeclNode):
+                global_types.update((ident.name, 'array') for ident in decl.name.idents)
+
+        routines: Dict[str, _RoutineEntry] = {}
+        entries = []
+        parsed = 0
+        for text in layout.routines:
+            entry = routines.get(text) or self._routines.get(text)
+            if entry is None:
+                try:
+                    wrapper = parser.parse('Program routine;\nvar\n{0}\nbegin\nend.'.format(text))
+                except Exception:
+                    return None
+                if len(wrapper.vars_decl.var_decs) != 1:
+                    return None
+                entry = _RoutineEntry(wrapper.vars_decl.var_decs[0], hashlib.sha256(text.encode()).hexdigest())
+                parsed += 1
+            routines[text] = entry
+            entries.append(entry)
+        self._routines = routines
+        self.stats.update(routines=len(entries), parsed=parsed)
+
+        decls = []
+        used = {}
+        position = 0
+        for entry, next_position in zip(entries, layout.positions):
+            if next_position > len(program_decls):
+                return None
+            decls.extend(program_decls[position:next_position])
+            position = next_position
+            decl = entry.decl
+            if self.folder is not None:
+                fold_key = tuple((name, global_types.get(name)) for name in sorted(entry.names))
+                if entry.fold_key != fold_key:
+                    entry.fold_key, entry.folded = fold_key, self.folder.fold_routine(decl, program_decls)
+                decl = entry.folded
+            decls.append(entry.use(decl))
+            used[decl] = entry
+        decls.extend(program_decls[position:])
+        program = ProgramNode(skeleton_ast.prog_name, VarsDeclNode(*decls), skeleton_ast.stmt_list)
+        return program, used
+
+
+
+# Пересборка одного файла при каждом его изменении (опрос mtime раз в interval секунд),
+# пока процесс не прервут; ошибка компиляции печатается и не останавливает наблюдение
+def watch(source_path: str, output_path: str, compiler: IncrementalCompiler, emit: str = 'class',
+          interval: float = 0.2, log: TextIO = sys.stderr):
+    last_mtime = None
+    try:
+        while True:
+            try:
+                mtime = os.stat(source_path).st_mtime_ns
+            except OSError:
+                mtime = None
+            if mtime is not None and mtime != last_mtime:
+                last_mtime = mtime
+                started = time.perf_counter()
+                try:
+                    code = compiler.compile(FileHelper.read_from_file(source_path)).code
+                    if emit == 'class':
+                        # .class называется по имени класса: оно может измениться между сборками
+                        source_file = os.path.splitext(os.path.basename(source_path))[0] + '.j'
+                        class_name, class_bytes = assemble(code, source_file)
+                        output_path = os.path.join(os.path.dirname(output_path), class_name + '.class')
+                        with open(output_path, 'wb') as f:
+                            f.write(class_bytes)
+                    else:
+                        FileHelper.write_to_file(output_path, '\n'.join(code))
+                except Exception as e:
+                    print('{0}: {1}: {2}'.format(source_path, type(e).__name__, e), file=log)
+                else:
+                    stats = compiler.stats
+                    print('{0}: built in {1:.1f} ms, recompiled {2} of {3} routines{4}'.format(
+                        output_path, (time.perf_counter() - started) * 1000, stats['compiled'],
+                        stats['routines'], ' (whole program)' if stats['whole'] else ''), file=log)
+            time.sleep(interval)
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,572 @@
+import operator
+import sys
+from typing import List, Optional, TextIO
+
+from folding import ConstantFolder
+from frontend import DEFAULT_BACKEND, get_parser
+from nodes import *
+from semantic import NodeVisitor, ScopedSymbolTable
+from symbols import *
+
+
+class PascalRuntimeError(Exception):
+    pass
+
+
+# Начальные значения переменных: как у полей и newarray в JVM
+_ZERO = {'integer': 0, 'char': '\0', 'boolean': False}
+_READ_BUILTINS = frozenset(('Read', 'ReadLn'))
+_WRITE_BUILTINS = frozenset(('Write', 'WriteLn'))
+
+
+# Арифметика integer - 32 бита со знаком, деление с отбрасыванием дробной части (как idiv/irem)
+def _add(a, b):
+    return ((a + b + 0x80000000) & 0xFFFFFFFF) - 0x80000000
+
+
+def _sub(a, b):
+    return ((a - b + 0x80000000) & 0xFFFFFFFF) - 0x80000000
+
+
+def _mul(a, b):
+    return ((a * b + 0x80000000) & 0xFFFFFFFF) - 0x80000000
+
+
+# // в Python округляет вниз, поэтому для отрицательного неточного частного нужна поправка
+def _div(a, b):
+    if b == 0:
+        raise PascalRuntimeError('Division by zero')
+    q = a // b
+    if q < 0 and q * b != a:
+        q += 1
+    return ((q + 0x80000000) & 0xFFFFFFFF) - 0x80000000
+
+
+# Остаток со знаком делимого (в Python - со знаком делителя)
+def _mod(a, b):
+    if b == 0:
+        raise PascalRuntimeError('Division by zero')
+    r = a % b
+    if r and (r < 0) != (a < 0):
+        r -= b
+    return r
+
+
+# and/or вычисляют оба операнда, как iand/ior в сгенерированном коде
+_BIN_OPS = {
+    BinOp.ADD: _add, BinOp.SUB: _sub, BinOp.MUL: _mul,
+    BinOp.DIVISION: _div, BinOp.DIV: _div, BinOp.MOD: _mod,
+    BinOp.EQ: operator.eq, BinOp.NE: operator.ne,
+    BinOp.LT: operator.lt, BinOp.LE: operator.le,
+    BinOp.GT: operator.gt, BinOp.GE: operator.ge,
+    BinOp.LOGICAL_AND: operator.and_, BinOp.LOGICAL_OR: operator.or_,
+}
+
+
+# Write печатает каждый аргумент отдельной строкой, как println(I) в сгенерированном коде:
+# boolean - 1 или 0, char и строковые литералы - текстом
+def _format(value) -> str:
+    if value is True:
+        return '1'
+    if value is False:
+        return '0'
+    return str(value)
+
+
+# Чтение для Read/ReadLn: integer - очередное слово, char - очередной непробельный символ
+class _Input:
+    def __init__(self, stream: TextIO):
+        self.stream = stream
+        self.line = ''
+        self.pos = 0
+
+    def _skip_spaces(self):
+        while True:
+            line, pos = self.line, self.pos
+            while pos < len(line) and line[pos].isspace():
+                pos += 1
+            if pos < len(line):
+                self.pos = pos
+                return
+            self.line, self.pos = self.stream.readline(), 0
+            if not self.line:
+                raise PascalRuntimeError('Unexpected end of input')
+
+    def read(self, type_name: str):
+        self._skip_spaces()
+        line, start = self.line, self.pos
+        if type_name == 'char':
+            self.pos += 1
+            return line[start]
+        end = start
+        while end < len(line) and not line[end].isspace():
+            end += 1
+        self.pos = end
+        word = line[start:end]
+        try:
+            return _add(int(word), 0)
+        except ValueError:
+            raise PascalRuntimeError("Invalid integer '%s' in input" % word)
+
+    # ReadLn: остаток текущей строки пропускается (без аргументов - вся следующая строка)
+    def skip_line(self):
+        if self.pos < len(self.line):
+            self.line, self.pos = '', 0
+        else:
+            self.stream.readline()
+
+
+# Состояние одного запуска: глобальные переменные, ввод-вывод и счетчик шагов
+# (итерации циклов и вызовы подпрограмм) для ограничения времени работы
+class _Context:
+    def __init__(self, stdin: TextIO, stdout: TextIO, step_limit: Optional[int]):
+        self.globals: List = []
+        self.input = _Input(stdin)
+        self.write = stdout.write
+        self.steps = 0
+        self.step_limit = step_limit if step_limit is not None else float('inf')
+
+    def tick(self):
+        self.steps += 1
+        if self.steps > self.step_limit:
+            raise PascalRuntimeError('Step limit exceeded ({0} steps)'.format(self.step_limit))
+
+
+# Исполняемые узлы: имена уже разрешены в номера ячеек, выражения вычисляет ev(frame),
+# операторы выполняет ex(frame). frame - список параметров текущей подпрограммы,
+# глобальные переменные лежат в общем списке, массив - сам список элементов
+class _Const:
+    __slots__ = ('value',)
+
+    def __init__(self, value):
+        self.value = value
+
+    def ev(self, frame):
+        return self.value
+
+
+class _Global:
+    __slots__ = ('cells', 'index')
+
+    def __init__(self, cells: List, index: int):
+        self.cells = cells
+        self.index = index
+
+    def ev(self, frame):
+        return self.cells[self.index]
+
+    def put(self, frame, value):
+        self.cells[self.index] = value
+
+
+class _Local:
+    __slots__ = ('index',)
+
+    def __init__(self, index: int):
+        self.index = index
+
+    def ev(self, frame):
+        return frame[self.index]
+
+    def put(self, frame, value):
+        frame[self.index] = value
+
+
+# Элемент массива: индекс в программе всегда литерал, смещение вычисляется заранее
+_Element = _Global
+
+
+class _BinOp:
+    __slots__ = ('fn', 'arg1', 'arg2')
+
+    def __init__(self, fn, arg1, arg2):
+        self.fn = fn
+        self.arg1 = arg1
+        self.arg2 = arg2
+
+    def ev(self, frame):
+        return self.fn(self.arg1.ev(frame), self.arg2.ev(frame))
+
+
+class _Assign:
+    __slots__ = ('put', 'val')
+
+    def __init__(self, target, val):
+        self.put = target.put
+        self.val = val
+
+    def ex(self, frame):
+        self.put(frame, self.val.ev(frame))
+
+
+class _Block:
+    __slots__ = ('stmts',)
+
+    def __init__(self, stmts):
+        self.stmts = tuple(stmts)
+
+    def ex(self, frame):
+        for stmt in self.stmts:
+            stmt.ex(frame)
+
+
+class _If:
+    __slots__ = ('cond', 'then_stmt', 'else_stmt')
+
+    def __init__(self, cond, then_stmt, else_stmt):
+        self.cond = cond
+        self.then_stmt = then_stmt
+        self.else_stmt = else_stmt
+
+    def ex(self, frame):
+        if self.cond.ev(frame):
+            self.then_stmt.ex(frame)
+        elif self.else_stmt is not None:
+            self.else_stmt.ex(frame)
+
+
+class _While:
+    __slots__ = ('cond', 'body', 'tick')
+
+    def __init__(self, cond, body, ctx: _Context):
+        self.cond = cond
+        self.body = body
+        self.tick = ctx.tick
+
+    def ex(self, frame):
+        cond, body, tick = self.cond, self.body, self.tick
+        while cond.ev(frame):
+            body.ex(frame)
+            tick()
+
+
+class _Repeat:
+    __slots__ = ('body', 'cond', 'tick')
+
+    def __init__(self, body, cond, ctx: _Context):
+        self.body = body
+        self.cond = cond
+        self.tick = ctx.tick
+
+    def ex(self, frame):
+        body, cond, tick = self.body, self.cond, self.tick
+        while True:
+            body.ex(frame)
+            if cond.ev(frame):
+                return
+            tick()
+
+
+# for (v := a to b): граница вычисляется один раз, тело выполняется, пока v <= b
+class _For:
+    __slots__ = ('init', 'var', 'to', 'body', 'tick')
+
+    def __init__(self, init: _Assign, var, to, body, ctx: _Context):
+        self.init = init
+        self.var = var
+        self.to = to
+        self.body = body
+        self.tick = ctx.tick
+
+    def ex(self, frame):
+        self.init.ex(frame)
+        to = self.to.ev(frame)
+        var, body, tick = self.var, self.body, self.tick
+        while var.ev(frame) <= to:
+            body.ex(frame)
+            var.put(frame, _add(var.ev(frame), 1))
+            tick()
+
+
+# Подпрограмма: число ячеек кадра (параметры), тело и выражение-результат функции.
+# Как и в сгенерированном коде, функция возвращает переменную из последнего присваивания
+class _Routine:
+    __slots__ = ('name', 'size', 'body', 'result')
+
+    def __init__(self, name: str, size: int):
+        self.name = name
+        self.size = size
+        self.body = None
+        self.result = None
+
+
+class _Call:
+    __slots__ = ('routine', 'args', 'tick')
+
+    def __init__(self, routine: _Routine, args, ctx: _Context):
+        self.routine = routine
+        self.args = tuple(args)
+        self.tick = ctx.tick
+
+    def ev(self, frame):
+        routine = self.routine
+        callee = [arg.ev(frame) for arg in self.args]
+        self.tick()
+        routine.body.ex(callee)
+        if routine.result is not None:
+            return routine.result.ev(callee)
+        return None
+
+    def ex(self, frame):
+        self.ev(frame)
+
+
+class _Write:
+    __slots__ = ('args', 'write')
+
+    def __init__(self, args, ctx: _Context):
+        self.args = tuple(args)
+        self.write = ctx.write
+
+    def ex(self, frame):
+        for arg in self.args:
+            self.write(_format(arg.ev(frame)) + '\n')
+
+
+class _Read:
+    __slots__ = ('targets', 'input', 'new_line')
+
+    def __init__(self, targets, new_line: bool, ctx: _Context):
+        self.targets = tuple(targets)
+        self.input = ctx.input
+        self.new_line = new_line
+
+    def ex(self, frame):
+        read = self.input.read
+        for put, type_name in self.targets:
+            put(frame, read(type_name))
+        if self.new_line:
+            self.input.skip_line()
+
+
+# Разрешение имен перед исполнением: каждое обращение к переменной превращается
+# в узел с номером ячейки, вызов - в узел со ссылкой на подпрограмму.
+# Области видимости те же, что у SemanticAnalyzer: в подпрограмме видны ее параметры,
+# глобальные переменные и объявленные раньше подпрограммы (раздел var подпрограммы не используется)
+class _Resolver(NodeVisitor):
+    def __init__(self, ctx: _Context):
+        self.ctx = ctx
+        self.current_scope = None
+        self.routines = {}
+
+    def _lookup(self, name: str) -> Symbol:
+        symbol = self.current_scope.lookup(name)
+        if symbol is None:
+            raise Exception("Symbol(identifier) not found '%s'" % name)
+        return symbol
+
+    def _variable(self, name: str):
+        symbol = self._lookup(name)
+        if type(symbol) is not VarSymbol:
+            raise Exception("'%s' is not a variable" % name)
+        if symbol.is_field:
+            return _Global(self.ctx.globals, symbol.index)
+        return _Local(symbol.index)
+
+    def _target(self, var: AstNode):
+        if isinstance(var, ArrayIdentNode):
+            return self.visit_ArrayIdentNode(var)
+        return self._variable(var.name)
+
+    # Функция записи в переменную или элемент массива: put(frame, value)
+    def _setter(self, var: AstNode):
+        return self._target(var).put
+
+    def _type_name(self, var: AstNode) -> str:
+        name = var.name.name if isinstance(var, ArrayIdentNode) else var.name
+        return self._lookup(name).type.name
+
+    def visit_LiteralNode(self, node: LiteralNode):
+        return _Const(node.value)
+
+    def visit_IdentNode(self, node: IdentNode):
+        return self._variable(node.name)
+
+    def visit_ArrayIdentNode(self, node: ArrayIdentNode):
+        name = node.name.name
+        symbol = self._lookup(name)
+        if not isinstance(symbol, ArraySymbol):
+            raise Exception("'%s' is not an array" % name)
+        index = int(node.literal.literal)
+        if index < int(symbol.from_) or index > int(symbol.to_):
+            raise Exception("Out of range '%s'" % index)
+        return _Element(self.ctx.globals[symbol.index], index - int(symbol.from_))
+
+    def visit_BinOpNode(self, node: BinOpNode):
+        arg1 = yield node.arg1
+        arg2 = yield node.arg2
+        return _BinOp(_BIN_OPS[node.op], arg1, arg2)
+
+    def visit_CallNode(self, node: CallNode):
+        name = node.func.name
+        if name in _WRITE_BUILTINS:
+            args = []
+            for param in node.params:
+                args.append((yield param))
+            return _Write(args, self.ctx)
+        if name in _READ_BUILTINS:
+            targets = [(self._setter(param), self._type_name(param)) for param in node.params]
+            return _Read(targets, name == 'ReadLn', self.ctx)
+        symbol = self._lookup(name)
+        if symbol not in self.routines:
+            raise Exception("Undefined function '%s' " % name)
+        if len(node.params) != len(symbol.params):
+            raise Exception("Wrong number of parameters specified for call to '%s' " % name)
+        args = []
+        for param in node.params:
+            args.append((yield param))
+        return _Call(self.routines[symbol], args, self.ctx)
+
+    def visit_AssignNode(self, node: AssignNode):
+        target = self._target(node.var)
+        val = yield node.val
+        return _Assign(target, val)
+
+    def visit_StmtListNode(self, node: StmtListNode):
+        stmts = []
+        for stmt in node.exprs:
+            stmts.append((yield stmt))
+        return _Block(stmts)
+
+    def visit_BodyNode(self, node: BodyNode):
+        return (yield node.body)
+
+    def visit_IfNode(self, node: IfNode):
+        cond = yield node.cond
+        then_stmt = yield node.then_stmt
+        else_stmt = None
+        if node.else_stmt is not None:
+            else_stmt = yield node.else_stmt
+        return _If(cond, then_stmt, else_stmt)
+
+    def visit_WhileNode(self, node: WhileNode):
+        cond = yield node.cond
+        body = yield node.stmt_list
+        return _While(cond, body, self.ctx)
+
+    def visit_RepeatNode(self, node: RepeatNode):
+        body = yield node.stmt_list
+        cond = yield node.cond
+        return _Repeat(body, cond, self.ctx)
+
+    def visit_ForNode(self, node: ForNode):
+        init = yield node.init
+        to = yield node.to
+        body = yield node.body
+        return _For(init, self._target(node.init.var), to, body, self.ctx)
+
+    def visit_VarsDeclNode(self, node: VarsDeclNode):
+        for decl in node.var_decs:
+            yield decl
+
+    def visit_VarDeclNode(self, node: VarDeclNode):
+        type_symbol = self._lookup(node.vars_type.name)
+        cells = self.ctx.globals
+        for ident in node.ident_list.idents:
+            if self.current_scope.lookup(ident.name, current_scope_only=True):
+                raise Exception("Duplicate identifier '%s' found" % ident.name)
+            self.current_scope.define(VarSymbol(ident.name, type_symbol, is_field=True, index=len(cells)))
+            cells.append(_ZERO[type_symbol.name])
+
+    def visit_ArrayDeclNode(self, node: ArrayDeclNode):
+        type_name = node.vars_type.name
+        from_, to_ = int(node.from_.literal), int(node.to_.literal)
+        cells = self.ctx.globals
+        for ident in node.name.idents:
+            if self.current_scope.lookup(ident.name, current_scope_only=True):
+                raise Exception("Duplicate identifier '%s' found" % ident.name)
+            symbol = ArraySymbol(ident.name, self._lookup(type_name), from_, to_, index=len(cells))
+            symbol.is_field = True
+            self.current_scope.define(symbol)
+            cells.append([_ZERO[type_name]] * (to_ - from_ + 1))
+
+    def _routine(self, node, symbol: Symbol):
+        self.current_scope.define(symbol)
+        scope = ScopedSymbolTable(symbol.name, self.current_scope.scope_level + 1, self.current_scope)
+        self.current_scope = scope
+        for param in node.params.decls:
+            param_type = self._lookup(param.vars_type.name)
+            for ident in param.ident_list.idents:
+                var_symbol = VarSymbol(ident.name, param_type, index=scope.last_index)
+                scope.last_index += 1
+                scope.define(var_symbol)
+                symbol.params.append(var_symbol)
+        routine = self.routines[symbol] = _Routine(symbol.name, scope.last_index)
+        routine.body = yield node.stmt_list
+        if isinstance(symbol, FunctionSymbol):
+            stmts = node.stmt_list.body.exprs
+            if not stmts or not isinstance(stmts[-1], AssignNode) or not isinstance(stmts[-1].var, IdentNode):
+                raise Exception("Function '%s' must end with an assignment" % symbol.name)
+            routine.result = self._variable(stmts[-1].var.name)
+        scope.close()
+        self.current_scope = scope.enclosing_scope
+
+    def visit_ProcedureDeclNode(self, node: ProcedureDeclNode):
+        yield from self._routine(node, ProcedureSymbol(node.proc_name.name))
+
+    def visit_FunctionDeclNode(self, node: FunctionDeclNode):
+        symbol = FunctionSymbol(node.proc_name.name)
+        symbol.type = node.returning_type.name
+        yield from self._routine(node, symbol)
+
+    def visit_ProgramNode(self, node: ProgramNode):
+        self.current_scope = ScopedSymbolTable(node.prog_name.name, 1)
+        yield node.vars_decl
+        main = yield node.stmt_list
+        self.current_scope.close()
+        return main
+
+
+# Способ исполнения: 'tree' - обход исполняемых узлов _Resolver,
+# 'closure' - замыкания Python из ClosureCompiler (closures.py),
+# 'vm' - байт-код регистровой машины (vm.py), полученный из кода SemanticAnalyzer
+ENGINES = ('tree', 'closure', 'vm')
+DEFAULT_ENGINE = 'closure'
+
+
+# Интерпретатор AST: выполняет программу без JVM. Перед запуском дерево один раз
+# переводится в исполняемые узлы или замыкания (см. engine), во время работы имена не ищутся.
+# step_limit ограничивает число итераций циклов и вызовов подпрограмм; steps - сколько
+# шагов сделал последний запуск
+class Interpreter:
+    def __init__(self, stdin: Optional[TextIO] = None, stdout: Optional[TextIO] = None,
+                 step_limit: Optional[int] = None, engine: str = DEFAULT_ENGINE):
+        if engine not in ENGINES:
+            raise ValueError("Unknown interpreter engine '%s'" % engine)
+        self.stdin = stdin
+        self.stdout = stdout
+        self.step_limit = step_limit
+        self.engine = engine
+        self.steps = 0
+
+    def _prepare(self, ctx: _Context, ast: ProgramNode):
+        if self.engine == 'closure':
+            from closures import ClosureCompiler
+            return ClosureCompiler(ctx).visit(ast)
+        if self.engine == 'vm':
+            from vm import VirtualMachine, compile_program
+            program = compile_program(ast)
+            return lambda frame: VirtualMachine(ctx).run(program)
+        return _Resolver(ctx).visit(ast).ex
+
+    def run(self, ast: ProgramNode):
+        ctx = _Context(self.stdin if self.stdin is not None else sys.stdin,
+                       self.stdout if self.stdout is not None else sys.stdout, self.step_limit)
+        main = self._prepare(ctx, ast)
+        try:
+            main([])
+        except RecursionError:
+            raise PascalRuntimeError('Stack overflow')
+        finally:
+            self.steps = ctx.steps
+
+
+def run_source(source: str, backend: str = DEFAULT_BACKEND, stdin: Optional[TextIO] = None,
+               stdout: Optional[TextIO] = None, step_limit: Optional[int] = None,
+               folder: Optional[ConstantFolder] = None, engine: str = DEFAULT_ENGINE) -> Interpreter:
+    ast = get_parser(backend).parse(source)
+    if folder is not None:
+        ast = folder.fold(ast)
+    interpreter = Interpreter(stdin, stdout, step_limit, engine)
+    interpreter.run(ast)
+    return interpreter
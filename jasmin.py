@@ -1,25 +1,96 @@
-from typing import List
+from typing import Iterable, List, Optional, TextIO
 
+from classfile import method_limits
+from peephole import PeepholeOptimizer
 
-class CodeLine:
-    def __init__(self, code: str):
-        self.code = code
 
-    def __str__(self):
-        return self.code
+# Число инструкций в строках тела метода: метки, директивы и пустые строки не считаются;
+# одна строка может содержать несколько инструкций через перевод строки
+def count_instructions(lines: Iterable[str]) -> int:
+    count = 0
+    for line in lines:
+        for part in line.split('\n'):
+            if part and not part.endswith(':') and not part.startswith('.'):
+                count += 1
+    return count
 
 
+# Генератор Jasmin-кода. Без sink инструкции накапливаются в одном списке строк,
+# code возвращает этот список без копирования. С sink (файлоподобный объект)
+# каждая инструкция сразу пишется в него и в памяти не хранится.
+# Тело метода между begin_method и end_method буферизуется: .limit stack/locals
+# вычисляются по готовым инструкциям и выводятся перед телом.
+# С optimizer тело метода перед выводом проходит через peephole-оптимизатор.
+# Метки (last_index) нумеруются заново в каждом методе: код метода не зависит от того,
+# сколько меток заняли предыдущие, и готовый блок метода можно вставить через add_method
 class CodeGenerator:
-    def __init__(self):
-        self.code_lines: List[CodeLine] = []
+    def __init__(self, sink: Optional[TextIO] = None, optimizer: Optional[PeepholeOptimizer] = None):
+        self.sink = sink
+        self.optimizer = optimizer
+        self.code_lines: List[str] = []
         self.last_index = 0
+        self.count = 0
+        # инструкций в телах методов после оптимизации (см. count_instructions)
+        self.instructions = 0
+        self._method_header: Optional[str] = None
+        self._method_lines: List[str] = []
+        self._emit = self._add_to_list
+        if sink is not None:
+            self._write = sink.write
+            self._emit = self._add_to_sink
+        self.add = self._emit
 
-    def add(self, code: str):
-        self.code_lines.append(CodeLine(code))
+    def _add_to_list(self, code: str):
+        self.code_lines.append(code)
+        self.count += 1
+
+    def _add_to_sink(self, code: str):
+        if self.count:
+            self._write('\n')
+        self._write(code)
+        self.count += 1
+
+    def begin_method(self, header: str):
+        if self._method_header is not None:
+            raise Exception('Nested method {0!r}'.format(header))
+        self._method_header = header
+        self._method_lines = []
+        self.last_index = 0
+        self.add = self._method_lines.append
+
+    # min_locals - число локальных переменных по таблице символов (last_index области)
+    def end_method(self, min_locals: int = 0):
+        header, body = self._method_header, self._method_lines
+        if self.optimizer is not None:
+            body = self.optimizer.optimize(body)
+        max_stack, max_locals = method_limits(header, body, min_locals)
+        self.instructions += count_instructions(body)
+        self._method_header = None
+        self._method_lines = []
+        self.add = emit = self._emit
+        emit(header)
+        emit('.limit stack {0}'.format(max_stack))
+        emit('.limit locals {0}'.format(max_locals))
+        for line in body:
+            emit(line)
+        emit('.end method')
+
+    # Готовый блок метода (от заголовка до .end method), например, из кэша инкрементальной компиляции
+    def add_method(self, lines: List[str]):
+        if self._method_header is not None:
+            raise Exception('Nested method inside {0!r}'.format(self._method_header))
+        self.instructions += count_instructions(lines)
+        if self.sink is None:
+            self.code_lines.extend(lines)
+            self.count += len(lines)
+            return
+        for line in lines:
+            self._emit(line)
+
+    @property
+    def code(self) -> List[str]:
+        return self.code_lines
 
     @property
-    def code(self) -> [str, ...]:
-        code: List[str] = []
-        for cl in self.code_lines:
-            code.append(str(cl))
-        return code
+    def text(self) -> str:
+        return '\n'.join(self.code_lines)
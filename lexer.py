@@ -0,0 +1,125 @@
+import re
+from itertools import islice
+from typing import Iterator, List, NamedTuple, Union
+
+# Текст программы: строка или буфер байтов в UTF-8 (bytes, mmap, memoryview)
+Source = Union[str, bytes, bytearray, memoryview]
+
+
+# Позиция в буфере байтов считается в байтах
+class ParseError(Exception):
+    def __init__(self, message: str, pos: int = 0, source: Source = ''):
+        newline = '\n' if isinstance(source, str) else b'\n'
+        # у mmap нет count, поэтому строки считаются по копии начала буфера (только при ошибке)
+        head = source if isinstance(source, (str, bytes)) else bytes(source[:pos])
+        line = head.count(newline, 0, pos) + 1
+        col = pos - head.rfind(newline, 0, pos)
+        super().__init__('{0} (line: {1}, col: {2})'.format(message, line, col))
+        self.pos = pos
+        self.line = line
+        self.col = col
+
+
+# Лексема: вид (NUM, STR, IDENT, OP), текст и позиция начала/конца в исходной строке
+class Token(NamedTuple):
+    kind: str
+    text: str
+    start: int
+    end: int
+
+
+EOF = 'EOF'
+
+# Порядок альтернатив важен: сначала пропускаемые комментарии и пробелы,
+# затем многосимвольные операторы раньше односимвольных
+_TOKEN_PATTERN = r'''
+    (?P<SKIP>\s+|/\*.*?\*/|//[^\n]*)
+  | (?P<NUM>\d+(?:\.(?!\.)\d*)?(?:[eE][+-]?\d+)?)
+  | (?P<STR>'(?:[^'\\\n]|\\.)*')
+  | (?P<IDENT>[A-Za-z_][A-Za-z0-9_]*)
+  | (?P<OP>:=|\.\.|>=|<=|!=|[-+*/<>=()\[\];:,.])
+'''
+# \s и \d только ASCII, как в шаблоне для байтов (и как у pyparsing): иначе строка и
+# буфер с тем же текстом разбивались бы по-разному, например, на неразрывном пробеле
+_TOKEN_RE = re.compile(_TOKEN_PATTERN, re.VERBOSE | re.DOTALL | re.ASCII)
+# Тот же шаблон для буфера байтов: регулярное выражение идет прямо по буферу (например, mmap)
+_TOKEN_BYTES_RE = re.compile(_TOKEN_PATTERN.encode(), re.VERBOSE | re.DOTALL)
+
+
+# Лексический анализатор: один проход по тексту программы.
+# Текст может быть буфером байтов: тогда он не копируется в строку целиком, пробелы
+# и комментарии не извлекаются вовсе, а строкой становится только текст лексем.
+# Одинаковые тексты лексем - один объект str, его разделяют все узлы с этим именем
+class Lexer:
+    def __init__(self, source: Source):
+        self.source = source
+
+    def tokenize(self) -> List[Token]:
+        return list(self.iter_tokens())
+
+    # Лексемы по одной, по мере чтения; последняя - EOF
+    def iter_tokens(self) -> Iterator[Token]:
+        source = self.source
+        is_text = isinstance(source, str)
+        token_re = _TOKEN_RE if is_text else _TOKEN_BYTES_RE
+        # кортеж лексемы создается напрямую, без Python-уровня Token.__new__
+        new_token = tuple.__new__
+        texts = {}
+        pos, end = 0, len(source)
+        # finditer ищет совпадения подряд; пропуск между ними - непредусмотренный символ
+        for m in token_re.finditer(source):
+            start = m.start()
+            if start != pos:
+                break
+            pos = m.end()
+            kind = m.lastgroup
+            if kind != 'SKIP':
+                value = m.group()
+                text = texts.get(value)
+                if text is None:
+                    text = texts[value] = value if is_text else value.decode('utf-8')
+                yield new_token(Token, (kind, text, start, pos))
+        if pos < end:
+            # символ UTF-8 занимает до 4 байтов
+            char = source[pos] if is_text else bytes(source[pos:pos + 4]).decode('utf-8', 'replace')[0]
+            raise ParseError('Unexpected character {0!r}'.format(char), pos, source)
+        yield Token(EOF, '', end, end)
+
+
+# Лексемы по требованию: tokens[i] дочитывает поток до i-й лексемы, за EOF - снова EOF.
+# Парсер не возвращается назад дальше текущей лексемы, поэтому в памяти остаются
+# только последние лексемы, а не список лексем всей программы
+class TokenStream:
+    _KEEP = 16
+    _CHUNK = 4096
+
+    def __init__(self, tokens: Iterator[Token]):
+        self._tokens = tokens
+        self._buffer: List[Token] = []
+        self._base = 0
+        self._eof = None
+
+    def __getitem__(self, index: int) -> Token:
+        try:
+            return self._buffer[index - self._base]
+        except IndexError:
+            return self._fill(index)
+
+    # Лексемы дочитываются пачками по _CHUNK; из буфера отбрасываются уже пройденные,
+    # кроме последних _KEEP
+    def _fill(self, index: int) -> Token:
+        if self._eof is not None:
+            return self._eof
+        buffer = self._buffer
+        drop = len(buffer) - self._KEEP
+        if drop > 0:
+            del buffer[:drop]
+            self._base += drop
+        while index - self._base >= len(buffer):
+            chunk = list(islice(self._tokens, self._CHUNK))
+            buffer.extend(chunk)
+            if len(chunk) < self._CHUNK:
+                self._eof = buffer[-1]
+                if index - self._base >= len(buffer):
+                    return self._eof
+        return buffer[index - self._base]
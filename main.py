@@ -1,19 +1,202 @@
+import argparse
+import json
+import logging
 import os
-from grammar import *
-from semantic import *
+import sys
+import time
+from contextlib import nullcontext
+from batch import *
+from compile_cache import CompileCache
+from classfile import assemble
+from compiler import *
+from folding import ConstantFolder
 from file_helper import *
+from incremental import IncrementalCompiler, watch
+from interpreter import DEFAULT_ENGINE, ENGINES, PascalRuntimeError, run_source
+from nodes import write_tree
+from peephole import PeepholeOptimizer, RULES, parse_rules
+from pipeline import PipelineStats, compile_files_async
+from profiling import CompileProfile, phase
+from protocol import DEFAULT_SOCKET
+from tracing import CountingTracer, LoggingTracer
+
+# Куда без входных файлов пишутся jasmin_res.j и .class примера: не в resources/, где лежат
+# эталонные pr1-pr3.class от jasmin.jar и листинг jasmin_res.j, из которого собран pr3.class
+DEFAULT_OUTPUT_DIR = 'build'
+
+
+# Профиль в JSON: в stderr или в файл target
+def write_profile(profile: CompileProfile, target: str):
+    if target == '-':
+        print(profile.to_json(), file=sys.stderr)
+    else:
+        FileHelper.write_to_file(target, profile.to_json())
 
 
 def main():
-    prog = FileHelper.read_from_file('resources/input_program_3.txt')
-    g = PascalGrammar()
-    prog = g.parse(prog)
-    print(*prog.tree, sep=os.linesep)
-    code_generator = CodeGenerator()
-    symb_table_builder = SemanticAnalyzer(code_generator)
-    symb_table_builder.visit(prog)
-    print(*symb_table_builder.generator.code, sep=os.linesep)
-    FileHelper.write_to_file('resources/jasmin_res.j', '\n'.join(symb_table_builder.generator.code))
+    arg_parser = argparse.ArgumentParser(description='Pascal to JVM class file compiler')
+    arg_parser.add_argument('inputs', nargs='*',
+                            help='source files or directories; without inputs compiles '
+                                 'resources/input_program_3.txt to jasmin_res.j and its .class in '
+                                 '-o or ' + DEFAULT_OUTPUT_DIR + '/')
+    arg_parser.add_argument('-o', '--output-dir', help='directory for output files (default: next to the source)')
+    arg_parser.add_argument('-j', '--jobs', type=int, default=None, help='worker processes (default: CPU count)')
+    arg_parser.add_argument('--backend', choices=PARSER_BACKENDS, default=DEFAULT_BACKEND)
+    arg_parser.add_argument('--emit', choices=EMIT_FORMATS, default='class',
+                            help='write .class files or Jasmin text (.j) for debugging')
+    arg_parser.add_argument('--no-cache', action='store_true', help='do not use the compilation cache')
+    arg_parser.add_argument('--cache-dir', default=CompileCache.DEFAULT_DIR)
+    arg_parser.add_argument('--trace', choices=('log', 'summary'),
+                            help='symbol table tracing without inputs: log every event to stderr '
+                                 'or print lookup counters per scope')
+    arg_parser.add_argument('-O', '--optimize', action='store_true',
+                            help='enable all optimizations: --fold, --promote and --peephole all')
+    arg_parser.add_argument('--peephole', default=None, metavar='RULES',
+                            help="peephole rules: 'none' (default, 'all' with -O), 'all' or a comma-separated "
+                                 "list of " + ', '.join(RULES))
+    arg_parser.add_argument('--fold', action='store_true',
+                            help='fold and propagate integer constants in the AST')
+    arg_parser.add_argument('--promote', action='store_true',
+                            help='keep program variables in main locals instead of static fields')
+    arg_parser.add_argument('--opt-stats', action='store_true',
+                            help='print how many times each constant folding and peephole rule fired to stderr')
+    arg_parser.add_argument('--pipeline', action='store_true',
+                            help='compile inputs through the asyncio pipeline: reading, compiling and writing '
+                                 'overlap, joined by bounded queues')
+    arg_parser.add_argument('--queue-size', type=int, default=None,
+                            help='with --pipeline: files waiting between stages (default: 2 * jobs)')
+    arg_parser.add_argument('--stage-stats', action='store_true',
+                            help='with --pipeline: print per-stage throughput counters to stderr')
+    arg_parser.add_argument('--profile', nargs='?', const='-', metavar='FILE',
+                            help='print wall and CPU time per phase, peak traced allocation, AST nodes per '
+                                 'class and emitted instructions as JSON to stderr or FILE; with inputs the '
+                                 'profiles of all files are summed (with --pipeline only the compile stage)')
+    arg_parser.add_argument('--serve', action='store_true',
+                            help='run a compile server on a Unix socket (see client.py); '
+                                 '-j sets the number of worker processes')
+    arg_parser.add_argument('--socket', default=DEFAULT_SOCKET, help='socket path for --serve')
+    arg_parser.add_argument('--watch', action='store_true',
+                            help='recompile one source file whenever it changes; unchanged procedures and '
+                                 'functions are not parsed and generated again')
+    arg_parser.add_argument('--run', action='store_true',
+                            help='interpret the programs (default: resources/input_program_3.txt) '
+                                 'instead of compiling; Read/ReadLn take input from stdin')
+    arg_parser.add_argument('--engine', choices=ENGINES, default=DEFAULT_ENGINE,
+                            help='with --run: walk the resolved tree, execute it compiled to Python closures '
+                                 'or run it on the register bytecode VM')
+    arg_parser.add_argument('--step-limit', type=int, default=None,
+                            help='with --run: stop after this many loop iterations and calls')
+    args = arg_parser.parse_args()
+    # по умолчанию код не оптимизируется и совпадает с тем, что порождал компилятор без оптимизаций
+    if args.optimize:
+        args.fold = args.promote = True
+    peephole = parse_rules(args.peephole or ('all' if args.optimize else 'none'))
+    unknown = [name for name in peephole or () if name not in RULES]
+    if unknown:
+        arg_parser.error('unknown peephole rules: ' + ', '.join(unknown))
+
+    if args.serve:
+        from server import serve
+        serve(args.socket, jobs=args.jobs, backend=args.backend,
+              cache_dir=None if args.no_cache else args.cache_dir, peephole=peephole,
+              fold=args.fold, promote=args.promote)
+        return
+
+    if args.watch:
+        if len(args.inputs) != 1 or os.path.isdir(args.inputs[0]):
+            arg_parser.error('--watch takes exactly one source file')
+        if args.output_dir:
+            os.makedirs(args.output_dir, exist_ok=True)
+        compiler = IncrementalCompiler(args.backend, PeepholeOptimizer(peephole) if peephole is not None else None,
+                                       ConstantFolder() if args.fold else None, args.promote)
+        watch(args.inputs[0], output_path_for(args.inputs[0], args.output_dir, args.emit), compiler, args.emit)
+        return
+
+    if args.run:
+        failed = 0
+        paths = args.inputs or ['resources/input_program_3.txt']
+        started = time.perf_counter()
+        for path in paths:
+            try:
+                run_source(FileHelper.read_from_file(path), backend=args.backend,
+                           step_limit=args.step_limit, folder=ConstantFolder() if args.fold else None,
+                           engine=args.engine)
+            except PascalRuntimeError as e:
+                print('{0}: runtime error: {1}'.format(path, e), file=sys.stderr)
+                failed += 1
+        if len(paths) > 1:
+            elapsed = time.perf_counter() - started
+            print('Ran {0} of {1} programs in {2:.3f} s ({3:.1f} programs/s)'.format(
+                len(paths) - failed, len(paths), elapsed, len(paths) / elapsed), file=sys.stderr)
+        sys.exit(1 if failed else 0)
+
+    if args.inputs:
+        options = dict(output_dir=args.output_dir, jobs=args.jobs, backend=args.backend,
+                       cache_dir=None if args.no_cache else args.cache_dir, emit=args.emit,
+                       peephole=peephole, fold=args.fold, promote=args.promote,
+                       profile=args.profile is not None)
+        if args.pipeline:
+            pipeline_stats = PipelineStats()
+            results = compile_files_async(args.inputs, queue_size=args.queue_size, stats=pipeline_stats, **options)
+            if args.stage_stats:
+                print(json.dumps(pipeline_stats.summary(), indent=2), file=sys.stderr)
+        else:
+            results = compile_files(args.inputs, **options)
+        failed = [r for r in results if not r.ok]
+        if args.opt_stats:
+            stats = {'fold': {}, 'peephole': {}}
+            for r in results:
+                for kind, hits in (('fold', r.fold_hits), ('peephole', r.peephole_hits)):
+                    for name, count in (hits or {}).items():
+                        stats[kind][name] = stats[kind].get(name, 0) + count
+            print(json.dumps(stats, indent=2), file=sys.stderr)
+        if args.profile is not None:
+            profile = CompileProfile()
+            for r in results:
+                if r.profile is not None:
+                    profile.merge(r.profile)
+            write_profile(profile, args.profile)
+        for r in failed:
+            print('{0}: {1}'.format(r.source_path, r.error), file=sys.stderr)
+        print('Compiled {0} of {1} files'.format(len(results) - len(failed), len(results)), file=sys.stderr)
+        sys.exit(1 if failed else 0)
+
+    cache = None if args.no_cache else CompileCache(args.cache_dir)
+    tracer = None
+    if args.trace == 'log':
+        logging.basicConfig(level=logging.DEBUG, format='%(message)s')
+        tracer = LoggingTracer()
+    elif args.trace == 'summary':
+        tracer = CountingTracer()
+    profile = CompileProfile() if args.profile is not None else None
+    with profile.run() if profile is not None else nullcontext():
+        with phase(profile, 'read'):
+            prog = FileHelper.read_from_file('resources/input_program_3.txt')
+        optimizer = PeepholeOptimizer(peephole) if peephole is not None else None
+        folder = ConstantFolder() if args.fold else None
+        result = compile_source(prog, backend=args.backend, cache=cache, tracer=tracer, optimizer=optimizer,
+                                folder=folder, promote_globals=args.promote, profile=profile)
+        if args.trace == 'summary':
+            print(json.dumps(tracer.summary(), indent=2, sort_keys=True), file=sys.stderr)
+        if args.opt_stats:
+            stats = {'fold': folder.hits if folder is not None else {},
+                     'peephole': optimizer.hits if optimizer is not None else {}}
+            print(json.dumps(stats, indent=2), file=sys.stderr)
+        with phase(profile, 'tree'):
+            write_tree(result.ast, sys.stdout)
+        with phase(profile, 'print'):
+            print(*result.code, sep=os.linesep)
+        with phase(profile, 'assemble'):
+            class_name, class_bytes = assemble(result.code, 'jasmin_res.j')
+        # фазы не пересекаются и каждая считается один раз: оба файла пишутся после сборки
+        with phase(profile, 'write'):
+            output_dir = args.output_dir or DEFAULT_OUTPUT_DIR
+            os.makedirs(output_dir, exist_ok=True)
+            FileHelper.write_to_file(os.path.join(output_dir, 'jasmin_res.j'), '\n'.join(result.code))
+            with open(os.path.join(output_dir, class_name + '.class'), 'wb') as f:
+                f.write(class_bytes)
+    if profile is not None:
+        write_profile(profile, args.profile)
 
 
 if __name__ == "__main__":
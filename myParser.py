@@ -14,18 +14,27 @@ class PascalParser:
         if getattr(parser, 'name', None) and parser.name.isidentifier():
             rule_name = parser.name
         if rule_name in ('bin_op',):
+            # tocs - плоская последовательность: операнд (знак операнд)*
+            # дерево строится методом precedence climbing, глубина рекурсии ограничена числом приоритетов
+            def climb(s, loc, tocs, pos, min_prec):
+                node = tocs[pos]
+                pos += 1
+                while pos < len(tocs):
+                    op = BinOp(tocs[pos])
+                    prec = BIN_OP_PRECEDENCE[op]
+                    if prec < min_prec:
+                        break
+                    second_node, pos = climb(s, loc, tocs, pos + 1, prec + 1)
+                    node = BinOpNode(op, node, second_node)
+                    if prec in NON_ASSOCIATIVE_PRECEDENCES and pos < len(tocs) \
+                            and BIN_OP_PRECEDENCE[BinOp(tocs[pos])] == prec:
+                        raise pp.ParseException(s, loc, 'Non-associative operator {}'.format(tocs[pos]))
+                return node, pos
+
             def bin_op_parse_action(s, loc, tocs):
-                node = tocs[0]
-                if not isinstance(node, AstNode):
-                    node = bin_op_parse_action(s, loc, node)
-                for i in range(1, len(tocs) - 1, 2):
-                    secondNode = tocs[i + 1]
-                    if not isinstance(secondNode, AstNode):
-                        secondNode = bin_op_parse_action(s, loc, secondNode)
-                    node = BinOpNode(BinOp(tocs[i]), node, secondNode)
-                return node
+                return climb(s, loc, tocs, 0, 0)[0]
 
-            parser.setParseAction(bin_op_parse_action)
+            parser.set_parse_action(bin_op_parse_action)
         else:
             cls = ''.join(x.capitalize() for x in rule_name.split('_')) + 'Node'
             with suppress(NameError):
@@ -34,4 +43,4 @@ class PascalParser:
                     def parse_action(s, loc, tocs):
                         return cls(*tocs)
 
-                    parser.setParseAction(parse_action)
\ No newline at end of file
+                    parser.set_parse_action(parse_action)
\ No newline at end of file
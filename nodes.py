@@ -1,41 +1,53 @@
 from abc import ABC, abstractmethod
-from typing import Callable, Tuple, Optional, Union
+from ast import literal_eval
+from typing import Callable, Iterator, TextIO, Tuple, Optional, Union
 from enum import Enum
 import inspect
 from jasmin import *
 
 # Абстрактный класс - узел AST-дерева
 # Все рализованные далее классы узлов являются потомками этого класса
+# Узлы хранят атрибуты в __slots__ (без __dict__), поэтому props может задавать только
+# объявленные в классе атрибуты. Кортеж потомков не хранится в узле: childs каждый раз
+# собирает его из полей узла, для каждого класса это свойство прямо над его _make_childs
 class AstNode(ABC):
+    __slots__ = ('row', 'line')
+
     def __init__(self, row: Optional[int] = None, line: Optional[int] = None, **props):
-        super().__init__()
         self.row = row
         self.line = line
-        for k, v in props.items():
-            setattr(self, k, v)
+        if props:
+            for k, v in props.items():
+                setattr(self, k, v)
 
-    @property
-    def childs(self) -> Tuple['AstNode', ...]:
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        if '_make_childs' in cls.__dict__:
+            cls.childs = property(cls._make_childs)
+
+    def _make_childs(self) -> Tuple['AstNode', ...]:
         return ()
 
+    childs = property(_make_childs)
+
     @abstractmethod
     def __str__(self) -> str:
         pass
 
     @property
     def tree(self) -> [str, ...]:
-        res = [str(self)]
-        childs_temp = self.childs
-        for i, child in enumerate(childs_temp):
-            ch0, ch = '├', '│'
-            if i == len(childs_temp) - 1:
-                ch0, ch = '└', ' '
-            res.extend(((ch0 if j == 0 else ch) + ' ' + s for j, s in enumerate(child.tree)))
-        return res
-
-    def visit(self, func: Callable[['AstNode'], None]) -> None:
-        func(self)
-        map(func, self.childs)
+        return list(render_tree(self))
+
+    # Применяет func ко всем узлам поддерева в прямом (по умолчанию) или обратном порядке
+    def visit(self, func: Callable[['AstNode'], None], postorder: bool = False) -> None:
+        for node in (iter_postorder(self) if postorder else iter_preorder(self)):
+            func(node)
+
+    def preorder(self) -> Iterator['AstNode']:
+        return iter_preorder(self)
+
+    def postorder(self) -> Iterator['AstNode']:
+        return iter_postorder(self)
 
     def __getitem__(self, index):
         return self.childs[index] if index < len(self.childs) else None
@@ -44,27 +56,74 @@ class AstNode(ABC):
         pass
 
 
+# Обходы дерева с явным стеком: глубина дерева не ограничена глубиной рекурсии
+def iter_preorder(root: AstNode) -> Iterator[AstNode]:
+    stack = [root]
+    while stack:
+        node = stack.pop()
+        yield node
+        stack.extend(reversed(node.childs))
+
+
+def iter_postorder(root: AstNode) -> Iterator[AstNode]:
+    stack = [(root, False)]
+    while stack:
+        node, expanded = stack.pop()
+        if expanded:
+            yield node
+        else:
+            stack.append((node, True))
+            stack.extend((child, False) for child in reversed(node.childs))
+
+
+# Ленивое построчное представление дерева: у каждого узла хранится только
+# готовый префикс его строки и префикс для строк потомков
+def render_tree(root: AstNode) -> Iterator[str]:
+    stack = [(root, '', '')]
+    while stack:
+        node, prefix, child_prefix = stack.pop()
+        yield prefix + str(node)
+        childs = node.childs
+        last = len(childs) - 1
+        for i in range(last, -1, -1):
+            if i == last:
+                stack.append((childs[i], child_prefix + '└ ', child_prefix + '  '))
+            else:
+                stack.append((childs[i], child_prefix + '├ ', child_prefix + '│ '))
+
+
+def write_tree(root: AstNode, stream: TextIO) -> None:
+    for line in render_tree(root):
+        stream.write(line)
+        stream.write('\n')
+
+
 class ExprNode(AstNode):
-    pass
+    __slots__ = ()
 
 # Узел содержащий значение переменной и ее типа
 class LiteralNode(ExprNode):
+    __slots__ = ('literal', 'value')
+
     def __init__(self, literal: str,
                  row: Optional[int] = None, line: Optional[int] = None, **props):
         super().__init__(row=row, line=line, **props)
         self.literal = literal
-        self.value = eval(literal)
+        try:
+            self.value = int(literal)
+        except ValueError:
+            self.value = literal_eval(literal)
 
     def __str__(self) -> str:
         return '{0} ({1})'.format(self.literal, type(self.value).__name__)
 
     def jbc(self, generator: CodeGenerator):
         #положить в стек
-        if self.literal is 'True':
+        if self.literal == 'True':
             generator.add('ldc 1')
-        elif self.literal is 'False':
+        elif self.literal == 'False':
             generator.add('ldc 0')
-        elif self.literal[0] is "'":
+        elif self.literal[0] == "'":
             #change '' to ""
             pass
         else:
@@ -73,6 +132,8 @@ class LiteralNode(ExprNode):
 
 # Узел содержащий название переменной
 class IdentNode(ExprNode):
+    __slots__ = ('name',)
+
     # k,j..
     def __init__(self, name: str, row: Optional[int] = None, line: Optional[int] = None, **props):
         super().__init__(row=row, line=line, **props)
@@ -86,14 +147,15 @@ class IdentNode(ExprNode):
 
 # Узел содержащий элементы массива
 class ArrayIdentNode(ExprNode):
+    __slots__ = ('name', 'literal')
+
     def __init__(self, name: IdentNode, literal: LiteralNode, row: Optional[int] = None, line: Optional[int] = None,
                  **props):
         super().__init__(row=row, line=line, **props)
         self.name = name
         self.literal = literal
 
-    # @property
-    # def childs(self) -> Tuple[IdentNode, LiteralNode]:
+    # def _make_childs(self) -> Tuple[IdentNode, LiteralNode]:
     #     return self.name, self.literal
 
     def __str__(self) -> str:
@@ -116,8 +178,38 @@ class BinOp(Enum):
     LOGICAL_AND = 'and'
     LOGICAL_OR = 'or'
 
+# Приоритеты бинарных операций: чем больше число, тем сильнее связывание.
+# Все операции левоассоциативны, кроме сравнений: a < b < c и a = b = c недопустимы
+BIN_OP_PRECEDENCE = {
+    BinOp.LOGICAL_OR: 1,
+    BinOp.LOGICAL_AND: 2,
+    BinOp.EQ: 3, BinOp.NE: 3,
+    BinOp.GE: 4, BinOp.LE: 4, BinOp.GT: 4, BinOp.LT: 4,
+    BinOp.ADD: 5, BinOp.SUB: 5,
+    BinOp.MUL: 6, BinOp.DIVISION: 6, BinOp.DIV: 6, BinOp.MOD: 6,
+}
+NON_ASSOCIATIVE_PRECEDENCES = frozenset((3, 4))
+
+# Переход по невыполненному условию: if_icmp<op> с a и b в стеке прыгает, когда a op b,
+# поэтому на else/endif/done переходит инструкция с противоположным сравнением
+NEGATED_JUMP = {
+    BinOp.EQ: 'if_icmpne', BinOp.NE: 'if_icmpeq',
+    BinOp.LT: 'if_icmpge', BinOp.GE: 'if_icmplt',
+    BinOp.GT: 'if_icmple', BinOp.LE: 'if_icmpgt',
+}
+
+
+def negated_jump(cond: 'ExprNode') -> str:
+    jump = NEGATED_JUMP.get(getattr(cond, 'op', None))
+    if jump is None:
+        raise Exception("Condition must be a comparison: '%s'" % cond)
+    return jump
+
+
 # Узел реализующий бинарную операцию
 class BinOpNode(ExprNode):
+    __slots__ = ('op', 'arg1', 'arg2')
+
     def __init__(self, op: BinOp, arg1: ExprNode, arg2: ExprNode,
                  row: Optional[int] = None, line: Optional[int] = None, **props):
         super().__init__(row=row, line=line, **props)
@@ -125,8 +217,7 @@ class BinOpNode(ExprNode):
         self.arg1 = arg1
         self.arg2 = arg2
 
-    @property
-    def childs(self) -> Tuple[ExprNode, ExprNode]:
+    def _make_childs(self) -> Tuple[ExprNode, ExprNode]:
         return self.arg1, self.arg2
 
     def __str__(self) -> str:
@@ -146,22 +237,23 @@ class BinOpNode(ExprNode):
         elif self.op is BinOp.LOGICAL_OR:
             generator.add('ior')
         elif self.op is BinOp.DIV:
+            generator.add('idiv')
+        elif self.op is BinOp.MOD:
             generator.add('irem')
-        elif self.op is BinOp.EQ or BinOp.NE or BinOp.GT or BinOp.GE or BinOp.LE or BinOp.LT:
-            generator.add('swap')
 
 
 class StmtNode(ExprNode):
-    pass
+    __slots__ = ()
 
 # Узел содержащий список переменных определенного типа
 class IdentListNode(StmtNode):
+    __slots__ = ('idents',)
+
     def __init__(self, *idents: Tuple[IdentNode, ...], row: Optional[int] = None, line: Optional[int] = None, **props):
         super().__init__(row=row, line=line, **props)
         self.idents = idents
 
-    @property
-    def childs(self) -> Tuple[ExprNode, ...]:
+    def _make_childs(self) -> Tuple[ExprNode, ...]:
         return self.idents
 
     def __str__(self) -> str:
@@ -170,6 +262,8 @@ class IdentListNode(StmtNode):
 
 # Узел содержащий тип переменной или списка переменных
 class TypeSpecNode(StmtNode):
+    __slots__ = ('name',)
+
     def __init__(self, name: str, row: Optional[int] = None, line: Optional[int] = None, **props):
         super(TypeSpecNode, self).__init__(row=row, line=line, **props)
         self.name = name
@@ -179,15 +273,16 @@ class TypeSpecNode(StmtNode):
 
 
 class VarDeclNode(StmtNode):
+    __slots__ = ('ident_list', 'vars_type')
+
     def __init__(self, ident_list: IdentListNode, vars_type: TypeSpecNode,  # *vars_list: Tuple[AstNode, ...],
                  row: Optional[int] = None, line: Optional[int] = None, **props):
         super().__init__(row=row, line=line, **props)
         self.ident_list = ident_list
         self.vars_type = vars_type
 
-    @property
-    def childs(self) -> Tuple[ExprNode, ...]:
-        return (self.ident_list,) + (self.vars_type,)
+    def _make_childs(self) -> Tuple[ExprNode, ...]:
+        return self.ident_list, self.vars_type
 
     def __str__(self) -> str:
         return 'var_dec'
@@ -198,6 +293,8 @@ class VarDeclNode(StmtNode):
 # to_ индекс последнего элемента массива
 # vars_type тип к которому относится массив
 class ArrayDeclNode(StmtNode):
+    __slots__ = ('name', 'from_', 'to_', 'vars_type')
+
     def __init__(self, name: Tuple[AstNode, ...],
                  from_: LiteralNode, to_: LiteralNode, vars_type: TypeSpecNode,
                  row: Optional[int] = None, line: Optional[int] = None, **props):
@@ -207,23 +304,23 @@ class ArrayDeclNode(StmtNode):
         self.to_ = to_
         self.vars_type = vars_type
 
-    @property
-    def childs(self) -> Tuple[ExprNode, ...]:
+    def _make_childs(self) -> Tuple[ExprNode, ...]:
         # return self.vars_type, (*self.vars_list)
-        return (self.vars_type,) + (self.name,) + (self.from_,) + (self.to_,)
+        return self.vars_type, self.name, self.from_, self.to_
 
     def __str__(self) -> str:
         return 'arr_decl'
 
 # Узел реализующий раздел описания переменных
 class VarsDeclNode(StmtNode):
+    __slots__ = ('var_decs',)
+
     def __init__(self, *var_decs: Tuple[VarDeclNode, ...],
                  row: Optional[int] = None, line: Optional[int] = None, **props):
         super().__init__(row=row, line=line, **props)
         self.var_decs = var_decs
 
-    @property
-    def childs(self) -> Tuple[ExprNode, ...]:
+    def _make_childs(self) -> Tuple[ExprNode, ...]:
         return self.var_decs
 
     def __str__(self) -> str:
@@ -231,14 +328,15 @@ class VarsDeclNode(StmtNode):
 
 # Узел реализующий вызов функций или процедур
 class CallNode(StmtNode):
+    __slots__ = ('func', 'params')
+
     def __init__(self, func: IdentNode, *params: Tuple[ExprNode],
                  row: Optional[int] = None, line: Optional[int] = None, **props):
         super().__init__(row=row, line=line, **props)
         self.func = func
         self.params = params
 
-    @property
-    def childs(self) -> Tuple[IdentNode, ...]:
+    def _make_childs(self) -> Tuple[IdentNode, ...]:
         # return self.func, (*self.params)
         return (self.func,) + self.params
 
@@ -251,6 +349,8 @@ class CallNode(StmtNode):
 
 # Узел реализующий операцию присваивания переменной var значения val
 class AssignNode(StmtNode):
+    __slots__ = ('var', 'val')
+
     def __init__(self, var,
                  val: ExprNode,
                  row: Optional[int] = None, line: Optional[int] = None, **props):
@@ -259,8 +359,7 @@ class AssignNode(StmtNode):
         self.val = val
 
     # def childs(self) -> Tuple[IdentNode, ExprNode]:
-    @property
-    def childs(self):
+    def _make_childs(self):
         return self.var, self.val
 
     def __str__(self) -> str:
@@ -272,6 +371,8 @@ class AssignNode(StmtNode):
 # then_stmt выражение выполняющееся при true в cond
 # else_stmt выражение выполняющееся при false в cond
 class IfNode(StmtNode):
+    __slots__ = ('cond', 'then_stmt', 'else_stmt')
+
     def __init__(self, cond: ExprNode, then_stmt: StmtNode, else_stmt: Optional[StmtNode] = None,
                  row: Optional[int] = None, line: Optional[int] = None, **props):
         super().__init__(row=row, line=line, **props)
@@ -279,31 +380,29 @@ class IfNode(StmtNode):
         self.then_stmt = then_stmt
         self.else_stmt = else_stmt
 
-    @property
-    def childs(self) -> Tuple[ExprNode, StmtNode, Optional[StmtNode]]:
+    def _make_childs(self) -> Tuple[ExprNode, StmtNode, Optional[StmtNode]]:
         return (self.cond, self.then_stmt) + ((self.else_stmt,) if self.else_stmt else tuple())
 
     def __str__(self) -> str:
         return 'if'
 
     def jbc(self, generator: CodeGenerator, index=None):
-        if self.else_stmt is None:
-            generator.add('if_icmp{}'.format(str(self.cond.op.name).lower()))
-        else:
-            generator.add('if_icmp{} else_{}'.format(str(self.cond.op.name).lower(), index))
+        target = 'endif' if self.else_stmt is None else 'else'
+        generator.add('{0} {1}_{2}'.format(negated_jump(self.cond), target, index))
 
 # Узел реализующий цикл while
 # cond логическое выражение внутри while
 # stmt_list операторы в теле цикла
 class WhileNode(StmtNode):
+    __slots__ = ('cond', 'stmt_list')
+
     def __init__(self, cond: ExprNode, stmt_list: StmtNode,
                  row: Optional[int] = None, line: Optional[int] = None, **props):
         super().__init__(row=row, line=line, **props)
         self.cond = cond
         self.stmt_list = stmt_list
 
-    @property
-    def childs(self) -> Tuple[ExprNode, StmtNode, Optional[StmtNode]]:
+    def _make_childs(self) -> Tuple[ExprNode, StmtNode, Optional[StmtNode]]:
         return (self.cond, self.stmt_list)
 
     def __str__(self) -> str:
@@ -311,14 +410,15 @@ class WhileNode(StmtNode):
 
 # в данный момент в разработке
 class RepeatNode(StmtNode):
+    __slots__ = ('stmt_list', 'cond')
+
     def __init__(self, stmt_list: StmtNode, cond: ExprNode,
                  row: Optional[int] = None, line: Optional[int] = None, **props):
         super().__init__(row=row, line=line, **props)
         self.stmt_list = stmt_list
         self.cond = cond
 
-    @property
-    def childs(self) -> Tuple[ExprNode, StmtNode, Optional[StmtNode]]:
+    def _make_childs(self) -> Tuple[ExprNode, StmtNode, Optional[StmtNode]]:
         return (self.stmt_list, self.cond)
 
     def __str__(self) -> str:
@@ -329,6 +429,8 @@ class RepeatNode(StmtNode):
 # to конечное значение
 # body оператор в теле цикла
 class ForNode(StmtNode):
+    __slots__ = ('init', 'to', 'body')
+
     def __init__(self, init: Union[StmtNode, None],
                  to,
                  body: Union[StmtNode, None],
@@ -338,8 +440,7 @@ class ForNode(StmtNode):
         self.to = to
         self.body = body if body else _empty
 
-    @property
-    def childs(self) -> Tuple[AstNode, ...]:
+    def _make_childs(self) -> Tuple[AstNode, ...]:
         return self.init, self.to, self.body
 
     def __str__(self) -> str:
@@ -347,13 +448,14 @@ class ForNode(StmtNode):
 
 # Узел содержащий список выражений
 class StmtListNode(StmtNode):
+    __slots__ = ('exprs',)
+
     def __init__(self, *exprs: StmtNode,
                  row: Optional[int] = None, line: Optional[int] = None, **props):
         super().__init__(row=row, line=line, **props)
         self.exprs = exprs
 
-    @property
-    def childs(self) -> Tuple[StmtNode, ...]:
+    def _make_childs(self) -> Tuple[StmtNode, ...]:
         return self.exprs
 
     def __str__(self) -> str:
@@ -361,13 +463,14 @@ class StmtListNode(StmtNode):
 
 # Узел являющийся телом (внутренности между begin и end) содержащий список выражений
 class BodyNode(ExprNode):
+    __slots__ = ('body',)
+
     def __init__(self, body: Tuple[StmtNode, ...],
                  row: Optional[int] = None, line: Optional[int] = None, **props):
         super().__init__(row=row, line=line, **props)
         self.body = body
 
-    @property
-    def childs(self) -> Tuple[AstNode, ...]:
+    def _make_childs(self) -> Tuple[AstNode, ...]:
         return (self.body,)
 
     def __str__(self) -> str:
@@ -376,15 +479,21 @@ class BodyNode(ExprNode):
 # Узел содержащий параметры функции, процедуры
 #TODO переделать, параметры считываются неправильно
 class ParamsNode(StmtNode):
+    __slots__ = ('vars_list',)
+
     def __init__(self, *vars_list: VarDeclNode,
                  row: Optional[int] = None, line: Optional[int] = None, **props):
         super().__init__(row=row, line=line, **props)
         self.vars_list = vars_list if vars_list else _empty
 
-    @property
-    def childs(self) -> Tuple[ExprNode, ...]:
+    def _make_childs(self) -> Tuple[ExprNode, ...]:
         return self.vars_list
 
+    # Объявления параметров; без параметров vars_list - пустой узел _empty, а не кортеж
+    @property
+    def decls(self) -> Tuple[VarDeclNode, ...]:
+        return self.vars_list if isinstance(self.vars_list, tuple) else ()
+
     def __str__(self) -> str:
         return 'params'
 
@@ -393,6 +502,8 @@ class ParamsNode(StmtNode):
 # vars_decl раздел описаний
 # stmt_list тело программы
 class ProgramNode(ExprNode):
+    __slots__ = ('prog_name', 'vars_decl', 'stmt_list')
+
     def __init__(self, prog_name: Tuple[AstNode, ...], vars_decl: Tuple[AstNode, ...],
                  stmt_list: Tuple[AstNode, ...],
                  row: Optional[int] = None, line: Optional[int] = None, **props):
@@ -401,9 +512,8 @@ class ProgramNode(ExprNode):
         self.vars_decl = vars_decl
         self.stmt_list = stmt_list
 
-    @property
-    def childs(self) -> Tuple[AstNode, ...]:
-        return (self.prog_name,) + (self.vars_decl,) + (self.stmt_list,)
+    def _make_childs(self) -> Tuple[AstNode, ...]:
+        return self.prog_name, self.vars_decl, self.stmt_list
 
     def __str__(self) -> str:
         return 'Program'
@@ -415,6 +525,8 @@ class ProgramNode(ExprNode):
 # Узел содержщий объявление процедуры
 # число параметров *args зависит от того, объявили мы процедуру с параметрами или без
 class ProcedureDeclNode(ExprNode):
+    __slots__ = ('proc_name', 'params', 'vars_decl', 'stmt_list')
+
     def __init__(self, *args, **props):
         super().__init__(row=_empty, line=_empty, **props)
         self.proc_name = args[0]
@@ -427,9 +539,8 @@ class ProcedureDeclNode(ExprNode):
             self.vars_decl = args[1]
             self.stmt_list = args[2]
 
-    @property
-    def childs(self) -> Tuple[AstNode, ...]:
-        return (self.proc_name,) + (self.params,) + (self.vars_decl,) + (self.stmt_list,)
+    def _make_childs(self) -> Tuple[AstNode, ...]:
+        return self.proc_name, self.params, self.vars_decl, self.stmt_list
 
 
     def __str__(self) -> str:
@@ -439,6 +550,8 @@ class ProcedureDeclNode(ExprNode):
 # Узел содержщий объявление функции
 # число параметров *args зависит от того, объявили мы функцию с параметрами или без
 class FunctionDeclNode(ExprNode):
+    __slots__ = ('proc_name', 'params', 'returning_type', 'vars_decl', 'stmt_list')
+
     def __init__(self,*args,**props):
         super().__init__(row=_empty, line=_empty, **props)
         self.proc_name = args[0]
@@ -453,9 +566,8 @@ class FunctionDeclNode(ExprNode):
             self.vars_decl = args[2]
             self.stmt_list = args[3]
 
-    @property
-    def childs(self) -> Tuple[AstNode, ...]:
-        return (self.proc_name,) + (self.params,) + (self.returning_type,) + (self.vars_decl,) + (self.stmt_list,)
+    def _make_childs(self) -> Tuple[AstNode, ...]:
+        return self.proc_name, self.params, self.returning_type, self.vars_decl, self.stmt_list
 
     def __str__(self) -> str:
         return 'function'
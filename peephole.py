@@ -0,0 +1,211 @@
+from collections import OrderedDict
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+# После этих инструкций управление не переходит на следующую строку
+_JUMP_OPS = frozenset(('goto', 'goto_w', 'return', 'ireturn', 'areturn', 'athrow'))
+_ICONST = {-1: 'iconst_m1', 0: 'iconst_0', 1: 'iconst_1', 2: 'iconst_2',
+           3: 'iconst_3', 4: 'iconst_4', 5: 'iconst_5'}
+
+
+def _is_label(line: str) -> bool:
+    return line.endswith(':')
+
+
+# Номер локальной переменной для iload/istore в обеих формах: 'iload 4' и 'iload_0'
+def _local_index(parts: List[str], op: str) -> Optional[int]:
+    if parts[0] == op and len(parts) == 2:
+        return int(parts[1])
+    if parts[0].startswith(op + '_') and len(parts) == 1:
+        return int(parts[0][len(op) + 1:])
+    return None
+
+
+# Целая константа, которую кладет в стек ldc/bipush/sipush/iconst_N, иначе None
+def _int_value(parts: List[str]) -> Optional[int]:
+    op = parts[0]
+    if op in ('ldc', 'bipush', 'sipush') and len(parts) == 2:
+        try:
+            return int(parts[1])
+        except ValueError:
+            return None
+    if op.startswith('iconst_'):
+        return -1 if op == 'iconst_m1' else int(op[7:])
+    return None
+
+
+def _int_push(value: int) -> str:
+    if value in _ICONST:
+        return _ICONST[value]
+    if -128 <= value <= 127:
+        return 'bipush {0}'.format(value)
+    if -32768 <= value <= 32767:
+        return 'sipush {0}'.format(value)
+    return 'ldc {0}'.format(value)
+
+
+# Каждое правило получает тело метода (строки без пробелов по краям и те же строки,
+# разбитые на слова) и возвращает новое тело и число срабатываний.
+# Порядок в RULES важен: iinc должен забрать istore раньше, чем store_load
+
+# Пустые строки, которые генератор добавляет для локальных переменных
+def _blank(lines: List[str], parts: List[List[str]]) -> Tuple[List[str], int]:
+    result = [line for line in lines if line]
+    return result, len(lines) - len(result)
+
+
+# Недостижимый код между goto/return и следующей меткой
+def _dead_code(lines: List[str], parts: List[List[str]]) -> Tuple[List[str], int]:
+    result, hits, dead = [], 0, False
+    for line, words in zip(lines, parts):
+        if _is_label(line):
+            dead = False
+        elif dead:
+            hits += 1
+            continue
+        result.append(line)
+        if words and words[0] in _JUMP_OPS:
+            dead = True
+    return result, hits
+
+
+# goto на метку, которая стоит сразу за ним
+def _goto_next(lines: List[str], parts: List[List[str]]) -> Tuple[List[str], int]:
+    result, hits = [], 0
+    for i, words in enumerate(parts):
+        if len(words) == 2 and words[0] == 'goto':
+            target = words[1] + ':'
+            j = i + 1
+            while j < len(lines) and _is_label(lines[j]) and lines[j] != target:
+                j += 1
+            if j < len(lines) and lines[j] == target:
+                hits += 1
+                continue
+        result.append(lines[i])
+    return result, hits
+
+
+# ldc с небольшим целым заменяется на iconst_N/bipush/sipush
+def _const(lines: List[str], parts: List[List[str]]) -> Tuple[List[str], int]:
+    result, hits = [], 0
+    for line, words in zip(lines, parts):
+        if words and words[0] == 'ldc':
+            value = _int_value(words)
+            if value is not None and -32768 <= value <= 32767:
+                result.append(_int_push(value))
+                hits += 1
+                continue
+        result.append(line)
+    return result, hits
+
+
+# Умножение на степень двойки: <2^k>; imul -> <k>; ishl (по модулю 2^32 это одно и то же)
+def _shift(lines: List[str], parts: List[List[str]]) -> Tuple[List[str], int]:
+    result, hits, i = [], 0, 0
+    while i < len(lines):
+        if i + 1 < len(lines) and parts[i] and parts[i + 1] == ['imul']:
+            value = _int_value(parts[i])
+            if value is not None and value > 1 and value & (value - 1) == 0:
+                result.append(_int_push(value.bit_length() - 1))
+                result.append('ishl')
+                hits += 1
+                i += 2
+                continue
+        result.append(lines[i])
+        i += 1
+    return result, hits
+
+
+# Запись и сразу чтение той же переменной: putstatic f; getstatic f -> dup; putstatic f,
+# istore n; iload n -> dup; istore n
+def _store_load(lines: List[str], parts: List[List[str]]) -> Tuple[List[str], int]:
+    result, hits, i = [], 0, 0
+    while i < len(lines):
+        if i + 1 < len(lines) and parts[i] and parts[i + 1]:
+            store, load = parts[i], parts[i + 1]
+            same_field = store[0] == 'putstatic' and load[0] == 'getstatic' and store[1:] == load[1:]
+            index = _local_index(store, 'istore')
+            same_local = index is not None and _local_index(load, 'iload') == index
+            if same_field or same_local:
+                result.append('dup')
+                result.append(lines[i])
+                hits += 1
+                i += 2
+                continue
+        result.append(lines[i])
+        i += 1
+    return result, hits
+
+
+# iload n; <const>; iadd/isub; istore n -> iinc n const (и const; iload n; iadd; istore n)
+def _iinc(lines: List[str], parts: List[List[str]]) -> Tuple[List[str], int]:
+    result, hits, i = [], 0, 0
+    while i < len(lines):
+        if i + 3 < len(lines) and all(parts[i:i + 4]):
+            first, second, op, store = parts[i:i + 4]
+            index = _local_index(store, 'istore')
+            value = None
+            if index is not None and op[0] in ('iadd', 'isub'):
+                if _local_index(first, 'iload') == index:
+                    value = _int_value(second)
+                elif op[0] == 'iadd' and _local_index(second, 'iload') == index:
+                    value = _int_value(first)
+            if value is not None and op[0] == 'isub':
+                value = -value
+            if value is not None and -128 <= value <= 127:
+                result.append('iinc {0} {1}'.format(index, value))
+                hits += 1
+                i += 4
+                continue
+        result.append(lines[i])
+        i += 1
+    return result, hits
+
+
+Rule = Callable[[List[str], List[List[str]]], Tuple[List[str], int]]
+
+RULES: Dict[str, Rule] = OrderedDict((
+    ('blank', _blank),
+    ('dead_code', _dead_code),
+    ('goto_next', _goto_next),
+    ('iinc', _iinc),
+    ('const', _const),
+    ('shift', _shift),
+    ('store_load', _store_load),
+))
+DEFAULT_RULES = tuple(RULES)
+
+
+# Оптимизатор Jasmin-кода "через глазок": применяет выбранные правила к телу
+# метода, пока они срабатывают. hits - сколько раз сработало каждое правило
+class PeepholeOptimizer:
+    def __init__(self, rules: Optional[Iterable[str]] = None):
+        self.rules = tuple(DEFAULT_RULES if rules is None else rules)
+        for name in self.rules:
+            if name not in RULES:
+                raise Exception('Unknown peephole rule {0!r}'.format(name))
+        self.hits: Dict[str, int] = OrderedDict((name, 0) for name in self.rules)
+
+    @property
+    def signature(self) -> str:
+        return ','.join(self.rules)
+
+    def optimize(self, lines: List[str]) -> List[str]:
+        lines = [line.strip() for chunk in lines for line in chunk.split('\n')]
+        changed = True
+        while changed:
+            changed = False
+            for name in self.rules:
+                lines, hits = RULES[name](lines, [line.split() for line in lines])
+                if hits:
+                    self.hits[name] += hits
+                    changed = True
+        return lines
+
+
+# Разбор значения --peephole: 'all', 'none' или список правил через запятую
+def parse_rules(value: str) -> Optional[Tuple[str, ...]]:
+    if value == 'none':
+        return None
+    if value == 'all':
+        return DEFAULT_RULES
+    return tuple(name.strip() for name in value.split(',') if name.strip())
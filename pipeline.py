@@ -0,0 +1,143 @@
+import asyncio
+import os
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import suppress
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+
+from batch import FileResult, _init_worker, collect_sources, compile_text, output_collisions, output_path_for
+from file_helper import *
+from frontend import DEFAULT_BACKEND
+
+_DONE = None
+
+
+# Счетчики одной стадии конвейера: обработано файлов и байт, время работы стадии
+# (сумма по ее задачам) и наибольшее число элементов в ее входной очереди
+class StageStats:
+    def __init__(self):
+        self.files = 0
+        self.bytes = 0
+        self.busy = 0.0
+        self.max_queue = 0
+
+    def add(self, size: int, seconds: float):
+        self.files += 1
+        self.bytes += size
+        self.busy += seconds
+
+    def summary(self, wall: float) -> Dict[str, float]:
+        return OrderedDict((('files', self.files), ('bytes', self.bytes), ('busy_s', round(self.busy, 4)),
+                            ('files_per_s', round(self.files / wall, 2) if wall else 0.0),
+                            ('max_queue', self.max_queue)))
+
+
+class PipelineStats:
+    def __init__(self):
+        self.stages = OrderedDict((('read', StageStats()), ('compile', StageStats()), ('write', StageStats())))
+        self.wall = 0.0
+
+    def summary(self) -> dict:
+        summary = OrderedDict((name, stage.summary(self.wall)) for name, stage in self.stages.items())
+        summary['wall_s'] = round(self.wall, 4)
+        return summary
+
+
+async def _put(queue: asyncio.Queue, item, stage: StageStats):
+    await queue.put(item)
+    stage.max_queue = max(stage.max_queue, queue.qsize())
+
+
+# Конвейер из трех стадий, связанных очередями ограниченной длины:
+# чтение файлов (пул потоков) -> разбор, анализ и генерация (пул процессов, jobs задач)
+# -> запись результатов (пул потоков). Пока компиляция занята, чтение и запись идут
+# параллельно с ней; если запись или компиляция не успевают, очереди заполняются и
+# предыдущая стадия ждет, поэтому в памяти не больше queue_size текстов на очередь
+async def run_pipeline(sources: List[str], outputs: List[str], jobs: int, queue_size: int,
+                       init_args: tuple, stats: PipelineStats) -> List[FileResult]:
+    loop = asyncio.get_running_loop()
+    read_stats, compile_stats, write_stats = stats.stages.values()
+    to_compile: asyncio.Queue = asyncio.Queue(queue_size)
+    to_write: asyncio.Queue = asyncio.Queue(queue_size)
+    results: Dict[int, FileResult] = {}
+    collisions = output_collisions(sources, outputs)
+
+    async def read(io_pool):
+        for index, (source_path, output_path) in enumerate(zip(sources, outputs)):
+            if index in collisions:
+                results[index] = FileResult(source_path, output_path, error=collisions[index])
+                continue
+            started = time.perf_counter()
+            try:
+                source = await loop.run_in_executor(io_pool, FileHelper.read_from_file, source_path)
+            except (OSError, UnicodeDecodeError) as e:
+                results[index] = FileResult(source_path, output_path, error='{0}: {1}'.format(type(e).__name__, e))
+                continue
+            read_stats.add(len(source), time.perf_counter() - started)
+            await _put(to_compile, (index, source_path, source, output_path), compile_stats)
+        for _ in range(jobs):
+            await to_compile.put(_DONE)
+
+    async def compile_(cpu_pool):
+        while True:
+            item = await to_compile.get()
+            if item is _DONE:
+                return
+            index, source_path, source, output_path = item
+            started = time.perf_counter()
+            result, output = await loop.run_in_executor(cpu_pool, compile_text, source_path, source, output_path)
+            compile_stats.add(len(source), time.perf_counter() - started)
+            await _put(to_write, (index, result, output), write_stats)
+
+    async def write(io_pool):
+        while True:
+            item = await to_write.get()
+            if item is _DONE:
+                return
+            index, result, output = item
+            started = time.perf_counter()
+            try:
+                await loop.run_in_executor(io_pool, _write_output, result.output_path, output)
+            except OSError as e:
+                result.error = '{0}: {1}'.format(type(e).__name__, e)
+            write_stats.add(len(output) if output is not None else 0, time.perf_counter() - started)
+            results[index] = result
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=2) as io_pool, \
+            ProcessPoolExecutor(max_workers=jobs, initializer=_init_worker, initargs=init_args) as cpu_pool:
+        writer = asyncio.ensure_future(write(io_pool))
+        await asyncio.gather(read(io_pool), *(compile_(cpu_pool) for _ in range(jobs)))
+        await to_write.put(_DONE)
+        await writer
+    stats.wall = time.perf_counter() - started
+    return [results[index] for index in range(len(sources))]
+
+
+# Запись результата; при ошибке компиляции (output is None) удаляется устаревший файл
+def _write_output(output_path: str, output: Union[bytes, str, None]):
+    if output is None:
+        with suppress(OSError):
+            os.remove(output_path)
+    elif isinstance(output, bytes):
+        with open(output_path, 'wb') as f:
+            f.write(output)
+    else:
+        FileHelper.write_to_file(output_path, output)
+
+
+# То же, что batch.compile_files, но через асинхронный конвейер; счетчики стадий - в stats
+def compile_files_async(paths: Iterable[str], output_dir: Optional[str] = None, jobs: Optional[int] = None,
+                        backend: str = DEFAULT_BACKEND, cache_dir: Optional[str] = None,
+                        emit: str = 'class', peephole: Optional[Tuple[str, ...]] = None,
+                        fold: bool = False, promote: bool = False, queue_size: Optional[int] = None,
+                        stats: Optional[PipelineStats] = None, profile: bool = False) -> List[FileResult]:
+    sources = collect_sources(paths)
+    outputs = [output_path_for(path, output_dir, emit) for path in sources]
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+    jobs = jobs or os.cpu_count() or 1
+    stats = stats if stats is not None else PipelineStats()
+    init_args = (backend, cache_dir, emit, peephole, fold, promote, profile)
+    return asyncio.run(run_pipeline(sources, outputs, jobs, queue_size or 2 * jobs, init_args, stats))
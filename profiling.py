@@ -0,0 +1,102 @@
+import json
+import time
+import tracemalloc
+from collections import Counter, OrderedDict
+from contextlib import contextmanager, nullcontext
+from typing import Dict, Iterable, List, Optional
+
+from jasmin import CodeGenerator, count_instructions
+from nodes import AstNode, iter_preorder
+
+
+# Профиль компиляции: время фаз (wall и CPU) и всего запуска, пик памяти по tracemalloc, число узлов AST
+# по классам nodes.py и число инструкций, выпущенных каждым CodeGenerator.
+# Профили отдельных файлов складываются через merge (фазы и счетчики суммируются,
+# пик памяти - максимум), результат выводится как JSON
+class CompileProfile:
+    def __init__(self):
+        self.runs = 0
+        # время запусков целиком; фазы не вложены друг в друга, их сумма не больше этого
+        self.wall = 0.0
+        self.cpu = 0.0
+        # фаза -> [вызовов, wall, cpu]
+        self.phases: Dict[str, List[float]] = OrderedDict()
+        self.peak_bytes = 0
+        self.nodes: Counter = Counter()
+        # инструкций по каждому генератору (для программы из кэша - по ее коду)
+        self.instructions: List[int] = []
+
+    @contextmanager
+    def phase(self, name: str):
+        wall, cpu = time.perf_counter(), time.process_time()
+        try:
+            yield
+        finally:
+            totals = self.phases.setdefault(name, [0, 0.0, 0.0])
+            totals[0] += 1
+            totals[1] += time.perf_counter() - wall
+            totals[2] += time.process_time() - cpu
+
+    # Один профилируемый запуск: пик памяти считается заново для каждого
+    @contextmanager
+    def run(self):
+        started = not tracemalloc.is_tracing()
+        if started:
+            tracemalloc.start()
+        else:
+            tracemalloc.reset_peak()
+        wall, cpu = time.perf_counter(), time.process_time()
+        try:
+            yield self
+        finally:
+            self.wall += time.perf_counter() - wall
+            self.cpu += time.process_time() - cpu
+            self.peak_bytes = max(self.peak_bytes, tracemalloc.get_traced_memory()[1])
+            self.runs += 1
+            if started:
+                tracemalloc.stop()
+
+    def count_nodes(self, root: AstNode) -> None:
+        self.nodes.update(type(node).__name__ for node in iter_preorder(root))
+
+    def count_generator(self, generator: CodeGenerator) -> None:
+        self.instructions.append(generator.instructions)
+
+    def count_code(self, code: Iterable[str]) -> None:
+        self.instructions.append(count_instructions(code))
+
+    def merge(self, other: 'CompileProfile') -> None:
+        self.runs += other.runs
+        self.wall += other.wall
+        self.cpu += other.cpu
+        for name, (calls, wall, cpu) in other.phases.items():
+            totals = self.phases.setdefault(name, [0, 0.0, 0.0])
+            totals[0] += calls
+            totals[1] += wall
+            totals[2] += cpu
+        self.peak_bytes = max(self.peak_bytes, other.peak_bytes)
+        self.nodes.update(other.nodes)
+        self.instructions.extend(other.instructions)
+
+    def summary(self) -> dict:
+        instructions = self.instructions
+        return OrderedDict((
+            ('runs', self.runs),
+            ('wall_s', round(self.wall, 6)),
+            ('cpu_s', round(self.cpu, 6)),
+            ('phases', OrderedDict((name, OrderedDict((('calls', calls), ('wall_s', round(wall, 6)),
+                                                       ('cpu_s', round(cpu, 6)))))
+                                   for name, (calls, wall, cpu) in self.phases.items())),
+            ('peak_alloc_bytes', self.peak_bytes),
+            ('nodes', OrderedDict(sorted(self.nodes.items()))),
+            ('instructions', OrderedDict((('generators', len(instructions)), ('total', sum(instructions)),
+                                          ('max', max(instructions, default=0))))),
+        ))
+
+    def to_json(self) -> str:
+        return json.dumps(self.summary(), indent=2)
+
+
+# Фаза профиля или пустой контекст, если профиль не ведется
+def phase(profile: Optional[CompileProfile], name: str):
+    return profile.phase(name) if profile is not None else nullcontext()
@@ -0,0 +1,51 @@
+import json
+import socket
+import struct
+from typing import Optional
+
+# Протокол сервера компиляции: по Unix-сокету передаются сообщения - JSON в UTF-8 с длиной
+# (4 байта, big-endian) перед ним. На одном соединении можно отправить несколько запросов,
+# ответ на каждый приходит до следующего.
+# Запросы: {"op": "compile", "source": текст, "emit": "class" | "jasmin", "source_file": имя .j},
+#          {"op": "stats"}, {"op": "shutdown"}.
+# Ответ на compile: {"ok": ..., "diagnostics": [...], "cached": ..., "jasmin": текст}
+# или {"class_name": ..., "class": байты класса в base64}
+DEFAULT_SOCKET = '.pascal_compiler.sock'
+MAX_MESSAGE_BYTES = 256 * 1024 * 1024
+_LENGTH = struct.Struct('>I')
+
+
+class ProtocolError(Exception):
+    pass
+
+
+def send_message(sock: socket.socket, message: dict) -> None:
+    data = json.dumps(message).encode('utf-8')
+    if len(data) > MAX_MESSAGE_BYTES:
+        raise ProtocolError('Message too large ({0} bytes)'.format(len(data)))
+    sock.sendall(_LENGTH.pack(len(data)) + data)
+
+
+def _recv_exact(sock: socket.socket, size: int) -> Optional[bytes]:
+    chunks = []
+    while size:
+        chunk = sock.recv(min(size, 1024 * 1024))
+        if not chunk:
+            return None
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b''.join(chunks)
+
+
+# Следующее сообщение или None, если соединение закрыто между сообщениями
+def recv_message(sock: socket.socket) -> Optional[dict]:
+    header = _recv_exact(sock, _LENGTH.size)
+    if header is None:
+        return None
+    size, = _LENGTH.unpack(header)
+    if size > MAX_MESSAGE_BYTES:
+        raise ProtocolError('Message too large ({0} bytes)'.format(size))
+    data = _recv_exact(sock, size)
+    if data is None:
+        raise ProtocolError('Connection closed in the middle of a message')
+    return json.loads(data.decode('utf-8'))
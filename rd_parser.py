@@ -0,0 +1,414 @@
+import gc
+from contextlib import contextmanager
+from typing import List, Optional
+
+import nodes
+from lexer import *
+from nodes import *
+
+# Ключевые слова, которые грамматика pyparsing сравнивает без учета регистра (pp.CaselessKeyword),
+# остальные (Program, if, then, while, ...) сравниваются с учетом регистра
+_CASELESS_KEYWORDS = frozenset(('begin', 'end', 'var', 'array', 'of', 'integer', 'char', 'boolean',
+                                'mod', 'div'))
+_TYPE_NAMES = ('integer', 'char', 'boolean')
+
+_ADD_OPS = frozenset(('+', '-'))
+# '!=' распознается грамматикой, но не имеет значения в BinOp
+_BIN_OP_TEXTS = frozenset([op.value for op in BinOp] + ['!='])
+
+
+# Состояние разбора одной программы: поток лексем и текущая позиция.
+# source - строка или буфер байтов (см. Lexer); лексемы читаются по мере разбора.
+# nodes - фабрика узлов: модуль nodes.py или, например, arena.ArenaNodeFactory
+class _ParseState:
+    def __init__(self, source: Source, nodes=nodes):
+        self.source = source
+        self.nodes = nodes
+        self.tokens = TokenStream(Lexer(source).iter_tokens())
+        self.pos = 0
+
+    def error(self, message: str, token: Optional[Token] = None):
+        token = token or self.tokens[self.pos]
+        found = token.text if token.kind != EOF else 'end of input'
+        return ParseError('{0}, found {1!r}'.format(message, found), token.start, self.source)
+
+    def peek(self, offset: int = 0) -> Token:
+        return self.tokens[self.pos + offset]
+
+    def next(self) -> Token:
+        token = self.tokens[self.pos]
+        if token.kind != EOF:
+            self.pos += 1
+        return token
+
+    @staticmethod
+    def is_kw(token: Token, word: str) -> bool:
+        if token.kind != 'IDENT':
+            return False
+        if word in _CASELESS_KEYWORDS:
+            return token.text.lower() == word
+        return token.text == word
+
+    @staticmethod
+    def is_op(token: Token, op: str) -> bool:
+        return token.kind == 'OP' and token.text == op
+
+    def expect_kw(self, word: str) -> Token:
+        if not self.is_kw(self.peek(), word):
+            raise self.error('Expected {0!r}'.format(word))
+        return self.next()
+
+    def expect_op(self, op: str) -> Token:
+        if not self.is_op(self.peek(), op):
+            raise self.error('Expected {0!r}'.format(op))
+        return self.next()
+
+    def accept_op(self, op: str) -> bool:
+        if self.is_op(self.peek(), op):
+            self.pos += 1
+            return True
+        return False
+
+    # program = 'Program' ident ';' [vars_decl] body '.'
+    def program(self) -> ProgramNode:
+        self.expect_kw('Program')
+        name = self.ident()
+        self.expect_op(';')
+        vars_decl = self.vars_decl() if self.is_kw(self.peek(), 'var') else self.nodes.VarsDeclNode()
+        body = self.body()
+        self.expect_op('.')
+        if self.peek().kind != EOF:
+            raise self.error('Expected end of input')
+        return self.nodes.ProgramNode(name, vars_decl, body)
+
+    def ident(self) -> IdentNode:
+        token = self.peek()
+        if token.kind != 'IDENT':
+            raise self.error('Expected identifier')
+        self.pos += 1
+        return self.nodes.IdentNode(token.text)
+
+    def literal(self) -> LiteralNode:
+        token = self.peek()
+        if token.kind in ('NUM', 'STR') or token.text in ('True', 'False'):
+            self.pos += 1
+            return self.nodes.LiteralNode(token.text)
+        if token.kind == 'OP' and token.text in _ADD_OPS:
+            # знак числа допустим только вплотную к цифрам, как в регулярном выражении num
+            number = self.peek(1)
+            if number.kind == 'NUM' and number.start == token.end:
+                self.pos += 2
+                return self.nodes.LiteralNode(token.text + number.text)
+        raise self.error('Expected literal')
+
+    def type_spec(self) -> TypeSpecNode:
+        token = self.peek()
+        for name in _TYPE_NAMES:
+            if self.is_kw(token, name):
+                self.pos += 1
+                return self.nodes.TypeSpecNode(name)
+        raise self.error('Expected type')
+
+    def ident_list(self) -> IdentListNode:
+        idents = [self.ident()]
+        while self.accept_op(','):
+            idents.append(self.ident())
+        return self.nodes.IdentListNode(*idents)
+
+    # var_decl = ident_list ':' type_spec
+    def var_decl(self) -> VarDeclNode:
+        ident_list = self.ident_list()
+        self.expect_op(':')
+        return self.nodes.VarDeclNode(ident_list, self.type_spec())
+
+    def _at_var_decl(self) -> bool:
+        token, following = self.peek(), self.peek(1)
+        return token.kind == 'IDENT' and (self.is_op(following, ':') or self.is_op(following, ','))
+
+    # vars_decl = 'var' { var_decl ';' | procedure_decl | function_decl | array_decl }
+    def vars_decl(self) -> VarsDeclNode:
+        self.expect_kw('var')
+        decls = []
+        while True:
+            token = self.peek()
+            if self._at_var_decl():
+                ident_list = self.ident_list()
+                self.expect_op(':')
+                if self.is_kw(self.peek(), 'array'):
+                    decls.append(self.array_decl(ident_list))
+                else:
+                    decls.append(self.nodes.VarDeclNode(ident_list, self.type_spec()))
+                    self.expect_op(';')
+            elif self.is_kw(token, 'procedure'):
+                decls.append(self.procedure_decl())
+            elif self.is_kw(token, 'function'):
+                decls.append(self.function_decl())
+            else:
+                return self.nodes.VarsDeclNode(*decls)
+
+    # array_decl = ident_list ':' 'array' '[' literal '..' literal ']' 'of' type_spec ';'
+    def array_decl(self, ident_list: IdentListNode) -> ArrayDeclNode:
+        self.expect_kw('array')
+        self.expect_op('[')
+        from_ = self.literal()
+        self.expect_op('..')
+        to_ = self.literal()
+        self.expect_op(']')
+        self.expect_kw('of')
+        vars_type = self.type_spec()
+        self.expect_op(';')
+        return self.nodes.ArrayDeclNode(ident_list, from_, to_, vars_type)
+
+    # params = '(' { var_decl } { ',' var_decl } ')'
+    def params(self) -> ParamsNode:
+        self.expect_op('(')
+        vars_list = []
+        while self.peek().kind == 'IDENT':
+            vars_list.append(self.var_decl())
+        while self.accept_op(','):
+            vars_list.append(self.var_decl())
+        self.expect_op(')')
+        return self.nodes.ParamsNode(*vars_list)
+
+    def procedure_decl(self) -> ProcedureDeclNode:
+        self.expect_kw('procedure')
+        name = self.ident()
+        params = self.params()
+        self.expect_op(';')
+        vars_decl = self.vars_decl()
+        body = self.body()
+        self.expect_op(';')
+        return self.nodes.ProcedureDeclNode(name, params, vars_decl, body)
+
+    def function_decl(self) -> FunctionDeclNode:
+        self.expect_kw('function')
+        name = self.ident()
+        params = self.params()
+        self.expect_op(':')
+        returning_type = self.type_spec()
+        self.expect_op(';')
+        vars_decl = self.vars_decl()
+        body = self.body()
+        self.expect_op(';')
+        return self.nodes.FunctionDeclNode(name, params, returning_type, vars_decl, body)
+
+    def body(self) -> BodyNode:
+        self.expect_kw('begin')
+        stmt_list = self.stmt_list()
+        self.expect_kw('end')
+        return self.nodes.BodyNode(stmt_list)
+
+    def _at_stmt(self) -> bool:
+        token = self.peek()
+        if token.kind != 'IDENT':
+            return False
+        if token.text in ('if', 'for', 'while', 'repeat') or self.is_kw(token, 'begin'):
+            return True
+        following = self.peek(1)
+        if token.text == 'until':
+            # 'until (cond)' завершает repeat, а не является вызовом процедуры until
+            return self.is_op(following, ':=') or self.is_op(following, '[')
+        return following.kind == 'OP' and following.text in (':=', '[', '(')
+
+    # stmt_list = { stmt { ';' } }
+    def stmt_list(self) -> StmtListNode:
+        stmts = []
+        while self._at_stmt():
+            stmts.append(self.stmt())
+            while self.accept_op(';'):
+                pass
+        return self.nodes.StmtListNode(*stmts)
+
+    def stmt(self) -> StmtNode:
+        token = self.peek()
+        if self.is_kw(token, 'if'):
+            return self.if_()
+        if self.is_kw(token, 'for'):
+            return self.for_()
+        if self.is_kw(token, 'while'):
+            return self.while_()
+        if self.is_kw(token, 'repeat'):
+            return self.repeat_()
+        if self.is_kw(token, 'begin'):
+            self.next()
+            stmt_list = self.stmt_list()
+            self.expect_kw('end')
+            self.expect_op(';')
+            return stmt_list
+        stmt = self.simple_stmt()
+        self.expect_op(';')
+        return stmt
+
+    # simple_stmt = assign | call
+    def simple_stmt(self) -> StmtNode:
+        if self.is_op(self.peek(1), '('):
+            return self.call()
+        return self.assign()
+
+    # assign = (array_ident | ident) ':=' expr
+    def assign(self) -> AssignNode:
+        var = self.ident()
+        if self.is_op(self.peek(), '['):
+            var = self.array_index(var)
+        self.expect_op(':=')
+        return self.nodes.AssignNode(var, self.expr())
+
+    def array_index(self, name: IdentNode) -> ArrayIdentNode:
+        self.expect_op('[')
+        literal = self.literal()
+        self.expect_op(']')
+        return self.nodes.ArrayIdentNode(name, literal)
+
+    # call = ident '(' [expr { ',' expr }] ')'
+    def call(self) -> CallNode:
+        func = self.ident()
+        self.expect_op('(')
+        params = []
+        if not self.is_op(self.peek(), ')'):
+            params.append(self.expr())
+            while self.accept_op(','):
+                params.append(self.expr())
+        self.expect_op(')')
+        return self.nodes.CallNode(func, *params)
+
+    # if_ = 'if' { '(' } expr { ')' } 'then' stmt ['else' stmt]
+    def if_(self) -> IfNode:
+        self.expect_kw('if')
+        while self.accept_op('('):
+            pass
+        cond = self.expr()
+        while self.accept_op(')'):
+            pass
+        self.expect_kw('then')
+        then_stmt = self.stmt()
+        if self.is_kw(self.peek(), 'else'):
+            self.next()
+            return self.nodes.IfNode(cond, then_stmt, self.stmt())
+        return self.nodes.IfNode(cond, then_stmt)
+
+    # while_ = 'while' '(' expr ')' 'do' stmt
+    def while_(self) -> WhileNode:
+        self.expect_kw('while')
+        self.expect_op('(')
+        cond = self.expr()
+        self.expect_op(')')
+        self.expect_kw('do')
+        return self.nodes.WhileNode(cond, self.stmt())
+
+    # repeat_ = 'repeat' stmt_list 'until' '(' expr ')'
+    def repeat_(self) -> RepeatNode:
+        self.expect_kw('repeat')
+        stmt_list = self.stmt_list()
+        self.expect_kw('until')
+        self.expect_op('(')
+        cond = self.expr()
+        self.expect_op(')')
+        return self.nodes.RepeatNode(stmt_list, cond)
+
+    # for_ = 'for' '(' assign 'to' literal ')' 'do' (stmt | ';')
+    def for_(self) -> ForNode:
+        self.expect_kw('for')
+        self.expect_op('(')
+        init = self.assign()
+        self.expect_kw('to')
+        to = self.literal()
+        self.expect_op(')')
+        self.expect_kw('do')
+        if self.accept_op(';'):
+            return self.nodes.ForNode(init, to, None)
+        return self.nodes.ForNode(init, to, self.stmt())
+
+    def _bin_op(self, token: Token) -> Optional[BinOp]:
+        if token.kind == 'OP':
+            text = token.text
+        elif token.kind == 'IDENT':
+            text = token.text.lower() if token.text.lower() in ('mod', 'div') else token.text
+        else:
+            return None
+        if text not in _BIN_OP_TEXTS:
+            return None
+        return BinOp(text)
+
+    # expr = group { bin_op_sign group } - precedence climbing по таблице BIN_OP_PRECEDENCE
+    def expr(self, min_prec: int = 0) -> ExprNode:
+        node = self.group()
+        while True:
+            token = self.peek()
+            op = self._bin_op(token)
+            if op is None:
+                return node
+            prec = BIN_OP_PRECEDENCE[op]
+            if prec < min_prec:
+                return node
+            self.pos += 1
+            node = self.nodes.BinOpNode(op, node, self.expr(prec + 1))
+            if prec in NON_ASSOCIATIVE_PRECEDENCES:
+                following = self._bin_op(self.peek())
+                if following is not None and BIN_OP_PRECEDENCE[following] == prec:
+                    raise self.error('Non-associative operator')
+
+    # group = literal | call | array_ident | ident | '(' expr ')'
+    def group(self) -> ExprNode:
+        token = self.peek()
+        if token.kind == 'IDENT' and token.text not in ('True', 'False'):
+            following = self.peek(1)
+            if self.is_op(following, '('):
+                return self.call()
+            name = self.ident()
+            if self.is_op(following, '['):
+                return self.array_index(name)
+            return name
+        if self.accept_op('('):
+            node = self.expr()
+            self.expect_op(')')
+            return node
+        return self.literal()
+
+
+# Рекурсивный спуск по лексемам - альтернатива грамматике pyparsing (PascalGrammar),
+# строящая то же AST-дерево из nodes.py
+class RecursiveDescentParser:
+    _instance = None
+
+    @classmethod
+    def instance(cls) -> 'RecursiveDescentParser':
+        if cls._instance is None:
+            cls._instance = cls()
+        return cls._instance
+
+    def parse(self, prog: Source) -> ProgramNode:
+        with _gc_paused():
+            return _ParseState(_source(prog)).program()
+
+    # Разбор сразу в столбцовое представление AstArena, без создания объектов узлов
+    def parse_arena(self, prog: Source):
+        from arena import ArenaNodeFactory
+        factory = ArenaNodeFactory()
+        with _gc_paused():
+            factory.arena.root = _ParseState(_source(prog), factory).program()
+        return factory.arena
+
+
+# Разбор не создает циклических ссылок, а сборщик мусора при каждой сборке старшего
+# поколения обходит все уже построенные узлы: на программе в 4 МБ это треть времени разбора.
+# На время разбора сборка отключается (если ее не отключили раньше)
+@contextmanager
+def _gc_paused():
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
+
+
+# Буфер байтов (bytes, mmap, ...) разбирается как есть, остальное приводится к строке
+def _source(prog) -> Source:
+    if isinstance(prog, str):
+        return prog
+    try:
+        memoryview(prog).release()
+    except TypeError:
+        return str(prog)
+    return prog
@@ -1,27 +1,116 @@
+import sys
+from types import GeneratorType
+from typing import Callable, Dict, FrozenSet, List, Tuple
 from nodes import *
 from grammar import *
 from symbols import *
 from jasmin import CodeGenerator
+from tracing import SymbolTracer
 
 
+# Обход AST с диспетчеризацией по имени класса узла: метод visit_<Класс>
+# находится один раз для пары (класс посетителя, класс узла) и кэшируется
+# в словаре _dispatch, своем для каждого подкласса NodeVisitor.
+# Метод visit_<Класс> может быть генератором: вместо self.visit(child) он
+# выполняет `result = yield child`, а visit исполняет такие методы на явном
+# стеке, поэтому глубина AST не ограничена глубиной рекурсии Python
 class NodeVisitor(object):
+    _dispatch: Dict[type, Callable] = {}
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls._dispatch = {}
+
     def visit(self, node):
-        method_name = 'visit_' + type(node).__name__
-        visitor = getattr(self, method_name, self.generic_visit)
-        return visitor(node)
+        dispatch = self._dispatch
+        try:
+            visitor = dispatch[node.__class__]
+        except KeyError:
+            visitor = self._resolve_visitor(node.__class__)
+        value = visitor(self, node)
+        if value.__class__ is not GeneratorType:
+            return value
+
+        stack = [value]
+        value = None
+        while stack:
+            try:
+                node = stack[-1].send(value)
+            except StopIteration as stop:
+                stack.pop()
+                value = stop.value
+                continue
+            try:
+                visitor = dispatch[node.__class__]
+            except KeyError:
+                visitor = self._resolve_visitor(node.__class__)
+            value = visitor(self, node)
+            if value.__class__ is GeneratorType:
+                stack.append(value)
+                value = None
+        return value
+
+    @classmethod
+    def _resolve_visitor(cls, node_class: type) -> Callable:
+        visitor = getattr(cls, 'visit_' + node_class.__name__, cls.generic_visit)
+        cls._dispatch[node_class] = visitor
+        return visitor
 
     def generic_visit(self, node):
         raise Exception('No visit_{} method'.format(type(node).__name__))
 
 
+# Загрузка/сохранение локальной переменной: для номеров 0..3 есть короткая форма iload_N.
+# char и boolean в JVM хранятся как int, поэтому для всех простых типов используется i
+def local_insn(op: str, index: int) -> str:
+    return '{0}_{1}'.format(op, index) if index <= 3 else '{0} {1}'.format(op, index)
+
+
+# Имена, которые встречаются в телах подпрограмм (кроме их параметров): такие
+# глобальные переменные нельзя переносить в локальные переменные main
+def routine_globals(program: ProgramNode) -> FrozenSet[str]:
+    names = set()
+    for decl in program.vars_decl.var_decs:
+        if isinstance(decl, (FunctionDeclNode, ProcedureDeclNode)):
+            names.update(routine_names(decl))
+    return frozenset(names)
+
+
+# Имена в теле одной подпрограммы, кроме ее параметров
+def routine_names(decl) -> FrozenSet[str]:
+    params = {ident.name for param in decl.params.decls for ident in param.ident_list.idents}
+    return frozenset(node.name for node in iter_preorder(decl.stmt_list)
+                     if isinstance(node, IdentNode) and node.name not in params)
+
+
+# Встроенные типы и функции: создаются один раз и разделяются всеми таблицами символов
+BUILTIN_SYMBOLS = (
+    BuiltinTypeSymbol('integer'),
+    BuiltinTypeSymbol('char'),
+    BuiltinTypeSymbol('boolean'),
+    BuiltinFunction('Read'),
+    BuiltinFunction('ReadLn'),
+    BuiltinFunction('Write'),
+    BuiltinFunction('WriteLn'),
+)
+BUILTINS_LEVEL = 0
+
+
+# Область видимости. Все области одной программы разделяют карту
+# имя -> стек привязок (уровень, символ): define кладет привязку на стек,
+# close снимает привязки области при выходе из нее, поэтому вершина стека -
+# ближайшее видимое определение и lookup не обходит цепочку enclosing_scope.
+# Встроенные символы лежат в карте один раз на уровне BUILTINS_LEVEL
 class ScopedSymbolTable(object):
     def __init__(self, scope_name, scope_level, enclosing_scope=None):
         self._symbols = {}
         self.scope_name = scope_name
         self.scope_level = scope_level
         self.enclosing_scope = enclosing_scope
-        self.init_builtins()
-        self.init_builtin_functions()
+        if enclosing_scope is None:
+            self._bindings = {symbol.name: [(BUILTINS_LEVEL, symbol)] for symbol in BUILTIN_SYMBOLS}
+        else:
+            self._bindings = enclosing_scope._bindings
         self.last_index = 0
 
     def __str__(self):
@@ -45,48 +134,75 @@ class ScopedSymbolTable(object):
         s = '\n'.join(lines)
         return s
 
-    def init_builtins(self):
-        self.define(BuiltinTypeSymbol('integer'))
-        self.define(BuiltinTypeSymbol('char'))
-        self.define(BuiltinTypeSymbol('boolean'))
-
-    def init_builtin_functions(self):
-        self.define(BuiltinFunction('Read'))
-        self.define(BuiltinFunction('ReadLn'))
-        self.define(BuiltinFunction('Write'))
-        self.define(BuiltinFunction('WriteLn'))
-
     def define(self, symbol: Symbol):
-        print('Define: %s' % symbol)
-        self._symbols[symbol.name] = symbol
+        name = sys.intern(symbol.name)
+        stack = self._bindings.setdefault(name, [])
+        if name in self._symbols:
+            stack[-1] = (self.scope_level, symbol)
+        else:
+            stack.append((self.scope_level, symbol))
+        self._symbols[name] = symbol
 
+    # Поиск выполняется в самой вложенной открытой области
     def lookup(self, name, current_scope_only=False) -> Symbol:
-        print('Lookup: %s' % name)
-        symbol = self._symbols.get(name)
-        if symbol is not None:
-            return symbol
-
         if current_scope_only:
-            return None
-
-        if self.enclosing_scope is not None:
-            return self.enclosing_scope.lookup(name)
+            return self._symbols.get(name)
+        stack = self._bindings.get(name)
+        if stack:
+            return stack[-1][1]
+        return None
 
     def get_level_scope(self, name) -> int:
-        cur_scope = self
-        while cur_scope is not None:
-            symbol = self._symbols.get(name)
-            if symbol is not None:
-                return cur_scope.scope_level
-            else:
-                cur_scope = cur_scope.enclosing_scope
+        stack = self._bindings.get(name)
+        if stack:
+            return stack[-1][0]
         return 0
 
+    # Выход из области: ее привязки снимаются с вершин стеков
+    def close(self):
+        bindings = self._bindings
+        for name in self._symbols:
+            stack = bindings[name]
+            stack.pop()
+            if not stack:
+                del bindings[name]
+
+
+# Таблица символов, сообщающая трассировщику об определениях и поисках.
+# Используется только при заданном трассировщике, поэтому обычная
+# ScopedSymbolTable не платит за трассировку ни одной проверкой
+class TracedScopedSymbolTable(ScopedSymbolTable):
+    def __init__(self, scope_name, scope_level, enclosing_scope=None, tracer: SymbolTracer = None):
+        self.tracer = tracer
+        self.scope_name = scope_name
+        self.scope_level = scope_level
+        tracer.enter_scope(self)
+        super().__init__(scope_name, scope_level, enclosing_scope)
 
+    def define(self, symbol: Symbol):
+        self.tracer.define(self, symbol)
+        super().define(symbol)
+
+    def lookup(self, name, current_scope_only=False) -> Symbol:
+        symbol = super().lookup(name, current_scope_only)
+        depth = 0 if symbol is None or current_scope_only else self.scope_level - self.get_level_scope(name)
+        self.tracer.lookup(self, name, depth, symbol is not None)
+        return symbol
+
+
+# С promote_globals простые глобальные переменные, которые не используются в подпрограммах,
+# становятся локальными переменными main, а остальные на время цикла while в main
+# без вызовов подпрограмм копируются в локальные и записываются обратно после цикла
 class SemanticAnalyzer(NodeVisitor):
-    def __init__(self, generator: CodeGenerator):
+    def __init__(self, generator: CodeGenerator, tracer: SymbolTracer = None, promote_globals: bool = False):
         self.generator = generator
-        self.arrays_init = ''
+        self.tracer = tracer
+        self.promote_globals = promote_globals
+        self.shared_globals: FrozenSet[str] = frozenset()
+        self.promoted: List[VarSymbol] = []
+        # следующий свободный номер локальной переменной main (0 - аргументы)
+        self.main_locals = 1
+        self.arrays_init: List[str] = []
         self.assemblerDict = {'integer':'I', 'char':'C','boolean':'Z'}
         self.dictionary = {'int':'integer', 'str':'char','bool':'boolean'}
         self.BinOpArgTypes = {
@@ -98,8 +214,8 @@ class SemanticAnalyzer(NodeVisitor):
             'MOD':['integer'],
             'GE':['integer','char'],
             'LE':['integer','char'],
-            'NEQUALS':['integer','char','boolean'],
-            'EQUALS':['integer','char','boolean'],
+            'NE':['integer','char','boolean'],
+            'EQ':['integer','char','boolean'],
             'GT':['integer','char'],
             'LT': ['integer', 'char'],
             'LOGICAL_AND':['boolean'],
@@ -114,14 +230,76 @@ class SemanticAnalyzer(NodeVisitor):
             'MOD': ['integer'],
             'GE': ['boolean'],
             'LE': ['boolean'],
-            'NEQUALS': ['boolean'],
-            'EQUALS': ['boolean'],
+            'NE': ['boolean'],
+            'EQ': ['boolean'],
             'GT': ['boolean'],
             'LT': ['boolean'],
             'LOGICAL_AND': ['boolean'],
             'LOGICAL_OR': ['boolean']}
         self.current_scope = None
 
+    def _new_scope(self, scope_name, scope_level, enclosing_scope) -> ScopedSymbolTable:
+        if self.tracer is None:
+            return ScopedSymbolTable(scope_name, scope_level, enclosing_scope)
+        return TracedScopedSymbolTable(scope_name, scope_level, enclosing_scope, self.tracer)
+
+    def _shared_globals(self, node: ProgramNode) -> FrozenSet[str]:
+        return routine_globals(node)
+
+    def _leave_scope(self, scope: ScopedSymbolTable):
+        if self.tracer is not None:
+            self.tracer.leave_scope(scope)
+        scope.close()
+
+    def _load(self, symbol: VarSymbol) -> str:
+        if symbol.is_field:
+            return 'getstatic {0}/{1} {2}'.format(self.global_scope.scope_name, symbol.name,
+                                                  self.assemblerDict[symbol.type.name])
+        return local_insn('iload', symbol.index)
+
+    def _store(self, symbol: VarSymbol) -> str:
+        if symbol.is_field:
+            return 'putstatic {0}/{1} {2}'.format(self.global_scope.scope_name, symbol.name,
+                                                  self.assemblerDict[symbol.type.name])
+        return local_insn('istore', symbol.index)
+
+    # Глобальные переменные цикла while в main переносятся в локальные, если в цикле
+    # нет вызовов подпрограмм (иначе подпрограмма могла бы прочитать устаревшее поле).
+    # Возвращает [(символ, его прежний index, было ли присваивание в цикле)]
+    def _cache_loop_globals(self, node: WhileNode) -> List[Tuple[VarSymbol, int, bool]]:
+        if not self.promote_globals or self.current_scope is not self.global_scope:
+            return []
+        names, assigned = [], set()
+        for child in iter_preorder(node):
+            if isinstance(child, CallNode):
+                if not isinstance(self.current_scope.lookup(child.func.name), BuiltinFunction):
+                    return []
+                if child.func.name in ('Read', 'ReadLn'):
+                    assigned.update(p.name for p in child.params if isinstance(p, IdentNode))
+            elif isinstance(child, AssignNode) and isinstance(child.var, IdentNode):
+                assigned.add(child.var.name)
+            elif isinstance(child, IdentNode) and child.name not in names:
+                names.append(child.name)
+        cached = []
+        for name in names:
+            symbol = self.current_scope.lookup(name)
+            if type(symbol) is VarSymbol and symbol.is_field:
+                self.generator.add(self._load(symbol))
+                cached.append((symbol, symbol.index, name in assigned))
+                symbol.is_field, symbol.index = False, self.main_locals
+                self.main_locals += 1
+                self.generator.add(self._store(symbol))
+        return cached
+
+    def _write_back_loop_globals(self, cached: List[Tuple[VarSymbol, int, bool]]):
+        for symbol, index, assigned in cached:
+            load = self._load(symbol)
+            symbol.is_field, symbol.index = True, index
+            self.main_locals -= 1
+            if assigned:
+                self.generator.add(load)
+                self.generator.add(self._store(symbol))
+
     #convert type name to a correct format
     def __changeType(self,type) -> str:
         for key in self.dictionary:
@@ -155,32 +333,30 @@ class SemanticAnalyzer(NodeVisitor):
 
 
     def visit_BinOpNode(self, node: BinOpNode):
-        type_arg1 = self.visit(node.arg1)
-        type_arg2 = self.visit(node.arg2)
+        type_arg1 = yield node.arg1
+        type_arg2 = yield node.arg2
         node.jbc(self.generator)
 
-        if (not isinstance(node.arg1, BinOpNode)) or not (isinstance(node.arg2, BinOpNode)):
-            if type_arg1 is not None and not self.__typeChecker(type_arg1, type_arg2):
-                raise Exception("Incompatible types in line: ")
-            type_arg1 = self.__changeType(type_arg1)
-            type_arg2 = self.__changeType(type_arg2)
-            if not self.__isBinaryArgsValid(node.op.name, type_arg1):
-                raise Exception(
-                    "Operation {op} not supported for types {t1} and {t2}"
-                        .format(op=node.op.name, t1=type_arg1, t2=type_arg2))
-            return self.__BinaryReturningType(node.op.name, type_arg1)
+        # тип None - неизвестен (например, результат встроенной функции), такой операнд не проверяется
+        if type_arg1 is not None and not self.__typeChecker(type_arg1, type_arg2):
+            raise Exception("Incompatible types in line: ")
+        type_arg1 = self.__changeType(type_arg1 if type_arg1 is not None else type_arg2)
+        type_arg2 = self.__changeType(type_arg2)
+        if type_arg1 is None:
+            return self.__BinaryReturningType(node.op.name, None)
+        if not self.__isBinaryArgsValid(node.op.name, type_arg1):
+            raise Exception(
+                "Operation {op} not supported for types {t1} and {t2}"
+                    .format(op=node.op.name, t1=type_arg1, t2=type_arg2))
+        return self.__BinaryReturningType(node.op.name, type_arg1)
 
     def visit_IdentNode(self, node: IdentNode):
         var_name = node.name
         var_symbol = self.current_scope.lookup(var_name)
-
-        if var_symbol.is_field:
-            self.generator.add('getstatic {0}/{1} {2}'.format(self.global_scope.scope_name, var_name, self.assemblerDict[var_symbol.type.name]))
-        else:
-            self.generator.add('{0}load_{1}'.format(self.assemblerDict[var_symbol.type.name].lower(), var_symbol.index))
-
         if var_symbol is None:
             raise Exception("Symbol(identifier) not found '%s'" % var_name)
+
+        self.generator.add(self._load(var_symbol))
         return var_symbol.type.name
 
     def visit_LiteralNode(self, node: LiteralNode):
@@ -188,29 +364,33 @@ class SemanticAnalyzer(NodeVisitor):
         return type(node.value).__name__
 
     def visit_ProgramNode(self, node: ProgramNode):
-        print('ENTER scope: global')
-        self.global_scope = ScopedSymbolTable(
+        self.global_scope = self._new_scope(
             scope_name=node.prog_name,
             scope_level=1,
             enclosing_scope=self.current_scope
         )
         self.current_scope = self.global_scope
         node.jbc(self.generator)
-        self.visit(node.vars_decl)
-        self.generator.add('''.method                  public static main([Ljava/lang/String;)V
-.limit stack          100
-.limit locals         100''')
-        self.generator.add(self.arrays_init)
-        self.visit(node.stmt_list)
-        print(self.current_scope)
+        if self.promote_globals:
+            self.shared_globals = self._shared_globals(node)
+        yield node.vars_decl
+        self.generator.begin_method('.method public static main([Ljava/lang/String;)V')
+        for line in self.arrays_init:
+            self.generator.add(line)
+        # поля инициализируются нулем, перенесенные в main переменные - явно
+        for symbol in self.promoted:
+            self.generator.add('ldc 0')
+            self.generator.add(self._store(symbol))
+        self.generator.add('')
+        yield node.stmt_list
+        self._leave_scope(self.current_scope)
         self.current_scope = self.current_scope.enclosing_scope
-        self.generator.add('''   return
-.end method''')
-        print('LEAVE scope: global')
+        self.generator.add('return')
+        self.generator.end_method()
 
     def visit_VarsDeclNode(self, node: VarsDeclNode):
         for var_decl in node.var_decs:
-            self.visit(var_decl)
+            yield var_decl
 
     def visit_VarDeclNode(self, node: VarDeclNode):
         type_symbol = self.current_scope.lookup(node.vars_type.name)
@@ -225,7 +405,11 @@ class SemanticAnalyzer(NodeVisitor):
                 )
             self.current_scope.define(var_symbol)
             definition_level = self.current_scope.get_level_scope(var_name)
-            if definition_level == 1:
+            if definition_level == 1 and self.promote_globals and var_name not in self.shared_globals:
+                var_symbol.index = self.main_locals
+                self.main_locals += 1
+                self.promoted.append(var_symbol)
+            elif definition_level == 1:
                 var_symbol.is_field = True
                 self.generator.add('.field public static {0} {1}'.format(var_name, self.assemblerDict[type_symbol.name]))
             else:
@@ -248,9 +432,9 @@ class SemanticAnalyzer(NodeVisitor):
             if definition_level == 1:
                 arr_symb.is_field = True
                 self.generator.add('.field public static {0} [{1}'.format(arr_name, self.assemblerDict[arr_symb.type.name]))
-                self.arrays_init += 'ldc {0}\n'.format(to_)
-                self.arrays_init += 'newarray int\n'
-                self.arrays_init += 'putstatic {0}/{1} [{2}\n'.format(self.global_scope.scope_name, arr_name, self.assemblerDict[arr_symb.type.name])
+                self.arrays_init.append('ldc {0}'.format(int(to_) + 1))
+                self.arrays_init.append('newarray int')
+                self.arrays_init.append('putstatic {0}/{1} [{2}'.format(self.global_scope.scope_name, arr_name, self.assemblerDict[arr_symb.type.name]))
             else:
                 self.generator.add('')
 
@@ -262,7 +446,7 @@ class SemanticAnalyzer(NodeVisitor):
         definition_level = self.current_scope.get_level_scope(arr_name)
         if definition_level == 1:
             self.generator.add('getstatic {0}/{1} [{2}'.format(self.global_scope.scope_name, arr_name, self.assemblerDict[arr_symbol.type.name]))
-            self.visit(node.literal)
+            yield node.literal
             self.generator.add('{0}aload'.format(self.assemblerDict[arr_symbol.type.name].lower()))
 
         if(liter < int(arr_symbol.from_) or liter > int(arr_symbol.to_)):
@@ -270,11 +454,11 @@ class SemanticAnalyzer(NodeVisitor):
         return arr_symbol.type.name
 
     def visit_BodyNode(self, node: BodyNode):
-        self.visit(node.body)
+        yield node.body
 
     def visit_StmtListNode(self, node: StmtListNode):
         for stmt in node.exprs:
-            self.visit(stmt)
+            yield stmt
 
     def visit_AssignNode(self, node: AssignNode):
         var = node.var
@@ -289,7 +473,7 @@ class SemanticAnalyzer(NodeVisitor):
             var_symbol = self.current_scope.lookup(var_name)
             self.generator.add('getstatic {0}/{1} [{2}'.format(self.global_scope.scope_name, var.name,
                                                                self.assemblerDict[var_symbol.type.name]))
-            self.visit(var.literal)
+            yield var.literal
         else:
             var_name = var.name
             var_symbol = self.current_scope.lookup(var_name)
@@ -297,13 +481,11 @@ class SemanticAnalyzer(NodeVisitor):
             raise Exception(
                 "Undefined variable '%s' found" % var_name
             )
-        type_visited = self.visit(val)
+        type_visited = yield val
         if isinstance(var, ArrayIdentNode):
             self.generator.add('{0}astore'.format(self.assemblerDict[var_symbol.type.name].lower()))
-        elif var_symbol.is_field:
-            self.generator.add('putstatic {0}/{1} {2}'.format(self.global_scope.scope_name, var_name, self.assemblerDict[var_symbol.type.name]))
         else:
-            self.generator.add('{0}store_{1}'.format(self.assemblerDict[var_symbol.type.name].lower(), var_symbol.index))
+            self.generator.add(self._store(var_symbol))
 
         if type_var is None:
             type_var = var_symbol.type.name
@@ -312,84 +494,62 @@ class SemanticAnalyzer(NodeVisitor):
                 "Wrong type '%s' found" % var_name
             )
 
-    def visit_ProcedureDeclNode(self, node: ProcedureDeclNode):
-        proc_name = node.proc_name.name
-        proc_symbol = ProcedureSymbol(proc_name)
-        self.current_scope.define(proc_symbol)
-
-        print('ENTER scope: %s' % proc_name)
-        procedure_scope = ScopedSymbolTable(
-            scope_name=proc_name,
+    # Объявление подпрограммы: символ в текущей области и новая область с параметрами
+    def _enter_routine(self, node, routine_symbol) -> ScopedSymbolTable:
+        self.current_scope.define(routine_symbol)
+        routine_scope = self._new_scope(
+            scope_name=routine_symbol.name,
             scope_level=self.current_scope.scope_level + 1,
             enclosing_scope=self.current_scope
         )
-
-        self.current_scope = procedure_scope
-        for param in node.params.vars_list:
+        self.current_scope = routine_scope
+        for param in node.params.decls:
             param_type = self.current_scope.lookup(param.vars_type.name)
             for param_name in param.ident_list.idents:
                 var_symbol = VarSymbol(param_name.name, param_type, index=self.current_scope.last_index)
                 self.current_scope.last_index += 1
                 self.current_scope.define(var_symbol)
-                proc_symbol.params.append(var_symbol)
+                routine_symbol.params.append(var_symbol)
+        return routine_scope
 
+    def _leave_routine(self, routine_scope: ScopedSymbolTable):
+        self._leave_scope(routine_scope)
+        self.current_scope = self.current_scope.enclosing_scope
+
+    # Метод подпрограммы: заголовок, тело и возврат; функция возвращает переменную,
+    # которой присваивает ее последний оператор
+    def _routine_method(self, node, routine_symbol, routine_scope: ScopedSymbolTable):
         params_sign = ''
-        for p in proc_symbol.params:
+        for p in routine_symbol.params:
             params_sign += self.assemblerDict[p.type.name]
-        self.generator.add('.method public static {0}({1}){2}'.format(proc_name, params_sign, 'V'))
-        self.generator.add('''.limit stack 100
-        .limit locals 100''')
+        returning = self.assemblerDict[routine_symbol.type] if isinstance(routine_symbol, FunctionSymbol) else 'V'
+        self.generator.begin_method('.method public static {0}({1}){2}'.format(routine_symbol.name, params_sign,
+                                                                              returning))
 
         for stmt in node.stmt_list.body.exprs:
-            self.visit(stmt)
+            yield stmt
 
-        self.generator.add('return')
-        self.generator.add('.end method')
-        print(procedure_scope)
-        self.current_scope = self.current_scope.enclosing_scope
-        print('LEAVE scope: %s' % proc_name)
-
-    def visit_FunctionDeclNode(self, node: FunctionDeclNode):
-        func_name = node.proc_name.name
-        func_type = node.returning_type.name
-        func_symbol = FunctionSymbol(func_name)
-        func_symbol.type = func_type
-        self.current_scope.define(func_symbol)
-
-        print('ENTER scope: %s' % func_name)
-        procedure_scope = ScopedSymbolTable(
-            scope_name=func_name,
-            scope_level=self.current_scope.scope_level + 1,
-            enclosing_scope=self.current_scope
-        )
-
-        self.current_scope = procedure_scope
-        for param in node.params.vars_list:
-            param_type = self.current_scope.lookup(param.vars_type.name)
-            for param_name in param.ident_list.idents:
-                var_symbol = VarSymbol(param_name.name, param_type, index=self.current_scope.last_index)
-                self.current_scope.last_index += 1
-                self.current_scope.define(var_symbol)
-                func_symbol.params.append(var_symbol)
+        if isinstance(routine_symbol, FunctionSymbol):
+            last_var = node.stmt_list.body.exprs[len(node.stmt_list.body.exprs)-1].var.name
+            returning_var = self.current_scope.lookup(last_var)
+            self.generator.add(self._load(returning_var))
+            self.generator.add('{0}return'.format(returning.lower()))
+        else:
+            self.generator.add('return')
+        self.generator.end_method(routine_scope.last_index)
 
-        params_sign = ''
-        for p in func_symbol.params:
-            params_sign += self.assemblerDict[p.type.name]
-        self.generator.add('.method public static {0}({1}){2}'.format(func_name, params_sign,
-                                                                      self.assemblerDict[node.returning_type.name]))
-        self.generator.add('''.limit stack 100
-.limit locals 100''')
+    def visit_ProcedureDeclNode(self, node: ProcedureDeclNode):
+        proc_symbol = ProcedureSymbol(node.proc_name.name)
+        procedure_scope = self._enter_routine(node, proc_symbol)
+        yield from self._routine_method(node, proc_symbol, procedure_scope)
+        self._leave_routine(procedure_scope)
 
-        for stmt in node.stmt_list.body.exprs:
-            self.visit(stmt)
-        last_var = node.stmt_list.body.exprs[len(node.stmt_list.body.exprs)-1].var.name
-        returning_var = self.current_scope.lookup(last_var)
-        self.generator.add('{0}load_{1}'.format(self.assemblerDict[returning_var.type.name].lower(), returning_var.index))
-        self.generator.add('{0}return'.format(self.assemblerDict[node.returning_type.name].lower()))
-        self.generator.add('.end method')
-        print(procedure_scope)
-        self.current_scope = self.current_scope.enclosing_scope
-        print('LEAVE scope: %s' % func_name)
+    def visit_FunctionDeclNode(self, node: FunctionDeclNode):
+        func_symbol = FunctionSymbol(node.proc_name.name)
+        func_symbol.type = node.returning_type.name
+        procedure_scope = self._enter_routine(node, func_symbol)
+        yield from self._routine_method(node, func_symbol, procedure_scope)
+        self._leave_routine(procedure_scope)
 
     def visit_CallNode(self, node: CallNode):
         func_name = node.func.name
@@ -407,7 +567,7 @@ class SemanticAnalyzer(NodeVisitor):
         if func_name == 'WriteLn' or func_name == 'Write':
             self.generator.add('getstatic             java/lang/System/out Ljava/io/PrintStream;')
         for param in node.params:
-            self.visit(param)
+            yield param
 
         if func_name == 'WriteLn' or func_name == 'Write':
             arguments = ''
@@ -420,65 +580,88 @@ class SemanticAnalyzer(NodeVisitor):
         elif func_name == 'ReadLn' or func_name == 'Read':
             self.generator.add('getstatic java/lang/System/in Ljava/io/InputStream;')
             arguments = ''
-            store_instuctions = ''
+            store_instuctions = []
             for p in node.params:
                 symb = self.current_scope.lookup(p.name)
                 arguments += self.assemblerDict[symb.type.name]
-                if symb.is_field:
-                    store_instuctions += 'putstatic {0}/{1} {2}'.format(self.global_scope.scope_name, symb.name,
-                                                                      self.assemblerDict[symb.type.name])
-                else:
-                    store_instuctions += '{0}store_{1}'.format(
-                        self.assemblerDict[self.current_scope.lookup(p.name).type.name].lower(),
-                        self.current_scope.lookup(p.name).index)
+                store_instuctions.append(self._store(symb))
             self.generator.add('invokevirtual java/io/InputStream/read(){0}'.format(arguments))
-            self.generator.add(store_instuctions)
+            self.generator.add('\n'.join(store_instuctions))
         else:
             params_sign = ''
             for p in func_symbol.params:
                 params_sign += self.assemblerDict[p.type.name]
-            self.generator.add('invokestatic {0}/{1}({2}){3}'.format(self.global_scope.scope_name, func_name, params_sign,self.assemblerDict[func_symbol.type]))
+            returning = self.assemblerDict[func_symbol.type] if isinstance(func_symbol, FunctionSymbol) else 'V'
+            self.generator.add('invokestatic {0}/{1}({2}){3}'.format(self.global_scope.scope_name, func_name, params_sign, returning))
         return func_symbol.type
 
     def visit_IfNode(self, node: IfNode):
-        type_cond = self.visit(node.cond)
+        type_cond = yield node.cond
         if_index = self.generator.last_index
+        self.generator.last_index += 1
         node.jbc(self.generator, index=if_index)
         if (type_cond != 'boolean'):
             raise Exception(
                 "Wrong type of if condition '%s' " % type_cond
             )
-        self.visit(node.then_stmt)
+        yield node.then_stmt
         self.generator.add('goto endif_{}'.format(if_index))
 
-        self.generator.last_index += 1
         if node.else_stmt:
             self.generator.add('else_{}:'.format(if_index))
-            self.visit(node.else_stmt)
+            yield node.else_stmt
         self.generator.add('endif_{}:'.format(if_index))
 
 
     def visit_WhileNode(self, node: WhileNode):
+        cached = self._cache_loop_globals(node)
         while_index = self.generator.last_index
         self.generator.last_index += 1
         self.generator.add('while_{}:'.format(while_index))
-        type_cond = self.visit(node.cond)
-        self.generator.add('if_icmp{0} done_{1}'.format(str(node.cond.op.name).lower(), while_index))
+        type_cond = yield node.cond
+        self.generator.add('{0} done_{1}'.format(negated_jump(node.cond), while_index))
         if type_cond != 'boolean':
             raise Exception(
                 "Wrong type of while condition '%s' " % type_cond
             )
-        self.visit(node.stmt_list)
+        yield node.stmt_list
         self.generator.add('goto while_{}'.format(while_index))
         self.generator.add('done_{}:'.format(while_index))
+        self._write_back_loop_globals(cached)
+
+    def visit_RepeatNode(self, node: RepeatNode):
+        repeat_index = self.generator.last_index
+        self.generator.last_index += 1
+        self.generator.add('repeat_{}:'.format(repeat_index))
+        yield node.stmt_list
+        type_cond = yield node.cond
+        if type_cond != 'boolean':
+            raise Exception(
+                "Wrong type of repeat condition '%s' " % type_cond
+            )
+        self.generator.add('{0} repeat_{1}'.format(negated_jump(node.cond), repeat_index))
 
-    #TODO check type of node.init
+    # for (v := a to b): после присваивания v сравнивается с b перед каждой итерацией,
+    # после тела увеличивается на 1
     def visit_ForNode(self, node: ForNode):
         for_index = self.generator.last_index
-        type_init = self.visit(node.init)
-        type_to = self.visit(node.to)
+        self.generator.last_index += 1
+        if not isinstance(node.init.var, IdentNode):
+            raise Exception("For loop variable must be a simple variable")
+        yield node.init
+        var_symbol = self.current_scope.lookup(node.init.var.name)
+        self.generator.add('for_{}:'.format(for_index))
+        self.generator.add(self._load(var_symbol))
+        type_to = yield node.to
         if (type_to != 'int'):
             raise Exception(
                 "Wrong type of for condition '%s'" % type_to
             )
-        self.visit(node.body)
+        self.generator.add('if_icmpgt for_done_{}'.format(for_index))
+        yield node.body
+        self.generator.add(self._load(var_symbol))
+        self.generator.add('ldc 1')
+        self.generator.add('iadd')
+        self.generator.add(self._store(var_symbol))
+        self.generator.add('goto for_{}'.format(for_index))
+        self.generator.add('for_done_{}:'.format(for_index))
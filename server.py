@@ -0,0 +1,206 @@
+import base64
+import os
+import socket
+import socketserver
+import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import suppress
+from typing import Dict, Optional, Tuple
+
+from classfile import assemble
+from compile_cache import CompileCache
+from compiler import *
+from folding import ConstantFolder
+from peephole import PeepholeOptimizer
+from protocol import *
+
+# Состояние процесса-исполнителя сервера: парсер (грамматика) и кэш создаются один раз
+# в _init_worker и живут, пока работает сервер
+_worker_backend = DEFAULT_BACKEND
+_worker_cache: Optional[CompileCache] = None
+_worker_peephole: Optional[Tuple[str, ...]] = None
+_worker_fold = False
+_worker_promote = False
+
+
+def _init_worker(backend: str, cache_dir: Optional[str], peephole: Optional[Tuple[str, ...]] = None,
+                 fold: bool = False, promote: bool = False) -> None:
+    global _worker_backend, _worker_cache, _worker_peephole, _worker_fold, _worker_promote
+    _worker_backend = backend
+    _worker_cache = CompileCache(cache_dir) if cache_dir else None
+    _worker_peephole = peephole
+    _worker_fold = fold
+    _worker_promote = promote
+    get_parser(backend)
+
+
+# Компиляция одного запроса в процессе-исполнителе; ошибка компиляции - это ответ
+# с ok = False и текстом ошибки в diagnostics, а не исключение
+def _compile_request(source: str, emit: str, source_file: Optional[str]) -> dict:
+    optimizer = PeepholeOptimizer(_worker_peephole) if _worker_peephole is not None else None
+    folder = ConstantFolder() if _worker_fold else None
+    try:
+        result = compile_source(source, backend=_worker_backend, cache=_worker_cache,
+                                optimizer=optimizer, folder=folder, promote_globals=_worker_promote)
+        response = {'ok': True, 'diagnostics': [], 'cached': result.cached}
+        if emit == 'class':
+            class_name, class_bytes = assemble(result.code, source_file)
+            response['class_name'] = class_name
+            response['class'] = base64.b64encode(class_bytes).decode('ascii')
+        else:
+            response['jasmin'] = '\n'.join(result.code)
+    except Exception as e:
+        return {'ok': False, 'diagnostics': ['{0}: {1}'.format(type(e).__name__, e)], 'cached': False}
+    return response
+
+
+# Время обработки последних запросов (от получения до готового ответа) и перцентили по ним
+class LatencyStats:
+    def __init__(self, window: int = 10000):
+        self.latencies = deque(maxlen=window)
+        self.requests = 0
+        self.errors = 0
+        self._lock = threading.Lock()
+
+    def add(self, seconds: float, ok: bool) -> None:
+        with self._lock:
+            self.latencies.append(seconds)
+            self.requests += 1
+            if not ok:
+                self.errors += 1
+
+    # Перцентиль по рангу: наименьшее значение, не меньше которого p% измерений
+    @staticmethod
+    def percentile(values, p: float) -> float:
+        if not values:
+            return 0.0
+        rank = max(0, min(len(values) - 1, int(len(values) * p / 100.0 + 0.999999) - 1))
+        return values[rank]
+
+    def summary(self) -> Dict[str, object]:
+        with self._lock:
+            values = sorted(self.latencies)
+            requests, errors = self.requests, self.errors
+        latency = {'p{0}'.format(p): round(self.percentile(values, p) * 1000, 3) for p in (50, 90, 99)}
+        latency['max'] = round(values[-1] * 1000, 3) if values else 0.0
+        return {'requests': requests, 'errors': errors, 'window': len(values), 'latency_ms': latency}
+
+
+class _RequestHandler(socketserver.BaseRequestHandler):
+    def handle(self):
+        server = self.server
+        while True:
+            try:
+                message = recv_message(self.request)
+            except (ProtocolError, ValueError, OSError):
+                return
+            if message is None:
+                return
+            started = time.perf_counter()
+            response = server.dispatch(message)
+            if isinstance(message, dict) and message.get('op') == 'compile':
+                server.stats.add(time.perf_counter() - started, response.get('ok', False))
+            try:
+                send_message(self.request, response)
+            except OSError:
+                return
+
+
+# Сервер компиляции: принимает запросы по Unix-сокету (протокол - protocol.py),
+# каждое соединение обслуживается своим потоком, компиляция выполняется пулом
+# процессов, в которых грамматика, таблица встроенных символов и кэш уже загружены.
+# Параметры компиляции общие для всех запросов и задаются при запуске
+class CompileServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, socket_path: str = DEFAULT_SOCKET, jobs: Optional[int] = None,
+                 backend: str = DEFAULT_BACKEND, cache_dir: Optional[str] = None,
+                 peephole: Optional[Tuple[str, ...]] = None, fold: bool = False, promote: bool = False):
+        self.socket_path = socket_path
+        self.jobs = jobs or os.cpu_count() or 1
+        self.stats = LatencyStats()
+        self.started = time.time()
+        _remove_stale_socket(socket_path)
+        super().__init__(socket_path, _RequestHandler)
+        self._worker_args = (backend, cache_dir, peephole, fold, promote)
+        self._executor_lock = threading.Lock()
+        self.executor = self._start_executor()
+
+    def _start_executor(self) -> ProcessPoolExecutor:
+        executor = ProcessPoolExecutor(max_workers=self.jobs, initializer=_init_worker,
+                                       initargs=self._worker_args)
+        # процессы запускаются и прогреваются сразу, а не на первом запросе
+        for future in [executor.submit(_compile_request, '', 'jasmin', None) for _ in range(self.jobs)]:
+            future.result()
+        return executor
+
+    # Пул, в котором умер процесс-исполнитель, больше не принимает задачи: его заменяет
+    # новый. Потоки, заметившие поломку одновременно, пересоздают пул один раз
+    def _restart_executor(self, broken: ProcessPoolExecutor) -> None:
+        with self._executor_lock:
+            if self.executor is not broken:
+                return
+            broken.shutdown(wait=False)
+            self.executor = self._start_executor()
+
+    def _compile(self, source: str, emit: str, source_file: Optional[str]) -> dict:
+        executor = self.executor
+        try:
+            return executor.submit(_compile_request, source, emit, source_file).result()
+        except BrokenProcessPool as e:
+            self._restart_executor(executor)
+            return {'ok': False, 'diagnostics': ['Compile worker died: {0}'.format(e)], 'cached': False}
+
+    def dispatch(self, message: dict) -> dict:
+        if not isinstance(message, dict):
+            return {'ok': False, 'diagnostics': ['Request must be a JSON object']}
+        op = message.get('op')
+        if op == 'compile':
+            emit = message.get('emit', 'class')
+            if emit not in ('class', 'jasmin') or not isinstance(message.get('source'), str):
+                return {'ok': False, 'diagnostics': ['Bad compile request'], 'cached': False}
+            return self._compile(message['source'], emit, message.get('source_file'))
+        if op == 'stats':
+            summary = self.stats.summary()
+            summary.update(ok=True, workers=self.jobs, uptime_s=round(time.time() - self.started, 3))
+            return summary
+        if op == 'shutdown':
+            threading.Thread(target=self.shutdown, daemon=True).start()
+            return {'ok': True}
+        return {'ok': False, 'diagnostics': ['Unknown op {0!r}'.format(op)]}
+
+    def server_close(self):
+        super().server_close()
+        self.executor.shutdown(wait=True)
+        with suppress(OSError):
+            os.remove(self.socket_path)
+
+
+# Файл сокета от завершившегося сервера удаляется; если сервер еще отвечает - ошибка
+def _remove_stale_socket(socket_path: str) -> None:
+    if not os.path.exists(socket_path):
+        return
+    probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        probe.connect(socket_path)
+    except OSError:
+        os.remove(socket_path)
+        return
+    finally:
+        probe.close()
+    raise Exception('Compile server is already running on {0}'.format(socket_path))
+
+
+def serve(socket_path: str = DEFAULT_SOCKET, **options) -> None:
+    server = CompileServer(socket_path, **options)
+    print('Listening on {0} with {1} workers'.format(socket_path, server.jobs), file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
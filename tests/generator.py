@@ -0,0 +1,93 @@
+import random
+from typing import Optional
+
+# Генератор случайных программ на Pascal для дифференциальных тестов и бенчмарков.
+# Программы используют только поддерживаемое подмножество языка: переменные integer,
+# массив d, функцию Alpha и процедуру P. С вероятностью broken программа портится
+# (цепочка сравнений, пропущенная ';' и т. п.) - такие должны отвергать оба парсера
+VARS = ('g', 'b', 'x', 'y', 'i')
+ARITH_OPS = ('+', '-', '*', ' mod ', ' div ')
+COMPARISONS = ('>', '<', '>=', '<=', '=')
+
+PROGRAM = '''Program p{0};
+var g, b: integer; x, y, i: integer;
+    d: array [1 .. 100] of integer;
+function Alpha(a: integer, c: integer): integer;
+var q: integer;
+begin
+a:=a*10+c;
+end;
+procedure P();
+var z: integer;
+begin
+{1}
+end;
+BEGIN // comment
+{2}
+/* block */ END.'''
+
+BREAKAGES = (
+    lambda text: text.replace(':=', ':', 1),
+    lambda text: text.replace(';', '', 1),
+    lambda text: text.replace('BEGIN', 'BEGIN if (g>1>2) then g:=1;', 1),
+    lambda text: text.replace('END.', 'END', 1),
+    lambda text: text.replace('until (', 'until ((', 1),
+)
+
+
+class ProgramGenerator:
+    def __init__(self, seed: Optional[int] = None, max_depth: int = 3):
+        self.random = random.Random(seed)
+        self.max_depth = max_depth
+
+    def operand(self, depth: int) -> str:
+        choice = self.random.random()
+        if depth >= self.max_depth or choice < 0.35:
+            return self.random.choice(VARS)
+        if choice < 0.5:
+            return str(self.random.choice((0, 1, 2, 7, 45, 100)))
+        if choice < 0.6:
+            return 'd[{0}]'.format(self.random.randint(1, 9))
+        if choice < 0.7:
+            return 'Alpha({0}, {1})'.format(self.expr(depth + 1), self.expr(depth + 1))
+        if choice < 0.8:
+            return '({0})'.format(self.expr(depth + 1))
+        return self.expr(depth + 1)
+
+    def expr(self, depth: int = 0) -> str:
+        if depth >= self.max_depth or self.random.random() < 0.4:
+            return self.operand(depth)
+        return self.operand(depth + 1) + self.random.choice(ARITH_OPS) + self.operand(depth + 1)
+
+    # Условие начинается с переменной: скобки сразу после 'if (' грамматика съедает сама
+    def cond(self) -> str:
+        return self.random.choice(VARS) + self.random.choice(COMPARISONS) + self.expr(1)
+
+    def stmt(self, depth: int = 0) -> str:
+        choice = self.random.random()
+        if depth >= self.max_depth or choice < 0.4:
+            target = self.random.choice(VARS + ('d[{0}]'.format(self.random.randint(1, 9)),))
+            return '{0}:={1};'.format(target, self.expr())
+        if choice < 0.5:
+            return 'WriteLn({0});'.format(self.expr())
+        if choice < 0.6:
+            if self.random.random() < 0.5:
+                return 'if ({0}) then {1} else {2}'.format(self.cond(), self.stmt(depth + 1), self.stmt(depth + 1))
+            return 'if ({0}) then {1}'.format(self.cond(), self.stmt(depth + 1))
+        if choice < 0.7:
+            return 'while ({0}) do {1}'.format(self.cond(), self.stmt(depth + 1))
+        if choice < 0.8:
+            body = ' '.join(self.stmt(depth + 1) for _ in range(self.random.randint(1, 3)))
+            end = self.random.choice(('', ';'))
+            return 'repeat {0} until ({1}){2}'.format(body, self.cond(), end)
+        if choice < 0.9:
+            return 'for (i:=1 to {0}) do {1}'.format(self.random.randint(1, 10), self.stmt(depth + 1))
+        body = ' '.join(self.stmt(depth + 1) for _ in range(self.random.randint(0, 3)))
+        return 'begin {0} end;'.format(body)
+
+    def program(self, statements: int = 8, broken: float = 0.0) -> str:
+        text = PROGRAM.format(self.random.randint(0, 99), self.stmt(1),
+                              '\n'.join(self.stmt() for _ in range(self.random.randint(1, statements))))
+        if self.random.random() < broken:
+            text = self.random.choice(BREAKAGES)(text)
+        return text
@@ -0,0 +1,79 @@
+import glob
+import os
+
+import pytest
+
+from arena import AstArena
+from compiler import compile_source
+from conftest import ROOT
+from frontend import get_parser
+from generator import ProgramGenerator
+from jasmin import CodeGenerator
+from nodes import LiteralNode
+from rd_parser import RecursiveDescentParser
+from semantic import SemanticAnalyzer
+
+# Дерево в арене (построенное парсером 'rd' сразу в арену или переложенное из обычного
+# дерева) должно давать тот же Jasmin-код, что и обычный разбор
+SAMPLES = sorted(glob.glob(os.path.join(ROOT, 'resources', 'input_program*.txt')))
+
+
+def generate(root) -> list:
+    generator = CodeGenerator()
+    SemanticAnalyzer(generator).visit(root)
+    return generator.code
+
+
+# Код программы или текст ошибки анализатора
+def compile_arena(root):
+    try:
+        return generate(root)
+    except Exception as e:
+        return '{0}: {1}'.format(type(e).__name__, e)
+
+
+def compile_plain(source: str):
+    try:
+        return compile_source(source, backend='rd').code
+    except Exception as e:
+        return '{0}: {1}'.format(type(e).__name__, e)
+
+
+def check_same_code(source: str):
+    expected = compile_plain(source)
+    arena = RecursiveDescentParser.instance().parse_arena(source)
+    assert compile_arena(arena.root_node) == expected, source
+    converted = AstArena.from_ast(get_parser('rd').parse(source))
+    assert len(converted) == len(arena)
+    assert compile_arena(converted.root_node) == expected, source
+
+
+@pytest.mark.parametrize('path', SAMPLES, ids=os.path.basename)
+def test_samples(path):
+    with open(path) as f:
+        check_same_code(f.read())
+
+
+def test_generated_programs():
+    generator = ProgramGenerator(seed=4)
+    checked = 0
+    while checked < 60:
+        source = generator.program()
+        try:
+            get_parser('rd').parse(source)
+        except Exception:
+            continue
+        check_same_code(source)
+        checked += 1
+
+
+def test_counts():
+    with open(SAMPLES[-1]) as f:
+        source = f.read()
+    arena = RecursiveDescentParser.instance().parse_arena(source)
+    literals = [node for node in get_parser('rd').parse(source).preorder() if isinstance(node, LiteralNode)]
+    assert arena.count(LiteralNode) == len(literals)
+    counts = {}
+    for node in literals:
+        counts[type(node.value).__name__] = counts.get(type(node.value).__name__, 0) + 1
+    assert arena.literal_type_counts() == counts
@@ -0,0 +1,109 @@
+import gc
+import glob
+import os
+
+import pytest
+
+from compiler import compile_source
+from conftest import ROOT
+from folding import ConstantFolder
+from frontend import get_parser
+from generator import ProgramGenerator
+from nodes import AstNode
+from peephole import PeepholeOptimizer
+
+# Дифференциальные тесты: парсеры 'pyparsing' и 'rd' должны принимать одни и те же
+# программы, строить одинаковые AST и давать одинаковый код
+SAMPLES = sorted(glob.glob(os.path.join(ROOT, 'resources', 'input_program*.txt')))
+GENERATED = 150
+
+
+def node_fields(node: AstNode) -> dict:
+    fields = {}
+    for cls in type(node).__mro__:
+        for name in getattr(cls, '__slots__', ()):
+            if name not in ('row', 'line') and hasattr(node, name):
+                fields[name] = getattr(node, name)
+    return fields
+
+
+def assert_same_ast(a, b, path='program'):
+    assert type(a) is type(b), path
+    if isinstance(a, AstNode):
+        fields_a, fields_b = node_fields(a), node_fields(b)
+        assert fields_a.keys() == fields_b.keys(), path
+        for name in fields_a:
+            assert_same_ast(fields_a[name], fields_b[name], '{0}.{1}'.format(path, name))
+    elif isinstance(a, (tuple, list)):
+        assert len(a) == len(b), path
+        for i, (x, y) in enumerate(zip(a, b)):
+            assert_same_ast(x, y, '{0}[{1}]'.format(path, i))
+    else:
+        assert a == b, path
+
+
+def parse(backend: str, source: str):
+    try:
+        return get_parser(backend).parse(source)
+    except Exception:
+        return None
+
+
+# Код программы или текст ошибки анализатора
+def compile_output(source: str, backend: str):
+    try:
+        return compile_source(source, backend=backend, optimizer=PeepholeOptimizer(),
+                              folder=ConstantFolder(), promote_globals=True).code
+    except Exception as e:
+        return '{0}: {1}'.format(type(e).__name__, e)
+
+
+def check_backends_agree(source: str):
+    ast = parse('pyparsing', source)
+    rd_ast = parse('rd', source)
+    assert (ast is None) == (rd_ast is None), source
+    if ast is not None:
+        assert_same_ast(ast, rd_ast)
+        assert compile_output(source, 'pyparsing') == compile_output(source, 'rd'), source
+
+
+@pytest.mark.parametrize('path', SAMPLES, ids=os.path.basename)
+def test_samples(path):
+    with open(path) as f:
+        check_backends_agree(f.read())
+
+
+def test_generated_programs():
+    generator = ProgramGenerator(seed=2)
+    for _ in range(GENERATED):
+        check_backends_agree(generator.program(broken=0.1))
+
+
+def test_repeat_until_followed_by_semicolon():
+    source = '''Program r;
+var g: integer;
+BEGIN
+g:=1;
+repeat
+g:=g*2;
+until (g>300);
+Write(g);
+END.'''
+    assert parse('pyparsing', source) is not None
+    check_backends_agree(source)
+
+
+def test_until_call_is_not_a_statement():
+    check_backends_agree('Program r; var g: integer; BEGIN until(g); END.')
+
+
+def test_rd_parse_restores_gc_state():
+    enabled = gc.isenabled()
+    try:
+        for state in (True, False):
+            (gc.enable if state else gc.disable)()
+            assert parse('rd', 'Program p; begin x := ; end.') is None
+            assert parse('rd', 'Program p; begin x := 1; end.') is not None
+            assert gc.isenabled() is state
+    finally:
+        (gc.enable if enabled else gc.disable)()
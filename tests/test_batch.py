@@ -0,0 +1,48 @@
+import os
+import shutil
+
+from batch import class_name_of, compile_files
+from conftest import ROOT
+from pipeline import compile_files_async
+
+SAMPLE = os.path.join(ROOT, 'resources', 'input_program_3.txt')
+
+
+def make_sources(tmp_path):
+    for name in ('a', 'b'):
+        (tmp_path / name).mkdir()
+        shutil.copy(SAMPLE, str(tmp_path / name / 'p.pas'))
+    return [str(tmp_path / 'a'), str(tmp_path / 'b')]
+
+
+def test_same_output_path_is_reported(tmp_path):
+    results = compile_files(make_sources(tmp_path), output_dir=str(tmp_path / 'out'), jobs=1,
+                            backend='rd', emit='jasmin')
+    assert results[0].ok
+    assert not results[1].ok and 'collides with the output of' in results[1].error
+    assert results[1].source_path.endswith(os.path.join('b', 'p.pas'))
+
+
+def test_pipeline_reports_same_output_path(tmp_path):
+    results = compile_files_async(make_sources(tmp_path), output_dir=str(tmp_path / 'out'), jobs=1,
+                                  backend='rd', emit='jasmin')
+    assert [r.ok for r in results] == [True, False]
+
+
+def test_class_file_is_named_after_the_class(tmp_path):
+    results = compile_files([SAMPLE], output_dir=str(tmp_path), jobs=1, backend='rd')
+    assert results[0].ok
+    assert os.listdir(str(tmp_path)) == ['pr3.class']
+    assert results[0].output_path == str(tmp_path / 'pr3.class')
+
+
+def test_jasmin_file_is_named_after_the_source(tmp_path):
+    compile_files([SAMPLE], output_dir=str(tmp_path), jobs=1, backend='rd', emit='jasmin')
+    assert os.listdir(str(tmp_path)) == ['input_program_3.j']
+
+
+def test_class_name_of():
+    assert class_name_of('// header\nProgram pr3; BEGIN END.') == 'pr3'
+    assert class_name_of(b'Program pr3;') == 'pr3'
+    assert class_name_of('program pr3;') is None
+    assert class_name_of('') is None
@@ -0,0 +1,79 @@
+import io
+import os
+
+import pytest
+
+from classfile import LOCAL_OPCODES, OP_IINC, OP_WIDE, ClassFileError, assemble
+from compiler import compile_source
+from conftest import ROOT
+from interpreter import run_source
+from peephole import PeepholeOptimizer
+
+# resources/pr1-pr3.class собраны jasmin.jar из этих листингов; класс, записанный
+# classfile.py, должен совпадать с ними побайтно
+REFERENCES = [
+    (os.path.join(ROOT, 'tests', 'data', 'pr1.j'), 'pr1'),
+    (os.path.join(ROOT, 'tests', 'data', 'pr2.j'), 'pr2'),
+    (os.path.join(ROOT, 'resources', 'jasmin_res.j'), 'pr3'),
+]
+
+
+@pytest.mark.parametrize('listing, class_name', REFERENCES, ids=[name for _, name in REFERENCES])
+def test_matches_jasmin_jar(listing, class_name):
+    with open(listing) as f:
+        code = f.read().split('\n')
+    with open(os.path.join(ROOT, 'resources', class_name + '.class'), 'rb') as f:
+        expected = f.read()
+    assert assemble(code, 'jasmin_res.j') == (class_name, expected)
+
+
+# Больше 255 глобальных переменных: promote_globals отдает main слоты выше 255,
+# их iload/istore/iinc пишутся с префиксом wide
+def many_globals_program(count: int) -> str:
+    names = ['v{0}'.format(i) for i in range(count)]
+    lines = ['Program big;', 'var {0}: integer;'.format(', '.join(names)), 'BEGIN']
+    lines += ['{0}:={1};'.format(name, i) for i, name in enumerate(names)]
+    lines += ['{0}:={0}+{1};'.format(names[i], names[i - 1]) for i in range(1, count)]
+    lines += ['for ({0}:=1 to 3) do {1}:={1}+1;'.format(names[-1], names[-2]),
+              'Write({0});'.format(names[-2]), 'END.']
+    return '\n'.join(lines)
+
+
+def test_wide_locals_for_many_globals():
+    source = many_globals_program(300)
+    code = compile_source(source, backend='rd', optimizer=PeepholeOptimizer(), promote_globals=True).code
+    listing = '\n'.join(code)
+    assert 'istore 299' in listing
+    class_name, data = assemble(code)
+    assert class_name == 'big'
+    assert bytes([OP_WIDE, LOCAL_OPCODES['istore'], 1, 43]) in data
+    outputs = []
+    for engine in ('tree', 'vm'):
+        out = io.StringIO()
+        run_source(source, backend='rd', stdout=out, stdin=io.StringIO(''), engine=engine)
+        outputs.append(out.getvalue())
+    assert outputs[0] == outputs[1] == '44554\n'
+
+
+def test_wide_iinc():
+    code = ['.class public w', '.method public static main([Ljava/lang/String;)V',
+            'iinc 300 1', 'iinc 2 1000', 'return', '.end method']
+    data = assemble(code)[1]
+    assert bytes([OP_WIDE, OP_IINC, 1, 44, 0, 1]) in data
+    assert bytes([OP_WIDE, OP_IINC, 0, 2, 3, 232]) in data
+
+
+@pytest.mark.parametrize('insn', ['iload 70000', 'iinc 1 40000', 'bipush 200', 'sipush 40000'])
+def test_operand_out_of_range(insn):
+    code = ['.class public w', '.method public static main([Ljava/lang/String;)V',
+            insn, 'return', '.end method']
+    with pytest.raises(ClassFileError):
+        assemble(code)
+
+
+def test_branch_offset_out_of_range():
+    code = ['.class public w', '.method public static main([Ljava/lang/String;)V', 'goto far']
+    code += ['iinc 1 1'] * 11000
+    code += ['far:', 'return', '.end method']
+    with pytest.raises(ClassFileError, match='Branch offset'):
+        assemble(code)
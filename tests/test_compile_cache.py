@@ -0,0 +1,81 @@
+import os
+import pickle
+
+import compile_cache
+from compile_cache import CompileCache
+from compiler import compile_source
+
+# Кэш компиляции: попадания и промахи, состав ключа, вытеснение по давности
+# обращения и поврежденные записи
+SOURCE = '''Program c;
+var x: integer;
+BEGIN
+x:=2;
+Write(x);
+END.'''
+
+
+def entry_path(cache: CompileCache, key: str) -> str:
+    return os.path.join(cache.directory, key + '.ast')
+
+
+def test_hit_and_miss(tmp_path):
+    cache = CompileCache(str(tmp_path))
+    first = compile_source(SOURCE, backend='rd', cache=cache)
+    second = compile_source(SOURCE, backend='rd', cache=cache)
+    assert (first.cached, second.cached) == (False, True)
+    assert second.code == first.code
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_key_depends_on_source_backend_options_and_fingerprint(monkeypatch):
+    key = CompileCache.key(SOURCE, 'rd', 'opts')
+    assert CompileCache.key(SOURCE.encode(), 'rd', 'opts') == key
+    assert CompileCache.key(SOURCE + ' ', 'rd', 'opts') != key
+    assert CompileCache.key(SOURCE, 'pyparsing', 'opts') != key
+    assert CompileCache.key(SOURCE, 'rd', 'other') != key
+    monkeypatch.setattr(compile_cache, '_fingerprint', 'another compiler version')
+    assert CompileCache.key(SOURCE, 'rd', 'opts') != key
+
+
+def test_corrupt_and_truncated_entries_are_misses(tmp_path):
+    cache = CompileCache(str(tmp_path))
+    compile_source(SOURCE, backend='rd', cache=cache)
+    key = CompileCache.key(SOURCE, 'rd')
+    path = entry_path(cache, key)
+    with open(path, 'rb') as f:
+        data = f.read()
+    for broken in (data[:len(data) // 2], b'not a pickle', b'', pickle.dumps(42)):
+        with open(path, 'wb') as f:
+            f.write(broken)
+        assert cache.get(key) is None
+    assert compile_source(SOURCE, backend='rd', cache=cache).cached is False
+    assert cache.get(key) is not None
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    cache = CompileCache(str(tmp_path))
+    for i, name in enumerate('abcd'):
+        cache.put(name, None, ['x' * 1000])
+        os.utime(entry_path(cache, name), (1000 + i, 1000 + i))
+    # 'a' прочитана последней и остается, вытесняются самые старые из остальных
+    os.utime(entry_path(cache, 'a'), (2000, 2000))
+    cache.max_bytes = cache.total_bytes - 1
+    cache.put('e', None, ['x' * 1000])
+    remaining = sorted(name[:-4] for name in os.listdir(str(tmp_path)) if name.endswith('.ast'))
+    assert remaining == ['a', 'd', 'e']
+    assert cache.total_bytes == sum(os.path.getsize(entry_path(cache, name)) for name in remaining)
+
+
+def test_put_keeps_a_running_total_without_scanning(tmp_path, monkeypatch):
+    cache = CompileCache(str(tmp_path))
+    cache.put('a', None, ['x' * 100])
+    size = os.path.getsize(entry_path(cache, 'a'))
+
+    def scan(*args):
+        raise AssertionError('the cache directory was scanned')
+    monkeypatch.setattr(cache, '_entries', scan)
+    cache.put('b', None, ['y' * 100])
+    cache.put('a', None, ['x' * 100])
+    assert cache.total_bytes == 2 * size
+    assert CompileCache(str(tmp_path)).total_bytes == 2 * size
@@ -0,0 +1,108 @@
+import glob
+import io
+import os
+import threading
+
+import pytest
+
+from compiler import compile_source
+from conftest import ROOT
+from folding import ConstantFolder
+from frontend import get_parser
+from generator import ProgramGenerator
+from interpreter import PascalRuntimeError, run_source
+from jasmin import count_instructions
+from peephole import PeepholeOptimizer
+
+# Свертка констант не должна менять результат программы и не должна увеличивать код.
+# Программы исполняются движком 'vm', то есть выполняется сгенерированный Jasmin-код
+SAMPLES = sorted(glob.glob(os.path.join(ROOT, 'resources', 'input_program*.txt')))
+
+CONSTANTS = '''Program c;
+var a, b, i: integer;
+BEGIN
+a:=2*3+4;
+b:=a*10;
+i:=0;
+while (i<(100 div 4)) do
+begin
+    a:=a*1+0;
+    b:=b*2+(0-7) div 2+(0-7) mod 2;
+    i:=i+1;
+end;
+for (i:=1 to 10) do
+    a:=a+i*4;
+Write(a);
+Write(b);
+END.'''
+
+EMPTY_PARAMS = '''Program pe;
+var x: integer;
+procedure P();
+var t: integer;
+begin
+x:=x+1;
+end;
+BEGIN
+x:=1;
+P();
+Write(x);
+END.'''
+
+
+def code_size(source: str, fold: bool) -> int:
+    result = compile_source(source, backend='rd', optimizer=PeepholeOptimizer(),
+                            folder=ConstantFolder() if fold else None, promote_globals=True)
+    return count_instructions(result.code)
+
+
+# Вывод программы на ВМ или текст ошибки времени исполнения
+def run(source: str, fold: bool) -> str:
+    out = io.StringIO()
+    try:
+        run_source(source, backend='rd', stdout=out, stdin=io.StringIO(''), step_limit=2000,
+                   folder=ConstantFolder() if fold else None, engine='vm')
+    except PascalRuntimeError as e:
+        return '{0}error: {1}'.format(out.getvalue(), e)
+    return out.getvalue()
+
+
+def read(path: str) -> str:
+    with open(path) as f:
+        return f.read()
+
+
+@pytest.mark.parametrize('path', SAMPLES, ids=os.path.basename)
+def test_samples_are_not_larger(path):
+    source = read(path)
+    assert code_size(source, fold=True) <= code_size(source, fold=False)
+    assert run(source, fold=True) == run(source, fold=False)
+
+
+def test_constant_expressions_shrink_code():
+    assert code_size(CONSTANTS, fold=True) < code_size(CONSTANTS, fold=False)
+    assert run(CONSTANTS, fold=True) == run(CONSTANTS, fold=False)
+
+
+def test_generated_programs_keep_results():
+    generator = ProgramGenerator(seed=3)
+    checked = 0
+    while checked < 60:
+        source = generator.program()
+        try:
+            compile_source(source, backend='rd')
+        except Exception:
+            continue
+        assert code_size(source, fold=True) <= code_size(source, fold=False), source
+        assert run(source, fold=True) == run(source, fold=False), source
+        checked += 1
+
+
+def test_empty_params_do_not_hang():
+    ast = get_parser('rd').parse(EMPTY_PARAMS)
+    folded = []
+    worker = threading.Thread(target=lambda: folded.append(ConstantFolder().fold(ast)), daemon=True)
+    worker.start()
+    worker.join(10)
+    assert folded, 'ConstantFolder.fold did not finish'
+    assert run(EMPTY_PARAMS, fold=True) == run(EMPTY_PARAMS, fold=False) == '2\n'
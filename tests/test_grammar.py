@@ -0,0 +1,50 @@
+import os
+import warnings
+
+import pyparsing as pp
+
+from conftest import ROOT
+from grammar import LruPackratCache, PascalGrammar
+
+
+def test_packrat_cache_size_can_be_changed():
+    try:
+        PascalGrammar.enable_packrat(64)
+        assert isinstance(pp.ParserElement.packrat_cache, LruPackratCache)
+        assert PascalGrammar.cache_stats()['limit'] == 64
+
+        PascalGrammar.enable_packrat(None)
+        assert not isinstance(pp.ParserElement.packrat_cache, LruPackratCache)
+        assert PascalGrammar.cache_stats()['limit'] is None
+
+        PascalGrammar.enable_packrat(128)
+        assert PascalGrammar.cache_stats()['limit'] == 128
+    finally:
+        pp.ParserElement.disable_memoization()
+
+
+def test_enable_packrat_does_not_warn():
+    with warnings.catch_warnings():
+        warnings.simplefilter('error')
+        try:
+            PascalGrammar.enable_packrat()
+        finally:
+            pp.ParserElement.disable_memoization()
+
+
+def test_lru_cache_evicts_least_recently_used():
+    cache = LruPackratCache(2)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    cache.get('a')
+    cache.set('c', 3)
+    assert cache.get('b') is cache.not_in_cache
+    assert cache.get('a') == 1 and len(cache) == 2
+
+
+def test_build_and_parse_do_not_warn():
+    with open(os.path.join(ROOT, 'resources', 'input_program_3.txt')) as f:
+        source = f.read()
+    with warnings.catch_warnings():
+        warnings.simplefilter('error')
+        assert PascalGrammar().parse(source) is not None
@@ -0,0 +1,94 @@
+import pytest
+
+from compiler import compile_source
+from folding import ConstantFolder
+from incremental import IncrementalCompiler
+from peephole import PeepholeOptimizer
+
+# Инкрементальная компиляция после каждой правки должна давать тот же код, что и
+# компиляция измененного текста целиком: устаревший кэш подпрограмм дал бы неверный
+# код без всякой ошибки
+BASE = '''Program inc;
+var x, g: integer;
+    d: array [1 .. 10] of integer;
+function Sq(a: integer): integer;
+var u: integer;
+begin
+a:=a*a+x;
+end;
+procedure Show();
+var t: integer;
+begin
+Write(g);
+x:=x+1;
+end;
+BEGIN
+x:=3;
+g:=7;
+d[2]:=Sq(x);
+Show();
+Write(d[2]);
+END.'''
+
+NEW_ROUTINE = '''procedure Twice();
+var t: integer;
+begin
+x:=x*2;
+end;
+'''
+
+# Правки применяются по очереди к тексту, полученному предыдущей правкой:
+# (название, функция правки, сколько подпрограмм должно быть разобрано заново)
+EDITS = [
+    ('routine body', lambda text: text.replace('a:=a*a+x;', 'a:=a*a-x;'), 1),
+    ('global type', lambda text: text.replace('var x, g: integer;', 'var x: integer; g: boolean;')
+                                     .replace('g:=7;', 'g:=True;'), 0),
+    ('add routine', lambda text: text.replace('BEGIN\n', NEW_ROUTINE + 'BEGIN\n').replace('Show();\nWrite', 'Show();\nTwice();\nWrite'), 1),
+    ('rename global', lambda text: text.replace('x', 'w'), 3),
+    ('rename routine', lambda text: text.replace('Sq', 'Square'), 1),
+    ('remove routine', lambda text: text.replace(NEW_ROUTINE.replace('x', 'w'), '').replace('Twice();\n', ''), 0),
+    ('restore', lambda text: BASE, 2),
+]
+
+
+def options(optimized: bool) -> dict:
+    if not optimized:
+        return {}
+    return dict(optimizer=PeepholeOptimizer(), folder=ConstantFolder(), promote_globals=True)
+
+
+@pytest.mark.parametrize('optimized', [False, True], ids=['plain', 'optimized'])
+@pytest.mark.parametrize('backend', ['pyparsing', 'rd'])
+def test_edits_match_whole_compilation(backend, optimized):
+    compiler = IncrementalCompiler(backend, **options(optimized))
+    text = BASE
+    assert compiler.compile(text).code == compile_source(text, backend=backend, **options(optimized)).code
+    for name, edit, parsed in EDITS:
+        text = edit(text)
+        expected = compile_source(text, backend=backend, **options(optimized)).code
+        assert compiler.compile(text).code == expected, name
+        assert compiler.stats['whole'] is False, name
+        assert compiler.stats['parsed'] == parsed, name
+
+
+def test_unchanged_routines_are_not_compiled_again():
+    compiler = IncrementalCompiler('rd')
+    compiler.compile(BASE)
+    assert compiler.stats['compiled'] == 2
+    compiler.compile(BASE.replace('x:=3;', 'x:=4;'))
+    assert (compiler.stats['parsed'], compiler.stats['compiled']) == (0, 0)
+    # Show читает g, поэтому смена типа g пересобирает только ее
+    compiler.compile(BASE.replace('var x, g: integer;', 'var x: integer; g: boolean;').replace('g:=7;', 'g:=True;'))
+    assert (compiler.stats['parsed'], compiler.stats['compiled']) == (0, 1)
+
+
+def test_errors_match_whole_compilation():
+    compiler = IncrementalCompiler('rd')
+    compiler.compile(BASE)
+    broken = BASE.replace('a:=a*a+x;', 'a:=a*a+zz;')
+    with pytest.raises(Exception) as whole:
+        compile_source(broken, backend='rd')
+    with pytest.raises(Exception) as incremental:
+        compiler.compile(broken)
+    assert str(incremental.value) == str(whole.value)
+    assert compiler.compile(BASE).code == compile_source(BASE, backend='rd').code
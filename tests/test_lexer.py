@@ -0,0 +1,56 @@
+import glob
+import os
+
+import pytest
+
+from conftest import ROOT
+from lexer import EOF, Lexer, ParseError, TokenStream
+
+# Строка и буфер байтов UTF-8 (так читают файлы batch и pipeline) должны давать
+# одни и те же лексемы и отвергать одни и те же символы; позиции в буфере - в байтах
+SAMPLES = sorted(glob.glob(os.path.join(ROOT, 'resources', 'input_program*.txt')))
+
+
+def texts(source):
+    return [(token.kind, token.text) for token in Lexer(source).iter_tokens()]
+
+
+def error(source):
+    with pytest.raises(ParseError) as info:
+        Lexer(source).tokenize()
+    return str(info.value).split(' (line')[0]
+
+
+@pytest.mark.parametrize('path', SAMPLES, ids=os.path.basename)
+def test_samples_tokenize_alike(path):
+    with open(path) as f:
+        source = f.read()
+    assert texts(source) == texts(source.encode('utf-8'))
+
+
+def test_ascii_whitespace_and_unicode_literals():
+    source = "x :=\t1;\r\n\f\vWrite('привет');"
+    assert texts(source) == texts(source.encode('utf-8'))
+
+
+@pytest.mark.parametrize('char', ['\u00a0', '\u2028', '\u0663', '\u00e9'])
+def test_non_ascii_outside_literals_is_rejected_alike(char):
+    source = 'x :=' + char + '1;'
+    expected = 'Unexpected character {0!r}'.format(char)
+    assert error(source) == error(source.encode('utf-8')) == expected
+    assert error(memoryview(source.encode('utf-8'))) == expected
+
+
+def test_token_stream_reads_across_chunks():
+    source = 'x:=1;\n' * 3000
+    tokens = Lexer(source).tokenize()
+    stream = TokenStream(Lexer(source).iter_tokens())
+    for i, token in enumerate(tokens):
+        assert stream[i] == token and stream[i + 1] == tokens[min(i + 1, len(tokens) - 1)]
+    assert stream[len(tokens) + 10].kind == EOF
+
+
+def test_error_position_after_valid_tokens():
+    with pytest.raises(ParseError) as info:
+        Lexer('x := 1;\ny := 2 # 3;').tokenize()
+    assert (info.value.line, info.value.col) == (2, 8)
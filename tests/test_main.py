@@ -0,0 +1,30 @@
+import subprocess
+import sys
+
+import pytest
+
+from compiler import compile_source
+from conftest import ROOT
+from folding import ConstantFolder
+from peephole import PeepholeOptimizer
+
+# Основной режим main.py: без -O код не оптимизируется, с -O включены все оптимизации
+
+
+def main_output(tmp_path, *options) -> str:
+    subprocess.run([sys.executable, 'main.py', '--no-cache', '-o', str(tmp_path)] + list(options),
+                   cwd=ROOT, check=True, stdout=subprocess.DEVNULL)
+    return (tmp_path / 'jasmin_res.j').read_text()
+
+
+@pytest.mark.parametrize('optimize', [False, True])
+def test_optimizations_are_opt_in(tmp_path, optimize):
+    with open(ROOT + '/resources/input_program_3.txt') as f:
+        source = f.read()
+    if optimize:
+        expected = compile_source(source, optimizer=PeepholeOptimizer(), folder=ConstantFolder(),
+                                  promote_globals=True)
+    else:
+        expected = compile_source(source)
+    output = main_output(tmp_path, '-O') if optimize else main_output(tmp_path)
+    assert output == '\n'.join(expected.code)
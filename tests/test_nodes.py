@@ -0,0 +1,95 @@
+import io
+import sys
+
+import pytest
+
+from compiler import compile_source
+from folding import ConstantFolder
+from jasmin import CodeGenerator
+from nodes import (AssignNode, BinOp, BinOpNode, BodyNode, IdentListNode, IdentNode, IfNode, LiteralNode,
+                   ProgramNode, StmtListNode, TypeSpecNode, VarDeclNode, VarsDeclNode, render_tree, write_tree)
+from semantic import SemanticAnalyzer
+
+# Обходы AST и работа с глубокими деревьями без увеличения предела рекурсии
+
+
+def expression():
+    # (a * 2) + b
+    return BinOpNode(BinOp.ADD, BinOpNode(BinOp.MUL, IdentNode('a'), LiteralNode('2')), IdentNode('b'))
+
+
+def test_preorder_and_postorder():
+    tree = expression()
+    assert [str(node) for node in tree.preorder()] == ['+', '*', 'a', '2 (int)', 'b']
+    assert [str(node) for node in tree.postorder()] == ['a', '2 (int)', '*', 'b', '+']
+
+
+def test_childs_follow_node_fields():
+    tree = expression()
+    assert [str(node) for node in tree.childs] == ['*', 'b']
+    assert not hasattr(tree, '__dict__')
+    tree.arg2 = LiteralNode('3')
+    assert [str(node) for node in tree.childs] == ['*', '3 (int)']
+
+
+def test_visit_applies_func_to_every_node():
+    tree = expression()
+    visited = []
+    tree.visit(lambda node: visited.append(str(node)))
+    assert visited == ['+', '*', 'a', '2 (int)', 'b']
+    visited.clear()
+    tree.visit(lambda node: visited.append(str(node)), postorder=True)
+    assert visited == ['a', '2 (int)', '*', 'b', '+']
+
+
+def test_render_tree():
+    assert list(render_tree(expression())) == ['+', '├ *', '│ ├ a', '│ └ 2 (int)', '└ b']
+
+
+def test_default_recursion_limit():
+    assert sys.getrecursionlimit() <= 1000
+
+
+CHAIN = 'Program p; var a, b: integer; begin a:=1; b:={0}; Write(b); end.'.format('+'.join(['a'] * 10000))
+
+
+@pytest.mark.parametrize('backend', ['pyparsing', 'rd'])
+def test_long_expression_chain(backend):
+    result = compile_source(CHAIN, backend=backend)
+    assert result.code.count('iadd') == 9999
+    out = io.StringIO()
+    write_tree(result.ast, out)
+    assert out.getvalue().count('\n') > 20000
+
+
+def test_long_expression_chain_is_folded():
+    result = compile_source(CHAIN, backend='rd', folder=ConstantFolder(), promote_globals=True)
+    assert 'ldc 10000' in result.code
+    assert 'iadd' not in result.code
+
+
+# Парсеры рекурсивны по вложенности операторов, поэтому очень глубокое дерево строится
+# напрямую; через парсер 'rd' проверяется глубина, которую он разбирает
+def nested_ifs(depth: int) -> ProgramNode:
+    stmt = AssignNode(IdentNode('b'), IdentNode('a'))
+    for _ in range(depth):
+        stmt = IfNode(BinOpNode(BinOp.GT, IdentNode('a'), LiteralNode('0')), stmt)
+    decl = VarDeclNode(IdentListNode(IdentNode('a'), IdentNode('b')), TypeSpecNode('integer'))
+    return ProgramNode(IdentNode('p'), VarsDeclNode(decl),
+                       BodyNode(StmtListNode(AssignNode(IdentNode('a'), LiteralNode('1')), stmt)))
+
+
+def test_deeply_nested_ifs():
+    depth = 5000
+    ast = ConstantFolder().fold(nested_ifs(depth))
+    generator = CodeGenerator()
+    SemanticAnalyzer(generator).visit(ast)
+    assert sum(1 for line in generator.code if line.startswith('if_icmple')) == depth
+    assert sum(1 for _ in render_tree(ast)) > 4 * depth
+
+
+def test_nested_ifs_through_the_parser():
+    depth = 250
+    source = 'Program p; var a, b: integer; begin a:=1; {0}b:=a; Write(b); end.'.format('if (a>0) then ' * depth)
+    result = compile_source(source, backend='rd', folder=ConstantFolder(), promote_globals=True)
+    assert sum(1 for line in result.code if line.startswith('if_icmple')) == depth
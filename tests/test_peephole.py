@@ -0,0 +1,60 @@
+import pytest
+
+from peephole import DEFAULT_RULES, RULES, PeepholeOptimizer, parse_rules
+
+# Каждое правило отдельно: Jasmin-код на входе, ожидаемый код на выходе и число срабатываний
+CASES = [
+    ('blank', ['iload 1', '', '  ', 'istore 2'], ['iload 1', 'istore 2'], 2),
+    ('dead_code', ['goto l', 'iload 1', 'istore 2', 'l:', 'return', 'iconst_0'],
+     ['goto l', 'l:', 'return'], 3),
+    ('goto_next', ['goto l', 'other:', 'l:', 'return'], ['other:', 'l:', 'return'], 1),
+    ('goto_next', ['goto l', 'iload 1', 'l:', 'return'], ['goto l', 'iload 1', 'l:', 'return'], 0),
+    ('iinc', ['iload 2', 'ldc 1', 'iadd', 'istore 2'], ['iinc 2 1'], 1),
+    ('iinc', ['bipush 5', 'iload_3', 'iadd', 'istore_3', 'iload 2', 'iconst_2', 'isub', 'istore 2'],
+     ['iinc 3 5', 'iinc 2 -2'], 2),
+    ('iinc', ['iload 2', 'ldc 1000', 'iadd', 'istore 2'], ['iload 2', 'ldc 1000', 'iadd', 'istore 2'], 0),
+    ('iinc', ['iload 2', 'ldc 1', 'iadd', 'istore 3'], ['iload 2', 'ldc 1', 'iadd', 'istore 3'], 0),
+    ('const', ['ldc 0', 'ldc -1', 'ldc 100', 'ldc 1000', 'ldc 100000'],
+     ['iconst_0', 'iconst_m1', 'bipush 100', 'sipush 1000', 'ldc 100000'], 4),
+    ('shift', ['iload 1', 'ldc 8', 'imul', 'iload 1', 'ldc 6', 'imul'],
+     ['iload 1', 'iconst_3', 'ishl', 'iload 1', 'ldc 6', 'imul'], 1),
+    ('store_load', ['istore 2', 'iload 2', 'putstatic p/x I', 'getstatic p/x I', 'istore_1', 'iload 2'],
+     ['dup', 'istore 2', 'dup', 'putstatic p/x I', 'istore_1', 'iload 2'], 2),
+]
+
+
+def test_every_rule_has_a_case():
+    assert {case[0] for case in CASES} == set(RULES)
+
+
+@pytest.mark.parametrize('rule, before, after, hits', CASES, ids=[case[0] for case in CASES])
+def test_rule(rule, before, after, hits):
+    optimizer = PeepholeOptimizer([rule])
+    assert optimizer.optimize(before) == after
+    assert optimizer.hits == {rule: hits}
+
+
+def test_rules_are_applied_until_nothing_changes():
+    optimizer = PeepholeOptimizer()
+    # iinc забирает istore (и ldc 1) раньше, чем store_load и const
+    code = ['iload 1', 'ldc 1', 'iadd', 'istore 1', 'iload 1', 'goto l', 'l:', 'ldc 2', 'ireturn']
+    assert optimizer.optimize(code) == ['iinc 1 1', 'iload 1', 'l:', 'iconst_2', 'ireturn']
+    assert optimizer.hits['iinc'] == 1
+    assert optimizer.hits['goto_next'] == 1
+    assert optimizer.hits['const'] == 1
+    assert optimizer.hits['store_load'] == 0
+
+
+def test_hits_accumulate_across_methods():
+    optimizer = PeepholeOptimizer(['const'])
+    optimizer.optimize(['ldc 1'])
+    optimizer.optimize(['ldc 2', 'ldc 3'])
+    assert optimizer.hits == {'const': 3}
+
+
+def test_rule_selection():
+    assert parse_rules('all') == DEFAULT_RULES
+    assert parse_rules('none') is None
+    assert parse_rules('const, iinc') == ('const', 'iinc')
+    with pytest.raises(Exception, match='Unknown peephole rule'):
+        PeepholeOptimizer(['swap'])
@@ -0,0 +1,63 @@
+import itertools
+
+import pyparsing as pp
+import pytest
+
+from frontend import PARSER_BACKENDS, get_parser
+from lexer import ParseError
+from nodes import BIN_OP_PRECEDENCE, NON_ASSOCIATIVE_PRECEDENCES, BinOp, BinOpNode
+
+# Приоритеты и ассоциативность бинарных операций в обоих анализаторах: выражение
+# разбирается в дерево и записывается со всеми скобками, например, a+b*c - (a + (b * c)).
+# BinOp.NE ('<>') не записывается в тексте программы: грамматика знает только '!=', без значения в BinOp
+OPS = [op.value for op in BIN_OP_PRECEDENCE if op is not BinOp.NE]
+PRECEDENCE = {op.value: prec for op, prec in BIN_OP_PRECEDENCE.items()}
+DIFFERENT = [(low, high) for low, high in itertools.permutations(OPS, 2) if PRECEDENCE[low] < PRECEDENCE[high]]
+SAME = [(first, second) for first, second in itertools.product(OPS, repeat=2)
+        if PRECEDENCE[first] == PRECEDENCE[second]]
+ASSOCIATIVE = [pair for pair in SAME if PRECEDENCE[pair[0]] not in NON_ASSOCIATIVE_PRECEDENCES]
+NON_ASSOCIATIVE = [pair for pair in SAME if PRECEDENCE[pair[0]] in NON_ASSOCIATIVE_PRECEDENCES]
+
+
+def parse_expr(backend: str, expr: str) -> str:
+    program = get_parser(backend).parse('Program p; var a, b, c, x: integer; begin x := %s; end.' % expr)
+    return render(program.stmt_list.body.exprs[0].val)
+
+
+def ids(pairs) -> list:
+    return [' '.join(pair) for pair in pairs]
+
+
+def render(node) -> str:
+    if isinstance(node, BinOpNode):
+        return '({0} {1} {2})'.format(render(node.arg1), node.op.value, render(node.arg2))
+    return node.name
+
+
+@pytest.mark.parametrize('backend', PARSER_BACKENDS)
+@pytest.mark.parametrize('low, high', DIFFERENT, ids=ids(DIFFERENT))
+def test_higher_precedence_binds_tighter(backend, low, high):
+    assert parse_expr(backend, 'a {0} b {1} c'.format(low, high)) == '(a {0} (b {1} c))'.format(low, high)
+    assert parse_expr(backend, 'a {1} b {0} c'.format(low, high)) == '((a {1} b) {0} c)'.format(low, high)
+
+
+@pytest.mark.parametrize('backend', PARSER_BACKENDS)
+@pytest.mark.parametrize('first, second', ASSOCIATIVE, ids=ids(ASSOCIATIVE))
+def test_same_precedence_is_left_associative(backend, first, second):
+    expr = 'a {0} b {1} c'.format(first, second)
+    assert parse_expr(backend, expr) == '((a {0} b) {1} c)'.format(first, second)
+
+
+@pytest.mark.parametrize('backend', PARSER_BACKENDS)
+@pytest.mark.parametrize('first, second', NON_ASSOCIATIVE, ids=ids(NON_ASSOCIATIVE))
+def test_chained_comparison_is_rejected(backend, first, second):
+    with pytest.raises((ParseError, pp.ParseBaseException)):
+        parse_expr(backend, 'a {0} b {1} c'.format(first, second))
+    assert parse_expr(backend, '(a {0} b) {1} c'.format(first, second)) == '((a {0} b) {1} c)'.format(first, second)
+
+
+@pytest.mark.parametrize('backend', PARSER_BACKENDS)
+def test_all_levels_in_one_expression(backend):
+    expr = 'a or b and c = a < b + c * a - b mod c'
+    expected = '(a or (b and (c = (a < ((b + (c * a)) - (b mod c))))))'
+    assert parse_expr(backend, expr) == expected
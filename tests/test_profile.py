@@ -0,0 +1,21 @@
+import json
+import subprocess
+import sys
+
+from conftest import ROOT
+
+# Профиль основного режима main.py: каждая фаза считается один раз, фазы не
+# пересекаются, и их сумма не больше времени всего запуска
+
+
+def test_main_profile_phases_are_disjoint(tmp_path):
+    target = tmp_path / 'profile.json'
+    subprocess.run([sys.executable, 'main.py', '-O', '--no-cache', '-o', str(tmp_path / 'out'),
+                    '--profile', str(target)], cwd=ROOT, check=True, stdout=subprocess.DEVNULL)
+    summary = json.loads(target.read_text())
+    phases = summary['phases']
+    assert list(phases) == ['read', 'parse', 'fold', 'analyze', 'tree', 'print', 'assemble', 'write']
+    assert all(totals['calls'] == 1 for totals in phases.values())
+    assert sum(totals['wall_s'] for totals in phases.values()) <= summary['wall_s']
+    assert (tmp_path / 'out' / 'pr3.class').exists()
+    assert (tmp_path / 'out' / 'jasmin_res.j').exists()
@@ -0,0 +1,86 @@
+import pytest
+
+from compiler import compile_source
+from semantic import BUILTINS_LEVEL, ScopedSymbolTable
+from symbols import BuiltinTypeSymbol, VarSymbol
+
+# Ошибки семантического анализа и таблица символов
+
+
+@pytest.mark.parametrize('backend', ['pyparsing', 'rd'])
+@pytest.mark.parametrize('promote', [False, True])
+def test_undeclared_identifier_in_expression(backend, promote):
+    with pytest.raises(Exception, match="Symbol\\(identifier\\) not found 'zz'"):
+        compile_source('Program p; var a: integer; begin a := zz + 1; end.', backend=backend,
+                       promote_globals=promote)
+
+
+def test_nested_scope_shadows_and_restores_binding():
+    integer, char = BuiltinTypeSymbol('integer'), BuiltinTypeSymbol('char')
+    global_scope = ScopedSymbolTable('p', 1)
+    outer_x, y = VarSymbol('x', integer), VarSymbol('y', integer)
+    global_scope.define(outer_x)
+    global_scope.define(y)
+
+    routine = ScopedSymbolTable('f', 2, global_scope)
+    inner_x, z = VarSymbol('x', char), VarSymbol('z', char)
+    routine.define(inner_x)
+    routine.define(z)
+    assert routine.lookup('x') is inner_x and routine.get_level_scope('x') == 2
+    assert routine.lookup('y') is y and routine.get_level_scope('y') == 1
+    assert routine.lookup('y', current_scope_only=True) is None
+    assert global_scope.lookup('x', current_scope_only=True) is outer_x
+
+    routine.close()
+    assert global_scope.lookup('x') is outer_x and global_scope.get_level_scope('x') == 1
+    assert global_scope.lookup('z') is None and global_scope.get_level_scope('z') == 0
+    assert global_scope.lookup('y') is y
+
+
+def test_redefinition_in_one_scope_is_removed_by_one_close():
+    global_scope = ScopedSymbolTable('p', 1)
+    routine = ScopedSymbolTable('f', 2, global_scope)
+    first, second = VarSymbol('a', 'integer'), VarSymbol('a', 'char')
+    routine.define(first)
+    routine.define(second)
+    assert routine.lookup('a') is second
+    routine.close()
+    assert global_scope.lookup('a') is None
+
+
+def test_builtins_are_shadowed_and_restored():
+    global_scope = ScopedSymbolTable('p', 1)
+    builtin = global_scope.lookup('Write')
+    assert builtin is not None and global_scope.get_level_scope('Write') == BUILTINS_LEVEL
+
+    routine = ScopedSymbolTable('f', 2, global_scope)
+    local = VarSymbol('Write', 'integer')
+    routine.define(local)
+    assert routine.lookup('Write') is local
+    routine.close()
+    assert global_scope.lookup('Write') is builtin
+    assert ScopedSymbolTable('q', 1).lookup('Write') is builtin
+
+
+SHADOWING = """Program p;
+var x: boolean;
+    procedure Show(x: integer);
+    var t: integer;
+    begin
+    x := x + 1;
+    Write(x);
+    end;
+BEGIN
+Show(1);
+x := %s;
+END."""
+
+
+# Параметр x типа integer закрывает глобальную x типа boolean только внутри Show
+@pytest.mark.parametrize('backend', ['pyparsing', 'rd'])
+def test_global_binding_is_restored_after_routine(backend):
+    code = compile_source(SHADOWING % 'True', backend=backend).code
+    main = code.index('.method public static main([Ljava/lang/String;)V')
+    assert 'istore_0' in code[:main] and 'putstatic p/x Z' in code[main:]
+    with pytest.raises(Exception, match="Wrong type 'x' found"):
+        compile_source(SHADOWING % '1', backend=backend)
@@ -0,0 +1,59 @@
+import json
+import os
+import signal
+import socket
+import threading
+
+import pytest
+
+from client import connect, request
+from protocol import _LENGTH, recv_message
+from server import CompileServer
+
+# Сервер компиляции на временном сокете с одним процессом-исполнителем
+SOURCE = '''Program s;
+var x: integer;
+BEGIN
+x:=2;
+Write(x);
+END.'''
+
+
+@pytest.fixture
+def server(tmp_path):
+    server = CompileServer(str(tmp_path / 'compiler.sock'), jobs=1)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    thread.join(10)
+    server.server_close()
+
+
+def send_raw(sock: socket.socket, payload) -> None:
+    data = json.dumps(payload).encode('utf-8')
+    sock.sendall(_LENGTH.pack(len(data)) + data)
+
+
+@pytest.mark.parametrize('payload', [[1], 'compile', 7])
+def test_non_object_request_is_rejected(server, payload):
+    with connect(server.socket_path) as sock:
+        send_raw(sock, payload)
+        response = recv_message(sock)
+        assert response['ok'] is False
+        assert response['diagnostics'] == ['Request must be a JSON object']
+        # соединение и поток обработчика живы
+        assert request(sock, {'op': 'stats'})['ok'] is True
+
+
+def test_pool_is_restarted_after_worker_death(server):
+    with connect(server.socket_path) as sock:
+        assert request(sock, {'op': 'compile', 'source': SOURCE, 'emit': 'jasmin'})['ok'] is True
+        broken = server.executor
+        for pid in list(broken._processes):
+            os.kill(pid, signal.SIGKILL)
+        response = request(sock, {'op': 'compile', 'source': SOURCE, 'emit': 'jasmin'})
+        assert response['ok'] is False
+        assert response['diagnostics'][0].startswith('Compile worker died')
+        assert server.executor is not broken
+        assert request(sock, {'op': 'compile', 'source': SOURCE, 'emit': 'jasmin'})['ok'] is True
@@ -0,0 +1,97 @@
+import logging
+
+import pytest
+
+from compiler import compile_source
+from tracing import (DEFINE, ENTER_SCOPE, LEAVE_SCOPE, LOOKUP, CallbackTracer, CountingTracer, LoggingTracer,
+                     TraceEvent)
+
+# События таблицы символов и вывод трассировщиков на программе с одной процедурой
+SOURCE = '''Program p;
+var x, y: integer;
+    procedure Show(a: integer);
+    var t: integer;
+    begin
+    y := a + x;
+    end;
+BEGIN
+x := 1;
+Show(x);
+END.'''
+
+# Встроенные типы лежат на уровне 0, поэтому поиск integer из p идет на глубину 1, из Show - на 2
+EVENTS = [
+    TraceEvent(ENTER_SCOPE, 'p', 1),
+    TraceEvent(LOOKUP, 'p', 1, 'integer', 1, True),
+    TraceEvent(LOOKUP, 'p', 1, 'x', 0, False),
+    TraceEvent(DEFINE, 'p', 1, 'x'),
+    TraceEvent(LOOKUP, 'p', 1, 'y', 0, False),
+    TraceEvent(DEFINE, 'p', 1, 'y'),
+    TraceEvent(DEFINE, 'p', 1, 'Show'),
+    TraceEvent(ENTER_SCOPE, 'Show', 2),
+    TraceEvent(LOOKUP, 'Show', 2, 'integer', 2, True),
+    TraceEvent(DEFINE, 'Show', 2, 'a'),
+    TraceEvent(LOOKUP, 'Show', 2, 'y', 1, True),
+    TraceEvent(LOOKUP, 'Show', 2, 'a', 0, True),
+    TraceEvent(LOOKUP, 'Show', 2, 'x', 1, True),
+    TraceEvent(LEAVE_SCOPE, 'Show', 2),
+    TraceEvent(LOOKUP, 'p', 1, 'x', 0, True),
+    TraceEvent(LOOKUP, 'p', 1, 'Show', 0, True),
+    TraceEvent(LOOKUP, 'p', 1, 'x', 0, True),
+    TraceEvent(LEAVE_SCOPE, 'p', 1),
+]
+
+
+@pytest.mark.parametrize('backend', ['pyparsing', 'rd'])
+def test_callback_tracer_receives_events_in_order(backend):
+    events = []
+    result = compile_source(SOURCE, backend=backend, tracer=CallbackTracer(events.append))
+    assert events == EVENTS
+    assert result.code == compile_source(SOURCE, backend=backend).code
+
+
+def test_counting_tracer_summary():
+    tracer = CountingTracer()
+    compile_source(SOURCE, backend='rd', tracer=tracer)
+    assert tracer.summary() == {
+        'scopes_entered': 2,
+        'lookups': 10,
+        'avg_depth': 0.5,
+        'scopes': {
+            'p': {'defines': 3, 'lookups': 6, 'misses': 2, 'avg_depth': 1 / 6},
+            'Show': {'defines': 1, 'lookups': 4, 'misses': 0, 'avg_depth': 1.0},
+        },
+    }
+
+
+def test_counting_tracer_counts_failed_lookup():
+    tracer = CountingTracer()
+    with pytest.raises(Exception, match="not found 'zz'"):
+        compile_source('Program p; var a: integer; begin a := zz; end.', backend='rd', tracer=tracer)
+    summary = tracer.summary()
+    assert summary['scopes_entered'] == 1
+    assert summary['scopes']['p']['misses'] == 2
+
+
+def test_logging_tracer_messages(caplog):
+    with caplog.at_level(logging.DEBUG, logger='pascal.symbols'):
+        compile_source(SOURCE, backend='rd', tracer=LoggingTracer())
+    messages = [record.getMessage() for record in caplog.records if record.name == 'pascal.symbols']
+    assert messages[:4] == ['ENTER scope: p', 'Lookup: integer (scope: p, depth: 1, found: True)',
+                            'Lookup: x (scope: p, depth: 0, found: False)', 'Define: <x:integer> index:0 ']
+    assert 'Lookup: x (scope: Show, depth: 1, found: True)' in messages
+    # перед LEAVE выводится содержимое закрываемой области
+    leave = messages.index('LEAVE scope: Show')
+    assert 'Scope name     : Show' in messages[leave - 1]
+    assert "a: '<a:integer> index:0 '" in messages[leave - 1]
+    assert messages[-1] == 'LEAVE scope: p'
+    assert messages.index('ENTER scope: Show') < leave
+
+
+def test_logging_tracer_logger_and_level(caplog):
+    logger = logging.getLogger('pascal.symbols.test')
+    with caplog.at_level(logging.INFO, logger='pascal.symbols.test'):
+        compile_source(SOURCE, backend='rd', tracer=LoggingTracer(logger, logging.INFO))
+    records = [record for record in caplog.records if record.name == 'pascal.symbols.test']
+    assert len(records) == len(EVENTS) + 2
+    assert all(record.levelno == logging.INFO for record in records)
@@ -0,0 +1,114 @@
+import logging
+from collections import defaultdict
+from typing import Callable, Dict, NamedTuple, Optional
+
+
+DEFINE = 'define'
+LOOKUP = 'lookup'
+ENTER_SCOPE = 'enter_scope'
+LEAVE_SCOPE = 'leave_scope'
+
+
+# Событие таблицы символов: вид, имя и уровень области видимости, имя символа,
+# глубина поиска по цепочке областей (0 - найден в текущей) и найден ли символ
+class TraceEvent(NamedTuple):
+    kind: str
+    scope_name: str
+    scope_level: int
+    name: Optional[str] = None
+    depth: int = 0
+    found: bool = True
+
+
+# Базовый трассировщик: получает события таблицы символов и анализатора.
+# Если трассировщик не задан, таблица символов не вызывает его вообще
+class SymbolTracer:
+    def define(self, scope, symbol):
+        self.emit(TraceEvent(DEFINE, str(scope.scope_name), scope.scope_level, symbol.name))
+
+    def lookup(self, scope, name, depth, found):
+        self.emit(TraceEvent(LOOKUP, str(scope.scope_name), scope.scope_level, name, depth, found))
+
+    def enter_scope(self, scope):
+        self.emit(TraceEvent(ENTER_SCOPE, str(scope.scope_name), scope.scope_level))
+
+    def leave_scope(self, scope):
+        self.emit(TraceEvent(LEAVE_SCOPE, str(scope.scope_name), scope.scope_level))
+
+    def emit(self, event: TraceEvent):
+        pass
+
+
+# Передает каждое событие в пользовательскую функцию
+class CallbackTracer(SymbolTracer):
+    def __init__(self, callback: Callable[[TraceEvent], None]):
+        self.callback = callback
+
+    def emit(self, event: TraceEvent):
+        self.callback(event)
+
+
+# Пишет события в logging (по умолчанию логгер 'pascal.symbols', уровень DEBUG);
+# при выходе из области видимости выводится ее содержимое
+class LoggingTracer(SymbolTracer):
+    def __init__(self, logger: Optional[logging.Logger] = None, level: int = logging.DEBUG):
+        self.logger = logger or logging.getLogger('pascal.symbols')
+        self.level = level
+
+    def define(self, scope, symbol):
+        self.logger.log(self.level, 'Define: %s', symbol)
+
+    def lookup(self, scope, name, depth, found):
+        self.logger.log(self.level, 'Lookup: %s (scope: %s, depth: %d, found: %s)',
+                        name, scope.scope_name, depth, found)
+
+    def enter_scope(self, scope):
+        self.logger.log(self.level, 'ENTER scope: %s', scope.scope_name)
+
+    def leave_scope(self, scope):
+        self.logger.log(self.level, '%s', scope)
+        self.logger.log(self.level, 'LEAVE scope: %s', scope.scope_name)
+
+
+# Счетчики для профилирования разрешения имен: число определений и поисков
+# в каждой области видимости и суммарная глубина поиска по цепочке
+class CountingTracer(SymbolTracer):
+    def __init__(self):
+        self.defines: Dict[str, int] = defaultdict(int)
+        self.lookups: Dict[str, int] = defaultdict(int)
+        self.depths: Dict[str, int] = defaultdict(int)
+        self.misses: Dict[str, int] = defaultdict(int)
+        self.scopes = 0
+
+    def define(self, scope, symbol):
+        self.defines[str(scope.scope_name)] += 1
+
+    def lookup(self, scope, name, depth, found):
+        self.lookups[str(scope.scope_name)] += 1
+        self.depths[str(scope.scope_name)] += depth
+        if not found:
+            self.misses[str(scope.scope_name)] += 1
+
+    def enter_scope(self, scope):
+        self.scopes += 1
+
+    def leave_scope(self, scope):
+        pass
+
+    def summary(self) -> dict:
+        scopes = {}
+        for name in set(self.defines) | set(self.lookups):
+            lookups = self.lookups.get(name, 0)
+            scopes[name] = {
+                'defines': self.defines.get(name, 0),
+                'lookups': lookups,
+                'misses': self.misses.get(name, 0),
+                'avg_depth': self.depths.get(name, 0) / lookups if lookups else 0.0,
+            }
+        total = sum(self.lookups.values())
+        return {
+            'scopes_entered': self.scopes,
+            'lookups': total,
+            'avg_depth': sum(self.depths.values()) / total if total else 0.0,
+            'scopes': scopes,
+        }
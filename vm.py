@@ -0,0 +1,430 @@
+from array import array
+from typing import Dict, List, Optional, Tuple
+
+from interpreter import PascalRuntimeError, _Context, _div, _mod
+from jasmin import CodeGenerator
+from nodes import ProgramNode
+from peephole import PeepholeOptimizer
+from semantic import SemanticAnalyzer
+
+# Регистровая виртуальная машина для кода, который генерирует SemanticAnalyzer.
+# Jasmin-текст (тот же, что собирается в .class) переводится в байт-код ВМ:
+# инструкция - четыре целых (код операции и три операнда) в array('i').
+# Операнды - номера регистров кадра: сначала локальные переменные метода,
+# затем ячейки стека JVM (регистр base + глубина), регистр для swap и константы.
+# Константы лежат в шаблоне кадра, поэтому все операции - регистр-регистр
+MOVE, ADD, SUB, MUL, DIV, MOD, AND, OR, SHL = range(9)
+JMP, JEQ, JNE, JLT, JGE, JGT, JLE = range(9, 16)
+GETG, PUTG, NEWARRAY, ALOAD, ASTORE, CALL, RET, RETV, PRINT, READ = range(16, 26)
+WIDTH = 4
+
+_ARITHMETIC = {'iadd': ADD, 'isub': SUB, 'imul': MUL, 'idiv': DIV, 'irem': MOD,
+               'iand': AND, 'ior': OR, 'ishl': SHL}
+_JUMPS = {'if_icmpeq': JEQ, 'if_icmpne': JNE, 'if_icmplt': JLT,
+          'if_icmpge': JGE, 'if_icmpgt': JGT, 'if_icmple': JLE}
+_READ_KINDS = {'I': 0, 'C': 1, 'Z': 2}
+# Значения на стеке, которые не помещаются в регистр: System.out и System.in
+_OUT, _IN = -1, -2
+
+
+def _method_name(ref: str) -> str:
+    return ref.split('(', 1)[0].rsplit('/', 1)[-1]
+
+
+def _arg_count(descriptor: str) -> int:
+    return len(descriptor[descriptor.index('(') + 1:descriptor.index(')')])
+
+
+class VmMethod:
+    __slots__ = ('name', 'code', 'template', 'nargs', 'returns')
+
+    def __init__(self, name: str, code: array, template: List[int], nargs: int, returns: bool):
+        self.name = name
+        self.code = code
+        self.template = template
+        self.nargs = nargs
+        self.returns = returns
+
+
+# Программа ВМ: методы (в инструкции CALL - номер метода в methods) и число глобальных ячеек
+class VmProgram:
+    def __init__(self, class_name: str, methods: List[VmMethod], nglobals: int):
+        self.class_name = class_name
+        self.methods = methods
+        self.nglobals = nglobals
+
+    @property
+    def main(self) -> VmMethod:
+        for method in self.methods:
+            if method.name == 'main':
+                return method
+        raise Exception('No main method')
+
+    @property
+    def size(self) -> int:
+        return sum(len(method.code) // WIDTH for method in self.methods)
+
+
+# Перевод тела одного метода. Стек JVM моделируется списком номеров регистров,
+# где лежат значения: загрузка переменной или константы ничего не генерирует,
+# операция пишет результат в регистр своей глубины. Перед записью в переменную,
+# перед переходами и метками значения на стеке переносятся в их собственные регистры
+class _MethodTranslator:
+    def __init__(self, loader: '_Loader', name: str, descriptor: str, max_stack: int, max_locals: int):
+        self.loader = loader
+        self.name = name
+        self.nargs = _arg_count(descriptor)
+        self.returns = not descriptor.endswith('V')
+        self.base = max_locals
+        self.scratch = max_locals + max_stack
+        self.consts: Dict[int, int] = {}
+        self.code: List[int] = []
+        self.stack: List[int] = []
+        self.reachable = True
+        self.labels: Dict[str, int] = {}
+        self.label_depths: Dict[str, int] = {}
+        self.fixups: List[Tuple[int, str]] = []
+        # позиция последней инструкции, записавшей результат в регистр стека
+        self.last_result = -1
+
+    def emit(self, op: int, a: int = 0, b: int = 0, c: int = 0):
+        self.code.extend((op, a, b, c))
+
+    def const(self, value: int) -> int:
+        reg = self.consts.get(value)
+        if reg is None:
+            reg = self.consts[value] = self.scratch + 1 + len(self.consts)
+        return reg
+
+    def pop(self) -> int:
+        if not self.stack:
+            raise Exception('Stack underflow in {0}'.format(self.name))
+        return self.stack.pop()
+
+    def push_result(self, op: int, a: int = 0, b: int = 0):
+        reg = self.base + len(self.stack)
+        self.last_result = len(self.code)
+        self.emit(op, reg, a, b)
+        self.stack.append(reg)
+
+    # Значения на стеке, которые еще читают локальную переменную reg, копируются до ее изменения
+    def protect(self, reg: int):
+        for depth, entry in enumerate(self.stack):
+            if entry == reg:
+                self.emit(MOVE, self.base + depth, reg)
+                self.stack[depth] = self.base + depth
+
+    # System.out/System.in (отрицательные номера) остаются на стеке как есть
+    def canonicalize(self):
+        for depth, entry in enumerate(self.stack):
+            if entry >= 0 and entry != self.base + depth:
+                self.emit(MOVE, self.base + depth, entry)
+                self.stack[depth] = self.base + depth
+
+    def jump(self, op: int, label: str, a: int = 0, b: int = 0):
+        self.canonicalize()
+        self.label_depths.setdefault(label, len(self.stack))
+        self.emit(op, a, b, 0)
+        self.fixups.append((len(self.code) - 1, label))
+
+    def label(self, name: str):
+        if self.reachable:
+            self.canonicalize()
+            depth = len(self.stack)
+        else:
+            depth = self.label_depths.get(name, 0)
+        self.stack = [self.base + i for i in range(depth)]
+        self.reachable = True
+        self.labels[name] = len(self.code)
+
+    def instruction(self, op: str, args: List[str]):
+        if op in ('ldc', 'bipush', 'sipush'):
+            self.stack.append(self.const(int(args[0])))
+        elif op.startswith('iconst_'):
+            self.stack.append(self.const(-1 if op == 'iconst_m1' else int(op[7:])))
+        elif op == 'iload' or op.startswith('iload_'):
+            self.stack.append(int(args[0]) if args else int(op[6:]))
+        elif op == 'istore' or op.startswith('istore_'):
+            reg = int(args[0]) if args else int(op[7:])
+            value = self.pop()
+            last = self.last_result
+            if last == len(self.code) - WIDTH and self.code[last + 1] == value \
+                    and value not in self.stack and reg not in self.stack:
+                # результат только что вычислен и больше не нужен на стеке: пишется сразу в переменную
+                self.code[last + 1] = reg
+            else:
+                self.protect(reg)
+                if value != reg:
+                    self.emit(MOVE, reg, value)
+        elif op == 'iinc':
+            reg = int(args[0])
+            self.protect(reg)
+            self.emit(ADD, reg, reg, self.const(int(args[1])))
+        elif op in _ARITHMETIC:
+            b = self.pop()
+            a = self.pop()
+            self.push_result(_ARITHMETIC[op], a, b)
+        elif op == 'dup':
+            self.stack.append(self.stack[-1])
+        elif op == 'pop':
+            self.pop()
+        elif op == 'swap':
+            depth = len(self.stack) - 2
+            a, b = self.stack[-2], self.stack[-1]
+            self.emit(MOVE, self.scratch, b)
+            self.emit(MOVE, self.base + depth + 1, a)
+            self.emit(MOVE, self.base + depth, self.scratch)
+            self.stack[-2:] = [self.base + depth, self.base + depth + 1]
+        elif op == 'getstatic':
+            if args[0] == 'java/lang/System/out':
+                self.stack.append(_OUT)
+            elif args[0] == 'java/lang/System/in':
+                self.stack.append(_IN)
+            else:
+                self.push_result(GETG, self.loader.global_index(args[0]))
+        elif op == 'putstatic':
+            self.emit(PUTG, self.loader.global_index(args[0]), self.pop())
+        elif op == 'newarray':
+            self.push_result(NEWARRAY, self.pop())
+        elif op == 'iaload':
+            index = self.pop()
+            self.push_result(ALOAD, self.pop(), index)
+        elif op == 'iastore':
+            value = self.pop()
+            index = self.pop()
+            self.emit(ASTORE, self.pop(), index, value)
+        elif op == 'invokevirtual' and args[0].startswith('java/io/PrintStream/println'):
+            value = self.pop()
+            if value < 0 or self.pop() != _OUT:
+                raise Exception('Unsupported println call in {0}'.format(self.name))
+            self.emit(PRINT, value)
+        elif op == 'invokevirtual' and args[0].startswith('java/io/InputStream/read'):
+            if self.pop() != _IN:
+                raise Exception('Unsupported read call in {0}'.format(self.name))
+            for kind in args[0][args[0].index(')') + 1:]:
+                self.push_result(READ, _READ_KINDS[kind])
+        elif op == 'invokestatic':
+            nargs = _arg_count(args[0])
+            self.canonicalize()
+            del self.stack[len(self.stack) - nargs:]
+            first = self.base + len(self.stack)
+            if args[0].endswith('V'):
+                self.emit(CALL, -1, self.loader.method_index(_method_name(args[0])), first)
+            else:
+                self.push_result(CALL, self.loader.method_index(_method_name(args[0])), first)
+        elif op in _JUMPS:
+            b = self.pop()
+            a = self.pop()
+            self.jump(_JUMPS[op], args[0], a, b)
+        elif op == 'goto':
+            self.jump(JMP, args[0])
+            self.reachable = False
+        elif op == 'ireturn':
+            self.emit(RET, self.pop())
+            self.reachable = False
+        elif op == 'return':
+            self.emit(RETV)
+            self.reachable = False
+        else:
+            raise Exception('Unsupported instruction {0!r} in {1}'.format(op, self.name))
+
+    def finish(self) -> VmMethod:
+        for position, label in self.fixups:
+            if label not in self.labels:
+                raise Exception('Undefined label {0!r} in {1}'.format(label, self.name))
+            self.code[position] = self.labels[label]
+        template = [0] * (self.scratch + 1 + len(self.consts))
+        for value, reg in self.consts.items():
+            template[reg] = value
+        return VmMethod(self.name, array('i', self.code), template, self.nargs, self.returns)
+
+
+class _Loader:
+    def __init__(self):
+        self.class_name = None
+        self.globals: Dict[str, int] = {}
+        self.method_names: List[str] = []
+        self.methods: Dict[str, VmMethod] = {}
+
+    def global_index(self, ref: str) -> int:
+        name = ref.rsplit('/', 1)[-1]
+        if name not in self.globals:
+            raise Exception('Unknown field {0!r}'.format(ref))
+        return self.globals[name]
+
+    def method_index(self, name: str) -> int:
+        if name not in self.method_names:
+            self.method_names.append(name)
+        return self.method_names.index(name)
+
+    def load(self, lines: List[str]) -> VmProgram:
+        header, limits, body = None, {}, []
+        for line in (line.strip() for chunk in lines for line in chunk.split('\n')):
+            if not line:
+                continue
+            parts = line.split()
+            head = parts[0]
+            if head == '.class':
+                self.class_name = parts[-1]
+            elif head == '.field':
+                self.globals[parts[-2]] = len(self.globals)
+            elif head == '.method':
+                header, limits, body = parts[-1], {}, []
+            elif head == '.limit':
+                limits[parts[1]] = int(parts[2])
+            elif head == '.end':
+                self._method(header, limits, body)
+                header = None
+            elif head[0] == '.':
+                continue
+            elif header is None:
+                raise Exception('Instruction outside of a method: {0!r}'.format(line))
+            else:
+                body.append(parts)
+        for name in self.method_names:
+            if name not in self.methods:
+                raise Exception('Undefined method {0!r}'.format(name))
+        methods = [self.methods[name] for name in self.method_names]
+        methods.extend(method for name, method in self.methods.items() if name not in self.method_names)
+        return VmProgram(self.class_name, methods, len(self.globals))
+
+    def _method(self, header: str, limits: Dict[str, int], body: List[List[str]]):
+        name = _method_name(header)
+        self.method_index(name)
+        translator = _MethodTranslator(self, name, header[header.index('('):],
+                                       limits.get('stack', 0), limits.get('locals', 0))
+        for parts in body:
+            if parts[0].endswith(':') and len(parts) == 1:
+                translator.label(parts[0][:-1])
+            else:
+                translator.instruction(parts[0], parts[1:])
+        self.methods[name] = translator.finish()
+
+
+# Загрузка Jasmin-кода (строки, как у CodeGenerator.code) в программу ВМ
+def load_program(code: List[str]) -> VmProgram:
+    return _Loader().load(code)
+
+
+# Программа ВМ из AST: тот же SemanticAnalyzer и те же оптимизации, что при компиляции в .class
+def compile_program(ast: ProgramNode) -> VmProgram:
+    generator = CodeGenerator(optimizer=PeepholeOptimizer())
+    SemanticAnalyzer(generator, promote_globals=True).visit(ast)
+    return load_program(generator.code)
+
+
+# Исполнение программы ВМ; ввод-вывод и счетчик шагов (переходы назад и вызовы) - из _Context.
+# Перед запуском код каждого метода копируется из array('i') в список: в цикле
+# диспетчеризации чтение элемента списка заметно дешевле, чем из array
+class VirtualMachine:
+    def __init__(self, ctx: _Context):
+        self.ctx = ctx
+        self.globals: List = []
+        self.methods: List[Tuple[List[int], List[int], int, str]] = []
+
+    def run(self, program: VmProgram):
+        self.globals = [0] * program.nglobals
+        self.methods = [(method.code.tolist(), method.template, method.nargs, method.name)
+                        for method in program.methods]
+        self._execute(program.methods.index(program.main), [None])
+
+    def _read(self, kind: int) -> int:
+        if kind == 0:
+            return self.ctx.input.read('integer')
+        value = self.ctx.input.read('char')
+        return ord(value) if kind == 1 else int(value not in ('0', 'F', 'f'))
+
+    def _execute(self, index: int, args: List) -> Optional[int]:
+        code, template, _, name = self.methods[index]
+        regs = template[:]
+        regs[:len(args)] = args
+        g = self.globals
+        tick = self.ctx.tick
+        write = self.ctx.write
+        # коды операций - локальные переменные: сравнение с ними не ищет глобальное имя
+        move, add, sub, shl, jmp, jle = MOVE, ADD, SUB, SHL, JMP, JLE
+        getg, putg, aload, astore, call, ret = GETG, PUTG, ALOAD, ASTORE, CALL, RET
+        pc = 0
+        while True:
+            op = code[pc]
+            if op == move:
+                regs[code[pc + 1]] = regs[code[pc + 2]]
+            elif op == add:
+                regs[code[pc + 1]] = ((regs[code[pc + 2]] + regs[code[pc + 3]] + 0x80000000) & 0xFFFFFFFF) - 0x80000000
+            elif op >= jmp:
+                if op <= jle:
+                    target = code[pc + 3]
+                    if op != jmp:
+                        a, b = regs[code[pc + 1]], regs[code[pc + 2]]
+                        if op == JEQ:
+                            taken = a == b
+                        elif op == JNE:
+                            taken = a != b
+                        elif op == JLT:
+                            taken = a < b
+                        elif op == JGE:
+                            taken = a >= b
+                        elif op == JGT:
+                            taken = a > b
+                        else:
+                            taken = a <= b
+                        if not taken:
+                            pc += WIDTH
+                            continue
+                    if target <= pc:
+                        tick()
+                    pc = target
+                    continue
+                elif op == getg:
+                    regs[code[pc + 1]] = g[code[pc + 2]]
+                elif op == putg:
+                    g[code[pc + 1]] = regs[code[pc + 2]]
+                elif op == aload:
+                    try:
+                        regs[code[pc + 1]] = regs[code[pc + 2]][regs[code[pc + 3]]]
+                    except IndexError:
+                        raise PascalRuntimeError('Array index out of range: {0}'.format(regs[code[pc + 3]]))
+                elif op == astore:
+                    try:
+                        regs[code[pc + 1]][regs[code[pc + 2]]] = regs[code[pc + 3]]
+                    except IndexError:
+                        raise PascalRuntimeError('Array index out of range: {0}'.format(regs[code[pc + 2]]))
+                elif op == call:
+                    callee = code[pc + 2]
+                    first = code[pc + 3]
+                    tick()
+                    value = self._execute(callee, regs[first:first + self.methods[callee][2]])
+                    if code[pc + 1] >= 0:
+                        regs[code[pc + 1]] = value
+                elif op == ret:
+                    return regs[code[pc + 1]]
+                elif op == RETV:
+                    return None
+                elif op == PRINT:
+                    write('{0}\n'.format(regs[code[pc + 1]]))
+                elif op == NEWARRAY:
+                    regs[code[pc + 1]] = array('i', (0,)) * regs[code[pc + 2]]
+                elif op == READ:
+                    regs[code[pc + 1]] = self._read(code[pc + 2])
+                else:
+                    raise Exception('Bad opcode {0} at {1} in {2}'.format(op, pc, name))
+            elif op <= shl:
+                a, b = regs[code[pc + 2]], regs[code[pc + 3]]
+                if op == sub:
+                    value = a - b
+                elif op == MUL:
+                    value = a * b
+                elif op == DIV:
+                    value = _div(a, b)
+                elif op == MOD:
+                    value = _mod(a, b)
+                elif op == AND:
+                    value = a & b
+                elif op == OR:
+                    value = a | b
+                else:
+                    value = a << (b & 31)
+                regs[code[pc + 1]] = ((value + 0x80000000) & 0xFFFFFFFF) - 0x80000000
+            else:
+                raise Exception('Bad opcode {0} at {1} in {2}'.format(op, pc, name))
+            pc += WIDTH